@@ -1,5 +1,16 @@
 """ arkivist """
 __version__ = "1.4.0"
-from .arkivist import Arkivist, ArkivistException
+from .aio import AsyncArkivist
+from .arkivist import Arkivist, ArkivistException, convert
+from .codecs import available_codecs, set_default_codec
+from .sharded import ShardedArkivist
 
-__all__ = ["Arkivist", "ArkivistException"]
+__all__ = [
+    "Arkivist",
+    "ArkivistException",
+    "AsyncArkivist",
+    "ShardedArkivist",
+    "available_codecs",
+    "convert",
+    "set_default_codec",
+]
@@ -0,0 +1,420 @@
+"""
+    (c) 2020 Rodney Maniego Jr.
+    Arkivist
+
+    asyncio interface to Arkivist.
+
+    `AsyncArkivist` keeps the contents in an `Arkivist` and never touches
+    the disk or the network from the event loop: opening, reloading, saves
+    and web requests run in the default executor. Saves copy the contents
+    and write the copy (see `_save_snapshot`), so the changes every
+    coroutine makes while a save is due or running share the next write.
+"""
+
+import asyncio
+import functools
+from contextlib import asynccontextmanager
+
+from .arkivist import (
+    _DEFERRED,
+    _FETCH_WORKERS,
+    Arkivist,
+    ArkivistException,
+    _apply_download,
+    _check_fetch,
+    _download_many,
+    _fetch,
+    _file_lock,
+    _save_snapshot,
+)
+
+__all__ = ["AsyncArkivist"]
+
+# results handed out by `async for` before letting other tasks run
+_YIELD_EVERY = 1000
+
+
+class AsyncArkivist:
+    """Arkivist for asyncio applications.
+
+    Takes the arguments of `Arkivist`, and opens the file on first use, or
+    with `await store.open()`; `async with AsyncArkivist(...) as store`
+    also saves on exit. Changes are saved in the executor once the event
+    loop ran the coroutines that are ready, or `flush_interval`
+    milliseconds later, so bursts of changes from many coroutines end up
+    in one write; with `autosave=False`, only `save()` writes. With
+    `durable=True`, each change only returns once it is on disk, still
+    sharing writes with concurrent changes; otherwise `await store.save()`
+    waits for the changes made so far.
+
+    Operations are serialized with an asyncio lock instead of blocking
+    the event loop, and `batch()` holds it for a whole block::
+
+        store = AsyncArkivist("data.json")
+        async with store.batch():
+            await store.set("visits", await store.get("visits", 0) + 1)
+        async for key, record in store.where("status", "open"):
+            ...
+    """
+
+    def __init__(self, *args, durable=False, flush_interval=0, **options):
+        autosave = options.pop("autosave", True)
+        if autosave not in (True, False, "deferred"):
+            raise ArkivistException("`autosave` must be True, False or `deferred`.")
+        try:
+            self._interval = max(0.0, float(flush_interval) / 1000)
+        except (TypeError, ValueError):
+            raise ArkivistException("`flush_interval` must be a number of milliseconds.")
+        self._args = args
+        # saves are left to this wrapper
+        self._options = dict(options, autosave=False)
+        self._autosave = bool(autosave)
+        self._durable = bool(durable)
+        self._store = None
+        self._lock = None
+        self._opening = None
+        self._batching = 0
+        # with `lock` or `auto_reload`, taking the store's lock may wait for
+        # other processes and reload the file, see `_call`
+        self._blocking = False
+        # the save waiting for its turn, the running one, and failures
+        self._scheduled = None
+        self._writer = None
+        self._saved = None
+        self._failures = 0
+        self._error = None
+
+    def __repr__(self):
+        state = "unopened" if self._store is None else repr(self._store)
+        return f"<AsyncArkivist {state}>"
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+        return False
+
+    @property
+    def arkivist(self):
+        """The underlying `Arkivist`, for synchronous reads; None until
+        the store is opened."""
+        return self._store
+
+    async def open(self):
+        """Open the backing file in the executor, once."""
+        if self._store is None:
+            if self._opening is None:
+                self._opening = asyncio.ensure_future(
+                    _run(functools.partial(Arkivist, *self._args, **self._options))
+                )
+            opening = self._opening
+            try:
+                store = await asyncio.shield(opening)
+            except BaseException:
+                if opening.done() and self._opening is opening:
+                    # let the next call try again
+                    self._opening = None
+                raise
+            if self._store is None:
+                self._lock = _TaskLock()
+                self._saved = asyncio.Condition()
+                self._blocking = _file_lock(store) is not None
+                self._store = store
+                if self._autosave:
+                    # changes still unsaved at exit are written then
+                    _DEFERRED[id(store)] = store
+        return self
+
+    async def close(self):
+        """Save pending changes and wait for them to be written."""
+        if self._store is not None:
+            await self.save()
+
+    # reads
+    async def get(self, key, default=None):
+        return await self._read("get", key, default)
+
+    async def matches(self, key, value):
+        return await self._read("matches", key, value)
+
+    async def keys(self):
+        return list(await self._read("keys"))
+
+    async def snapshot(self):
+        """Return a read-only view of the contents, see
+        `Arkivist.snapshot()`."""
+        return await self._read("snapshot")
+
+    async def show(self, sort=False, reverse=False):
+        """Return all contents as a dictionary."""
+        return await _AsyncQuery(self).show(sort, reverse)
+
+    def query(self, sort=False, reverse=False):
+        """Iterate over all `(key, value)` pairs with `async for`."""
+        return _AsyncQuery(self).query(sort, reverse)
+
+    def where(self, child, keyword=None, exact=False, sensitivity=True):
+        """Start a query, see `Arkivist.where()`; the returned query is
+        iterated with `async for`, or resolved with `await
+        query.show()` / `await query.first()`."""
+        return _AsyncQuery(self).where(child, keyword, exact, sensitivity)
+
+    # changes
+    async def set(self, key, value):
+        return await self._change("set", key, value)
+
+    async def delete(self, key):
+        """Remove `key`; raises `KeyError` if it is missing."""
+        return await self._change("__delitem__", key)
+
+    async def update(self, *args, **kwargs):
+        return await self._change("update", *args, **kwargs)
+
+    async def setdefault(self, key, default=None):
+        return await self._change("setdefault", key, default, result=True)
+
+    async def pop(self, key, *default):
+        return await self._change("pop", key, *default, result=True)
+
+    async def append_in(self, key, value, unique=False, sort=False):
+        return await self._change("append_in", key, value, unique, sort)
+
+    async def remove_in(self, key, value):
+        return await self._change("remove_in", key, value)
+
+    async def apply(self, operations):
+        return await self._change("apply", operations)
+
+    async def clear(self):
+        return await self._change("clear")
+
+    async def load(self, data):
+        return await self._change("load", data)
+
+    @asynccontextmanager
+    async def batch(self):
+        """Hold the lock for a block of operations, keeping other
+        coroutines out, and save once at exit."""
+        await self._ready()
+        async with self._lock:
+            self._batching += 1
+            try:
+                yield self
+            finally:
+                self._batching -= 1
+        await self._settle()
+
+    async def fetch(
+        self,
+        url,
+        extend=False,
+        noerror=True,
+        timeout=10,
+        headers=None,
+        conditional=False,
+        stream=False,
+        paginate=False,
+        max_pages=None,
+    ):
+        """Load a JSON object from a web API, see `Arkivist.fetch()`; the
+        requests run in the executor."""
+        store = await self._ready()
+        _check_fetch(conditional, paginate, max_pages)
+        try:
+            payload, validators = await _run(
+                _fetch, store, url, timeout, headers, conditional, stream, paginate, max_pages
+            )
+            async with self._lock:
+                _apply_download(store, payload, extend, url if conditional else None, validators)
+        except ArkivistException:
+            if not noerror:
+                raise
+        except Exception as e:
+            if not noerror:
+                raise ArkivistException(str(e)) from e
+        await self._settle()
+        return self
+
+    async def fetch_many(self, urls, extend=True, max_workers=_FETCH_WORKERS, timeout=10, headers=None):
+        """Load JSON objects from several web APIs at once, see
+        `Arkivist.fetch_many()`; the requests run in the executor."""
+        store = await self._ready()
+        payload, errors = await _run(_download_many, urls, max_workers, timeout, headers)
+        if payload is not None:
+            async with self._lock:
+                _apply_download(store, payload, extend)
+            await self._settle()
+        return errors
+
+    # storage
+    async def reload(self):
+        """Re-read the backing file in the executor."""
+        store = await self._ready()
+        async with self._lock:
+            await _run(store.reload)
+        return self
+
+    async def save(self):
+        """Wait until the changes made so far are written, starting the
+        write now rather than after the flush interval."""
+        store = await self._ready()
+        if store.filepath is None:
+            # an in-memory store has nothing to write
+            return self
+        version = store.version
+        async with self._saved:
+            while store.saved_version < version:
+                if self._writer is None:
+                    self._start_save()
+                failures = self._failures
+                await self._saved.wait()
+                if self._failures != failures:
+                    raise self._error
+        return self
+
+    # internal helpers
+    async def _ready(self):
+        if self._store is None:
+            await self.open()
+        return self._store
+
+    async def _read(self, name, *args):
+        # the lock may be held by an executor call, which the event loop
+        # must not wait for
+        store = await self._ready()
+        async with self._lock:
+            return await self._call(getattr(store, name), *args)
+
+    async def _change(self, name, *args, result=False, **kwargs):
+        store = await self._ready()
+        async with self._lock:
+            value = await self._call(getattr(store, name), *args, **kwargs)
+        await self._settle()
+        return value if result else self
+
+    async def _call(self, function, *args, **kwargs):
+        """Call into the store; in the executor when its lock is a file
+        lock, which blocks on `flock` and reloads the file."""
+        if self._blocking:
+            return await _run(functools.partial(function, *args, **kwargs))
+        return function(*args, **kwargs)
+
+    async def _settle(self):
+        """Schedule a save of the changes just made and, with `durable`,
+        wait for it; within `batch()`, only once at its end."""
+        if self._batching or not self._autosave or self._store.filepath is None:
+            return
+        if self._scheduled is None and self._writer is None:
+            loop = asyncio.get_running_loop()
+            self._scheduled = loop.call_later(self._interval, self._start_save)
+        if self._durable:
+            await self.save()
+
+    def _start_save(self):
+        if self._scheduled is not None:
+            self._scheduled.cancel()
+            self._scheduled = None
+        if self._writer is None:
+            self._writer = asyncio.ensure_future(self._write())
+
+    async def _write(self):
+        store = self._store
+        try:
+            await _run(_save_snapshot, store)
+        except Exception as e:
+            self._failures += 1
+            self._error = e
+            return
+        finally:
+            self._writer = None
+            async with self._saved:
+                self._saved.notify_all()
+        if self._autosave and store.saved_version != store.version:
+            # changed while being written
+            self._start_save()
+
+
+class _AsyncQuery:
+    """A query on an `AsyncArkivist`, built without touching the store and
+    resolved at once, under its lock, so concurrent queries cannot mix."""
+
+    def __init__(self, owner):
+        self._owner = owner
+        self._steps = []
+
+    def where(self, child, keyword=None, exact=False, sensitivity=True):
+        self._steps.append(("where", (child, keyword, exact, sensitivity)))
+        return self
+
+    def exclude(self, keyword=None, exact=False, sensitivity=True):
+        self._steps.append(("exclude", (keyword, exact, sensitivity)))
+        return self
+
+    def limit(self, count):
+        self._steps.append(("limit", (count,)))
+        return self
+
+    def offset(self, count):
+        self._steps.append(("offset", (count,)))
+        return self
+
+    async def show(self, sort=False, reverse=False):
+        """Return the results as a dictionary."""
+        return await self._resolve("show", sort, reverse)
+
+    async def first(self, sort=False, reverse=False):
+        """Return the first `(key, value)` result, or None."""
+        return await self._resolve("first", sort, reverse)
+
+    async def query(self, sort=False, reverse=False):
+        """Yield the `(key, value)` results, letting other tasks run every
+        so often."""
+        results = await self._resolve("show", sort, reverse)
+        for count, item in enumerate(results.items(), 1):
+            yield item
+            if not count % _YIELD_EVERY:
+                await asyncio.sleep(0)
+
+    def __aiter__(self):
+        return self.query()
+
+    async def _resolve(self, method, sort, reverse):
+        owner = self._owner
+        store = await owner._ready()
+        async with owner._lock:
+            return await owner._call(self._apply, store, method, sort, reverse)
+
+    def _apply(self, store, method, sort, reverse):
+        for name, args in self._steps:
+            getattr(store, name)(*args)
+        return getattr(store, method)(sort, reverse)
+
+
+class _TaskLock:
+    """asyncio lock that the task holding it may take again."""
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self._owner = None
+        self._depth = 0
+
+    async def __aenter__(self):
+        task = asyncio.current_task()
+        if self._owner is not task:
+            await self._lock.acquire()
+            self._owner = task
+        self._depth += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self._depth -= 1
+        if not self._depth:
+            self._owner = None
+            self._lock.release()
+
+
+async def _run(function, *args):
+    """Run a blocking call in the default executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(function, *args))
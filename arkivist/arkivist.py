@@ -6,19 +6,82 @@
 """
 
 import os
+import sys
+import _thread
 import json
+import mmap
 import time
+import zlib
+import atexit
+import math
+import hashlib
+import weakref
 import tempfile
 import threading
 import warnings
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
 from random import choice
-from contextlib import contextmanager
+from types import MappingProxyType
+from itertools import islice
+from collections.abc import Mapping
+from contextlib import contextmanager, nullcontext
+from copy import deepcopy
 
-__all__ = ["Arkivist", "ArkivistException"]
+from . import binary, compression
+from .codecs import get_codec as _get_codec
+from .scanner import iter_members, scan_object
+
+__all__ = ["Arkivist", "ArkivistException", "convert"]
 
 _ENVELOPE_KEYS = ("arkivist", "encryption", "content")
-_ENVELOPE_VERSION = 1.3
+_ENVELOPE_VERSION = 1.4
 _MIN_ENVELOPE_VERSION = 1.2
+# encrypted contents are split into chunks, each ending after a key whose
+# hash is a multiple of this; a chunk holds this many keys on average, and
+# adding or removing a key only changes the chunk it falls in
+_CHUNK_KEYS = 64
+
+# file extensions and the storage format they select
+_FORMATS = {"json": "json", "msgpack": "msgpack"}
+_COMPRESSIONS = compression.METHODS
+
+_JOURNAL_SUFFIX = ".journal"
+# offsets of the top-level values, for memory-mapped instances
+_OFFSETS_SUFFIX = ".idx"
+_OFFSETS_VERSION = 1
+# advisory lock shared by the processes using a file
+_LOCK_SUFFIX = ".lock"
+# validators of the responses to conditional `fetch()` calls, by URL
+_VALIDATORS_SUFFIX = ".http"
+# response headers kept as validators, and the request headers sending them
+_VALIDATORS = {"ETag": "If-None-Match", "Last-Modified": "If-Modified-Since"}
+_BYTEORDER = sys.byteorder
+# journal mode: the base file is rewritten once the journal outgrows both
+_COMPACT_RATIO = 1.0
+_COMPACT_MIN_BYTES = 64 * 1024
+
+# instances with `autosave="deferred"`, flushed when the interpreter exits
+_DEFERRED = weakref.WeakValueDictionary()
+
+# concurrent requests made by `fetch_many()` by default
+_FETCH_WORKERS = 8
+# bytes read at a time from streamed responses
+_STREAM_CHUNK = 64 * 1024
+
+# marks every top-level key as changed, see `_mark_dirty`
+_ALL_KEYS = object()
+# a top-level key removed by `apply()`
+_REMOVED = object()
+# a top-level key a `snapshot()` view does not have
+_ABSENT = object()
+_PATCH_OPERATIONS = ("add", "remove", "replace", "move", "copy", "test")
+
+_DEFERRED_LOCKING = (
+    "`lock` cannot be combined with deferred autosave, whose changes are "
+    "written after the lock is released."
+)
 
 
 class ArkivistException(Exception):
@@ -38,8 +101,42 @@ class Arkivist(dict):
     single instance safe to share across threads. File writes are atomic
     (written to a temporary file and moved into place), so a crash
     mid-write can no longer corrupt the JSON file.
+
+    With `lazy=True`, opening a file only locates its top-level values;
+    each one is decoded the first time it is accessed. Values that were
+    never decoded are copied as they are when the file is saved.
+
+    With `lock=True`, every operation holds an advisory lock on a `.lock`
+    sidecar, shared by reads and exclusive for changes, and first reloads
+    the file if another process changed it; `auto_reload=True` reloads
+    changed files without locking. See `is_stale()`.
+
+    With `rwlock=True`, operations that only read the contents (`get`,
+    `show`, `matches`, ...) run side by side in several threads, and only
+    changes hold the lock exclusively; threads waiting to change the
+    contents go before new readers.
+
+    With `mode="r"` and `mmap=True`, the file is memory-mapped instead of
+    read, so processes opening the same file share its pages, and the
+    offsets of the top-level values are kept in a `.idx` sidecar for the
+    next open. Such instances are read-only.
+
+    Files named like `data.json.gz`, or opened with `compression=`, are
+    saved compressed with gzip, lzma or zlib at the given `level`.
+    Compressed and MessagePack files are recognized by their contents when
+    read, and saved the same way unless `compression=` or `format=` says
+    otherwise.
+
+    With `metrics=True`, the instance counts its writes and times its
+    saves, queries and locking, see `stats()`; `metrics` may also be a
+    function, called with the name and value of every measurement.
     """
 
+    def __new__(cls, *args, lazy=False, mmap=False, **kwargs):
+        if (lazy or mmap) and not issubclass(cls, _LazyLoading):
+            cls = _lazy_class(cls, bool(mmap))
+        return super().__new__(cls)
+
     def __init__(
         self,
         data=None,
@@ -50,9 +147,27 @@ class Arkivist(dict):
         autosort=False,
         reverse=False,
         authfile=None,
+        journal=False,
+        flush_interval=100,
+        codec=None,
+        lazy=False,
+        mmap=False,
+        format=None,
+        compression=None,
+        level=None,
+        lock=False,
+        auto_reload=False,
+        rwlock=False,
+        metrics=False,
         **legacy,
     ):
-        self._lock = threading.RLock()
+        self._lock = _RWLock() if rwlock else _Lock()
+        # operation counters and timings, see `stats()`
+        if metrics is not True and metrics is not False and not callable(metrics):
+            raise ArkivistException("`metrics` must be a boolean or a function.")
+        self._metrics = _Metrics(None if metrics is True else metrics) if metrics else None
+        if self._metrics is not None:
+            self._lock = _TimedLock(self._lock, self._metrics)
 
         try:
             self._indent = int(indent)
@@ -60,10 +175,57 @@ class Arkivist(dict):
             raise ArkivistException("`indent` must be an integer between 0 and 4.")
         self._reverse = bool(reverse)
         self._autosort = bool(autosort)
+        if autosave not in (True, False, "deferred"):
+            raise ArkivistException("`autosave` must be True, False or `deferred`.")
         self._autosave = bool(autosave)
+        self._deferred = autosave == "deferred"
+        # secondary indexes on child fields, kept current by `_mark_dirty`
+        self._indexes = {}
+        self._text_indexes = {}
+        # position of each key, ordering the keys found through an index
+        self._positions = None
+        self._next_position = 0
+        # flattened entries per top-level key, see `flatten(cached=True)`
+        self._flat_cache = None
+
+        # mutation counters, used to skip writes when nothing changed
+        self._version = 0
+        self._saved_version = 0
+        self._skipped_writes = 0
+        # changed top-level keys, only tracked by stores that save per key
+        self._dirty_keys = None
+        self._flusher = None
+        self._flush_error = None
+        # validators of conditional fetches, read on first use, and the
+        # version a save must reach before their sidecar is written
+        self._validators = None
+        self._validators_due = None
+        self._fetch_hits = 0
+        self._fetch_misses = 0
+        # held while writing the files, so saves land in the order they
+        # were prepared; notified whenever a save completes
+        self._writing = threading.Lock()
+        self._saved = threading.Condition(threading.Lock())
+        # saves still writing a copy of the contents, see `_detach()`
+        self._snapshots = 0
+        self._detached = set()
+        # the `snapshot()` views in use, and the latest one, see `_view()`
+        self._views = weakref.WeakSet()
+        self._view = None
+        self._view_version = None
+        self._viewing = threading.Lock()
+        try:
+            self._flush_interval = max(0.0, float(flush_interval) / 1000)
+        except (TypeError, ValueError):
+            raise ArkivistException("`flush_interval` must be a number of milliseconds.")
         self._cypher = None
         self._encrypt = False
         self._authfile = None
+        # tokens of the encrypted chunks last read or written, by plaintext
+        # digest, for each document of the instance
+        self._sealed = {None: {}}
+        # metadata of the files as last read or written, see `is_stale()`
+        self._signature = None
 
         if mode not in ("r", "r+", "w+"):
             raise ArkivistException("Unsupported file read mode, use `r`, `r+`, `w+`.")
@@ -72,15 +234,31 @@ class Arkivist(dict):
         self._save_as = None
         self._filepath = None
 
+        # `None` follows the default codec, see `set_default_codec()`
+        if codec is not None:
+            _get_codec(codec)
+        self._codec = codec
+
+        # journal properties; `None` pending means a full rewrite is due
+        self._journal = bool(journal)
+        self._pending = None
+        self._base_size = 0
+        self._journal_size = 0
+
+        # lazy loading; what is still unread depends on the subclass
+        self._lazy = bool(lazy) or bool(mmap)
+        self._mapped = bool(mmap)
+        self._unloaded = set()
+        if self._mapped and mode != "r":
+            raise ArkivistException('`mmap` requires the read-only mode `r`.')
+
         # searching properties
         self._parent = None
-        self._query_complete = False
-        self._operation = None
         self._child = None
-        self._keyword = None
-        self._exact = True
-        self._sensitivity = False
-        self._matches = None
+        self._clauses = []
+        self._open_clause = None
+        self._limit = None
+        self._offset = 0
 
         if legacy:
             warnings.warn(
@@ -99,21 +277,76 @@ class Arkivist(dict):
         elif isinstance(filepath, str):
             self._filepath = filepath
 
+        # found in the file on reading, and kept for writes unless given
+        self._detect = {
+            name for name, value in (("format", format), ("compression", compression)) if value is None
+        }
+
+        # storage format, chosen by the file extension unless given
+        if format is None:
+            format = _file_format(self._filepath)
+        if format not in _FORMATS.values():
+            raise ArkivistException(
+                "Unsupported `format`, use one of: " + ", ".join(_FORMATS.values()) + "."
+            )
+        self._format = format
+
+        # compression, also chosen by the file extension unless given
+        if compression is None:
+            compression = _file_compression(self._filepath)
+        if compression is not None and compression not in _COMPRESSIONS:
+            raise ArkivistException(
+                "Unsupported `compression`, use one of: " + ", ".join(_COMPRESSIONS) + "."
+            )
+        if level is not None and (
+            not isinstance(level, int) or isinstance(level, bool) or not 0 <= level <= 9
+        ):
+            raise ArkivistException("`level` must be an integer between 0 and 9.")
+        self._compression = compression
+        self._level = level
+
         if isinstance(authfile, str):
             self._authfile = authfile
             if os.path.exists(authfile):
                 self._cypher = _load_cypher(self._authfile)
 
-        if self._is_data:
-            dict.update(self, data)
-            _write_json(self)
-        elif self._filepath:
-            self._encrypt, loaded = _read_json(
-                self._filepath, self._read_mode, self._cypher
-            )
-            dict.update(self, loaded)
-            if self._read_mode != "r":
-                _write_json(self, forced=True)
+        self._locking = bool(lock)
+        if lock and self._deferred:
+            raise ArkivistException(_DEFERRED_LOCKING)
+        if lock or auto_reload:
+            if self._filepath is None:
+                raise ArkivistException("`lock` and `auto_reload` require a filepath.")
+            _lock_files(self)
+
+        with self._lock:
+            if self._is_data:
+                dict.update(self, data)
+                _mark_dirty(self)
+                _write_json(self)
+            elif self._filepath:
+                detected = {}
+                with _timed(self, "read"):
+                    self._encrypt, loaded = _read_json(
+                        self._filepath,
+                        self._read_mode,
+                        self._cypher,
+                        self._codec,
+                        self._lazy,
+                        self._mapped,
+                        self._sealed[None],
+                        detected,
+                    )
+                _keep_detected(self, detected)
+                dict.update(self, loaded)
+                _track_spans(self)
+                if self._journal and self._read_mode != "w+":
+                    _measure_journal(self)
+                self._signature = _signature(self)
+                # a lazily opened file is not rewritten just for being opened,
+                # nor an encrypted one, which keeps the envelope version it
+                # was written with until the contents change
+                if self._read_mode != "r" and not (self._unloaded or self._encrypt):
+                    _write_json(self, forced=True)
 
     # file and configuration properties
     @property
@@ -131,15 +364,89 @@ class Arkivist(dict):
         """Whether the backing file is saved encrypted."""
         return self._encrypt
 
+    @property
+    def format(self):
+        """The storage format of the backing file, `json` or `msgpack`."""
+        return self._format
+
+    @property
+    def compression(self):
+        """The compression of the backing file, `gzip`, `lzma`, `zlib` or
+        None."""
+        return self._compression
+
+    @property
+    def codec(self):
+        """The name of the JSON codec used to read and write the file."""
+        return _get_codec(self._codec).name
+
+    @property
+    def journal(self):
+        """Whether mutations are appended to a journal instead of
+        rewriting the whole file."""
+        return self._journal
+
+    @property
+    def version(self):
+        """Number of changes made since this instance was created."""
+        return self._version
+
+    @property
+    def saved_version(self):
+        """The `version` last written to the backing file."""
+        return self._saved_version
+
+    @property
+    def skipped_writes(self):
+        """Number of autosaves skipped because nothing had changed."""
+        return self._skipped_writes
+
+    def stats(self, reset=False):
+        """Return the measurements of an instance created with `metrics`.
+
+        `counters` holds the number of `writes`, `writes_skipped`,
+        `bytes_written` and `queries`; `timings` holds a histogram, in
+        seconds, of each step: `lock_wait` and `lock_hold` (from the
+        outermost acquisition by a thread), `read`, `save`, and within
+        saves `encode`, `compress`, `encrypt`, `write` and `rename`, and
+        `query`; `sizes` holds the histogram of `query_scanned`, the
+        number of records each query looked at. Histograms report their
+        `count`, `total`, `min`, `max`, `mean`, estimated `p50`, `p90` and
+        `p99`, and `buckets`: the count of values up to each bound.
+
+        With `reset`, the measurements start over afterwards.
+        """
+        if self._metrics is None:
+            raise ArkivistException("Metrics are disabled, create the instance with `metrics=True`.")
+        return self._metrics.snapshot(reset)
+
+    @property
+    def fetch_hits(self):
+        """Number of conditional fetches answered `304 Not Modified`."""
+        return self._fetch_hits
+
+    @property
+    def fetch_misses(self):
+        """Number of conditional fetches that downloaded the contents."""
+        return self._fetch_misses
+
     @property
     def autosave(self):
-        """Whether mutations are automatically written to the backing file."""
+        """Whether mutations are automatically written to the backing file,
+        or `deferred` when they are written by a background thread."""
+        if self._autosave and self._deferred:
+            return "deferred"
         return self._autosave
 
     @autosave.setter
     def autosave(self, state):
+        if state not in (True, False, "deferred"):
+            raise ArkivistException("`autosave` must be True, False or `deferred`.")
+        if state == "deferred" and self._locking:
+            raise ArkivistException(_DEFERRED_LOCKING)
         with self._lock:
             self._autosave = bool(state)
+            self._deferred = state == "deferred"
 
     def encrypt(self, state=True):
         """Set Encrypt/Decrypt configuration for JSON file.
@@ -155,8 +462,10 @@ class Arkivist(dict):
                     self._authfile = _new_encryption_key(self._authfile)
                     self._cypher = _load_cypher(self._authfile)
                 self._encrypt = True
+                _mark_dirty(self)
             elif not state and self._encrypt:
                 self._encrypt = False
+                _mark_dirty(self)
             self.save()
             return self
 
@@ -178,9 +487,14 @@ class Arkivist(dict):
                             raise ArkivistException(
                                 f"Cannot set `{key}`: parent `{self._parent}` is not a dictionary."
                             )
-                        container[key] = value
-                else:
+                        if not (key in container and _identical(container[key], value)):
+                            container = _detach(self, self._parent)
+                            container[key] = value
+                            _mark_dirty(self, (self._parent, key))
+                elif not (key in self and _identical(dict.__getitem__(self, key), value)):
+                    _preserve(self, key)
                     dict.__setitem__(self, key, value)
+                    _mark_dirty(self, (key,))
                 _write_json(self)
             finally:
                 self._parent = None
@@ -188,18 +502,31 @@ class Arkivist(dict):
 
     def __setitem__(self, key, value):
         with self._lock:
-            dict.__setitem__(self, key, value)
+            if not (key in self and _identical(dict.__getitem__(self, key), value)):
+                _preserve(self, key)
+                dict.__setitem__(self, key, value)
+                _mark_dirty(self, (key,))
             _write_json(self)
 
     def __delitem__(self, key):
         with self._lock:
+            _preserve(self, key, removing=True)
             dict.__delitem__(self, key)
+            _mark_dirty(self, (key,))
             _write_json(self)
 
     def update(self, *args, **kwargs):
         """dict.update() that also persists when autosave is enabled."""
         with self._lock:
-            dict.update(self, *args, **kwargs)
+            changes = {
+                key: value
+                for key, value in dict(*args, **kwargs).items()
+                if not (key in self and _identical(dict.__getitem__(self, key), value))
+            }
+            if changes:
+                _preserve(self, *changes)
+                dict.update(self, changes)
+                _mark_dirty(self, *((key,) for key in changes))
             _write_json(self)
             return self
 
@@ -207,62 +534,108 @@ class Arkivist(dict):
         with self._lock:
             if key in self:
                 return dict.__getitem__(self, key)
+            _preserve(self, key)
             dict.__setitem__(self, key, default)
+            _mark_dirty(self, (key,))
             _write_json(self)
             return default
 
     def pop(self, key, *default):
         with self._lock:
+            found = key in self
+            if found:
+                _preserve(self, key, removing=True)
             value = dict.pop(self, key, *default)
+            if found:
+                _mark_dirty(self, (key,))
             _write_json(self)
             return value
 
     def popitem(self):
         with self._lock:
+            if dict.__len__(self):
+                _preserve(self, next(reversed(dict.keys(self))), removing=True)
             item = dict.popitem(self)
+            _mark_dirty(self, (item[0],))
             _write_json(self)
             return item
 
     def clear(self):
         with self._lock:
-            dict.clear(self)
+            if self:
+                _release(self)
+                dict.clear(self)
+                _mark_dirty(self)
             _write_json(self)
             return self
 
-    def fetch(self, url, extend=False, noerror=True, timeout=10, headers=None):
+    def fetch(
+        self,
+        url,
+        extend=False,
+        noerror=True,
+        timeout=10,
+        headers=None,
+        conditional=False,
+        stream=False,
+        paginate=False,
+        max_pages=None,
+    ):
         """Load a JSON object from a web API.
 
         The existing data is only cleared after a successful response, so a
-        failed request no longer wipes the current contents.
+        failed request no longer wipes the current contents. The request is
+        made before taking the lock, so other threads are not kept waiting.
+
+        With `conditional`, the `ETag` and `Last-Modified` headers of the
+        response are kept, in a `.http` sidecar once the contents are
+        saved, and sent back by the next conditional fetch of `url`; if the
+        server answers `304 Not Modified`, nothing is decoded or saved.
+        `fetch_hits` and `fetch_misses` count both outcomes.
+
+        With `stream`, the body is decoded as it arrives, only buffering
+        the members of the object that are incomplete, instead of holding
+        the whole body as bytes, text and objects at once.
+
+        With `paginate`, the pages linked by `Link: <...>; rel="next"`
+        headers are fetched too, up to `max_pages` in all, or those
+        returned by `paginate(response, page)` when it is a function. The
+        pages are merged in order and saved once, when all of them
+        succeeded; only one page body is held at a time.
         """
-        with self._lock:
-            try:
-                requests = _requests()
-                if not isinstance(url, str) or not url.lower().startswith(
-                    ("http://", "https://")
-                ):
-                    raise ArkivistException(
-                        "Unsupported URL, only `http://` and `https://` schemes are allowed."
-                    )
-                with requests.get(url, timeout=timeout, headers=headers) as source:
-                    source.raise_for_status()
-                    payload = source.json()
-                if not isinstance(payload, dict):
-                    raise ArkivistException("The URL did not return a JSON object.")
-                if not extend:
-                    dict.clear(self)
-                dict.update(self, payload)
-                _write_json(self)
-            except ArkivistException:
-                if not noerror:
-                    raise
-            except Exception as e:
-                if not noerror:
-                    raise ArkivistException(str(e)) from e
-            return self
+        _check_fetch(conditional, paginate, max_pages)
+        try:
+            payload, validators = _fetch(
+                self, url, timeout, headers, conditional, stream, paginate, max_pages
+            )
+            with self._lock:
+                _apply_download(self, payload, extend, url if conditional else None, validators)
+        except ArkivistException:
+            if not noerror:
+                raise
+        except Exception as e:
+            if not noerror:
+                raise ArkivistException(str(e)) from e
+        return self
+
+    def fetch_many(self, urls, extend=True, max_workers=_FETCH_WORKERS, timeout=10, headers=None):
+        """Load JSON objects from several web APIs at once.
+
+        The requests share a pool of `max_workers` connections and run in
+        as many threads. The objects are merged in the order of `urls`, so
+        later URLs win on conflicting keys, and saved once; without
+        `extend`, they replace the existing data, unless every request
+        failed. Returns a dictionary of the URLs that failed and their
+        `ArkivistException`, empty when all succeeded.
+        """
+        payload, errors = _download_many(urls, max_workers, timeout, headers)
+        if payload is not None:
+            with self._lock:
+                _apply_download(self, payload, extend)
+        return errors
 
     def get(self, key, default=None):
-        with self._lock:
+        with self._lock.shared():
             try:
                 if self._parent is not None:
                     if self._parent in self:
@@ -279,20 +652,27 @@ class Arkivist(dict):
                 self._parent = None
 
     def __getitem__(self, key):
-        with self._lock:
+        with self._lock.shared():
             if key in self:
                 return dict.__getitem__(self, key)
 
     def append_in(self, key, value, unique=False, sort=False):
         """Append (or extend with) `value` into the list at `key`."""
         with self._lock:
+            path = _target_path(self, key)
+            _detach(self, *path)
             target = self._target()
             if target is None:
                 return self
-            if key not in target:
+            if target is self:
+                _preserve(self, key)
+            created = key not in target
+            if created:
                 dict.__setitem__(target, key, [])
             items = dict.__getitem__(target, key)
+            changed = created
             if isinstance(items, list):
+                before = items[:] if (unique or sort) else len(items)
                 if isinstance(value, (list, set, tuple)):
                     items.extend(value)
                 else:
@@ -308,6 +688,12 @@ class Arkivist(dict):
                     except TypeError:
                         pass
                 dict.__setitem__(target, key, items)
+                if unique or sort:
+                    changed = changed or items != before
+                else:
+                    changed = changed or len(items) != before
+            if changed:
+                _mark_dirty(self, path)
             _write_json(self)
             return self
 
@@ -315,38 +701,67 @@ class Arkivist(dict):
         """Remove one or more values from the list at `key`, preserving
         the order of the remaining items."""
         with self._lock:
+            path = _target_path(self, key)
+            _detach(self, *path[:-1])
             target = self._target()
             if target is not None and key in target:
                 items = dict.__getitem__(target, key)
                 if isinstance(items, list):
                     if not isinstance(value, (list, set, tuple)):
                         value = [value]
+                    before = len(items)
                     try:
                         removals = set(value)
                         items = [item for item in items if item not in removals]
                     except TypeError:
                         removals = list(value)
                         items = [item for item in items if item not in removals]
-                    dict.__setitem__(target, key, items)
+                    if len(items) != before:
+                        if target is self:
+                            _preserve(self, key)
+                        dict.__setitem__(target, key, items)
+                        _mark_dirty(self, path)
+            _write_json(self)
+            return self
+
+    def apply(self, operations):
+        """Apply a list of JSON Patch (RFC 6902) operations, such as
+        `{"op": "replace", "path": "/users/ana/age", "value": 31}`, as one
+        change saved once.
+
+        `op` is one of `add`, `remove`, `replace`, `move`, `copy` and
+        `test`. Paths are JSON pointers (`"/users/ana/age"`), dotted keys
+        (`"users.ana.age"`) or lists of keys; list items are addressed by
+        index, and `-` adds after the last item. If any operation fails,
+        or a `test` does not match, an `ArkivistException` is raised and
+        nothing is changed; `test` tells `1`, `1.0` and `True` apart.
+        """
+        if not isinstance(operations, (list, tuple)):
+            raise ArkivistException("`operations` must be a list of operations.")
+        with self._lock:
+            patch = _Patch(self)
+            for number, operation in enumerate(operations):
+                patch.apply(number, operation)
+            patch.commit()
             _write_json(self)
             return self
 
     def random(self):
         """Return a random key-value pair as a dictionary."""
-        with self._lock:
+        with self._lock.shared():
             if not self:
                 return {}
             key = choice(tuple(dict.keys(self)))
-            return {key: dict.__getitem__(self, key)}
+            return {key: self[key]}
 
     def count(self):
         """Deprecated: use the built-in `len()` instead."""
         _warn_deprecated("Arkivist.count()", "len(arkivist)")
-        with self._lock:
+        with self._lock.shared():
             return len(self)
 
     def is_empty(self):
-        with self._lock:
+        with self._lock.shared():
             return not bool(self)
 
     def doublecheck(self, key, value):
@@ -356,15 +771,53 @@ class Arkivist(dict):
 
     def matches(self, key, value):
         """Check if the stored value at `key` equals `value`."""
-        with self._lock:
+        with self._lock.shared():
             if key in self:
                 return dict.__getitem__(self, key) == value
             return False
 
-    def flatten(self):
-        """Flatten the nested dictionary into dot-notated keys."""
-        with self._lock:
-            return _flattener(dict(self))
+    def flatten(self, separator=".", max_depth=None, cached=False):
+        """Flatten the nested dictionary into dot-notated keys.
+
+        See `iter_flatten()` for `separator` and `max_depth`. With
+        `cached`, the flattened entries of each top-level key are kept
+        and only recomputed once the key changes, so flattening a mostly
+        unchanged instance again is cheaper; values changed in place,
+        without going through the instance, are not noticed.
+        """
+        _check_flatten(separator, max_depth)
+        with self._lock.shared():
+            if not cached:
+                return dict(_iter_flat(dict.items(self), separator, max_depth))
+            cache = self._flat_cache
+            if cache is None or cache[:2] != (separator, max_depth):
+                cache = self._flat_cache = (separator, max_depth, {})
+            entries = cache[2]
+            flat = {}
+            for key, value in dict.items(self):
+                pairs = entries.get(key)
+                if pairs is None:
+                    pairs = entries[key] = list(_iter_flat(((key, value),), separator, max_depth))
+                flat.update(pairs)
+            return flat
+
+    def iter_flatten(self, separator=".", max_depth=None):
+        """Yield the `(key, value)` pairs of `flatten()` one at a time,
+        without building the flattened dictionary; the lock is released
+        before yielding.
+
+        Nested keys are joined with `separator`, or given as tuples with
+        `separator=None`. With `max_depth`, keys have at most that many
+        parts, and deeper dictionaries and lists are yielded whole.
+        """
+        _check_flatten(separator, max_depth)
+        with self._lock.shared():
+            if self._unloaded:
+                # decoded one at a time, without keeping them
+                items = list(self._records())
+            else:
+                items = _view(self).items()
+        yield from _iter_flat(items, separator, max_depth)
 
     def invert(self):
         """Swap keys and values; values must be hashable."""
@@ -376,8 +829,10 @@ class Arkivist(dict):
                 raise ArkivistException(
                     "Cannot invert: all values must be hashable to become keys."
                 ) from e
+            _release(self)
             dict.clear(self)
             dict.update(self, inverted)
+            _mark_dirty(self)
             _write_json(self)
             return self
 
@@ -390,8 +845,8 @@ class Arkivist(dict):
         with self._lock:
             if isinstance(data, str):
                 try:
-                    data = json.loads(data)
-                except json.JSONDecodeError as e:
+                    data = _get_codec(self._codec).loads(data)
+                except ValueError as e:
                     raise ArkivistException(
                         f"Cannot load: invalid JSON string ({e})."
                     ) from e
@@ -399,8 +854,10 @@ class Arkivist(dict):
                 raise ArkivistException(
                     "Cannot load: expected a dictionary or a JSON object string."
                 )
+            _release(self)
             dict.clear(self)
             dict.update(self, data)
+            _mark_dirty(self)
             _write_json(self)
             return self
 
@@ -409,15 +866,53 @@ class Arkivist(dict):
         with self._lock:
             if self._filepath is None:
                 return self
-            self._encrypt, temp = _read_json(self._filepath, "r+", self._cypher)
+            mode = "r" if self._mapped else "r+"
+            self._sealed[None] = {}
+            detected = {}
+            # not halfway through a background save
+            with self._writing, _timed(self, "read"):
+                self._encrypt, temp = _read_json(
+                    self._filepath,
+                    mode,
+                    self._cypher,
+                    self._codec,
+                    self._lazy,
+                    self._mapped,
+                    self._sealed[None],
+                    detected,
+                )
+            _keep_detected(self, detected)
+            _release(self)
             dict.clear(self)
             dict.update(self, temp)
+            _track_spans(self)
+            if self._journal:
+                _measure_journal(self)
+            self._signature = _signature(self)
+            if self._unloaded and (self._indexes or self._text_indexes):
+                self._load_all()
+            _refresh_indexes(self)
+            self._flat_cache = self._positions = None
             return self
 
+    def is_stale(self):
+        """Whether the backing file changed since this instance last read
+        or wrote it, e.g. because another process saved it.
+
+        Only the file metadata (inode, size and modification time) is
+        read, so this is cheap enough to call before every access.
+        """
+        if self._signature is None:
+            return False
+        return _signature(self) != self._signature
+
     def reset(self):
         """Clear all contents and persist the empty object."""
         with self._lock:
-            dict.clear(self)
+            if self:
+                _release(self)
+                dict.clear(self)
+                _mark_dirty(self)
             _write_json(self)
             return self
 
@@ -431,15 +926,17 @@ class Arkivist(dict):
                 for i in range(10000):
                     storage.set(i, i * i)
         """
-        with self._lock:
-            previous = self._autosave
-            self._autosave = False
-        try:
-            yield self
-        finally:
+        # with `lock`, other processes wait for the whole block
+        with self._lock if self._locking else nullcontext():
             with self._lock:
-                self._autosave = previous
-                _write_json(self)
+                previous = self._autosave
+                self._autosave = False
+            try:
+                yield self
+            finally:
+                with self._lock:
+                    self._autosave = previous
+                    _write_json(self)
 
     def __enter__(self):
         return self
@@ -448,93 +945,209 @@ class Arkivist(dict):
         self.save()
         return False
 
+    def create_index(self, child, text=False):
+        """Index the values of a child field, so exact `where()` and
+        `exclude()` queries on it no longer scan every record.
+
+        With `text=True`, a trigram index over the lowercased string values
+        is built instead, serving substring (`exact=False`) and
+        case-insensitive (`sensitivity=False`) queries.
+
+        Indexes follow the changes made through the instance; a record
+        changed in place, without setting it again, leaves them stale.
+        """
+        if child is None:
+            raise ArkivistException("Cannot index `None`, a child field is required.")
+        with self._lock:
+            indexes = self._text_indexes if text else self._indexes
+            if child not in indexes:
+                index = _TextIndex(child) if text else _HashIndex(child)
+                index.build(self._records())
+                indexes[child] = index
+            return self
+
+    def drop_index(self, child):
+        """Remove the indexes on a child field, if any."""
+        with self._lock:
+            self._indexes.pop(child, None)
+            self._text_indexes.pop(child, None)
+            if not (self._indexes or self._text_indexes):
+                self._positions = None
+            return self
+
+    @property
+    def indexes(self):
+        """The child fields that are currently indexed."""
+        return tuple(dict.fromkeys((*self._indexes, *self._text_indexes)))
+
     # quering methods
     def where(self, child, keyword=None, exact=False, sensitivity=True):
+        """Keep the records whose `child` matches `keyword`.
+
+        Clauses are only collected here; they are evaluated together, in a
+        single pass, by `query()`, `show()`, `first()` and the like.
+        """
         with self._lock:
-            self._operation = "matches"
             self._child = child
-            self._keyword = keyword
-            self._exact = exact
-            self._sensitivity = sensitivity
-            self._query_complete = False
-            if keyword is not None:
-                if self._matches is None:
-                    self._matches = dict(self)
-                self._matches = _query(
-                    self._matches,
-                    self._operation,
-                    self._child,
-                    self._keyword,
-                    self._exact,
-                    self._sensitivity,
-                )
-                self._query_complete = True
+            clause = ("matches", child, keyword, exact, sensitivity)
+            if keyword is None:
+                # completed by a following `exclude()`
+                self._open_clause = clause
+            else:
+                self._open_clause = None
+                self._clauses.append(clause)
             return self
 
     def exclude(self, keyword=None, exact=False, sensitivity=True):
+        """Drop the records whose `child`, selected by a prior `where()`,
+        matches `keyword`."""
         with self._lock:
-            self._operation = "exclude"
-            self._keyword = keyword
-            self._exact = exact
-            self._sensitivity = sensitivity
-            if self._matches is None:
-                self._matches = dict(self)
-            self._matches = _query(
-                self._matches,
-                self._operation,
-                self._child,
-                self._keyword,
-                self._exact,
-                self._sensitivity,
-            )
-            self._query_complete = True
+            self._open_clause = None
+            self._clauses.append(("exclude", self._child, keyword, exact, sensitivity))
+            return self
+
+    def limit(self, count):
+        """Stop the pending query once `count` results are found."""
+        with self._lock:
+            self._limit = None if count is None else max(0, int(count))
+            return self
+
+    def offset(self, count):
+        """Skip the first `count` results of the pending query."""
+        with self._lock:
+            self._offset = max(0, int(count or 0))
             return self
 
+    def first(self, sort=False, reverse=False):
+        """Return the first `(key, value)` result of the query, or None."""
+        with self._query_lock():
+            matches = self._resolve_query(sort, reverse, limit=1)
+        return next(iter(matches.items()), None)
+
     def query(self, sort=False, reverse=False):
         """Yield the query results; the lock is released before yielding."""
-        with self._lock:
-            temp = self._resolve_query(sort, reverse)
+        with self._query_lock():
+            if self._unfiltered(sort):
+                # read without the lock, see `snapshot()`
+                temp = _view(self)
+            else:
+                temp = self._resolve_query(sort, reverse)
         yield from temp.items()
 
     def show(self, sort=False, reverse=False):
         """Return the query results (or all contents) as a dictionary."""
-        with self._lock:
+        with self._query_lock():
             return self._resolve_query(sort, reverse)
 
     def string(self, sort=False, reverse=False):
         """Return the query results (or all contents) as a JSON string."""
-        with self._lock:
-            temp = self._resolve_query(sort, reverse)
-            if self._indent:
-                return json.dumps(temp, indent=self._indent, ensure_ascii=False)
-            return json.dumps(temp, ensure_ascii=False)
+        return self.to_json(sort, reverse)
 
     def to_json(self, sort=False, reverse=False, indent=None):
         """Return the query results (or all contents) as a JSON string,
         with an optional per-call indent override."""
-        with self._lock:
-            temp = self._resolve_query(sort, reverse)
-            indent = self._indent if indent is None else int(indent)
-            if indent:
-                return json.dumps(temp, indent=indent, ensure_ascii=False)
-            return json.dumps(temp, ensure_ascii=False)
+        indent = self._indent if indent is None else int(indent)
+        dumps = _get_codec(self._codec).dumps
+        with self._query_lock():
+            if self._unfiltered(sort):
+                # encoded as it is, without a copy
+                return dumps(self, indent or None)
+            return dumps(self._resolve_query(sort, reverse), indent or None)
+
+    def snapshot(self):
+        """Return a read-only view of the contents as they are now, which
+        later changes do not affect and which can be read without the
+        lock.
+
+        Nothing is copied when taking a view, which reads the current
+        contents: while it is in use, changes save the entries they
+        replace in it first, and changes to nested values copy the
+        containers they change. Nested values must not be changed through
+        the view, which only prevents changing its top-level keys.
+        """
+        with self._lock.shared():
+            return MappingProxyType(_view(self))
 
     def save(self, save_as=None):
         """Write contents to the backing file, or to `save_as` as a copy.
 
         Saving with `save_as` writes a copy without redirecting subsequent
-        autosaves away from the original filepath.
+        autosaves away from the original filepath. In journal mode, the
+        file is rewritten in full and the journal discarded, so values
+        changed in place, which the journal does not see, are saved too.
         """
         with self._lock:
             if save_as is not None:
                 _validate_filepath(save_as)
             self._save_as = save_as
             try:
-                _write_json(self, forced=True)
+                _write_json(self, forced=True, compact=True)
             finally:
                 self._save_as = None
             return self
 
+    def flush(self):
+        """Write out changes still waiting for a deferred autosave.
+
+        Errors raised by the background writer since the last call are
+        re-raised here.
+        """
+        with self._lock:
+            if self._version != self._saved_version:
+                _write_json(self, forced=True)
+            error, self._flush_error = self._flush_error, None
+        if error is not None:
+            raise error
+        return self
+
+    def wait_for_save(self, timeout=None):
+        """Wait until the changes made so far are saved; with deferred
+        autosave, the background writer saves them without waiting for the
+        flush interval. Returns False if `timeout` seconds passed first, or
+        if nothing is going to save them because autosave is disabled.
+
+        Errors raised by the background writer since the last call are
+        re-raised here.
+        """
+        version = self._version
+        background = self._autosave and self._deferred and self._filepath is not None
+        if background and self._saved_version < version:
+            _schedule_flush(self, now=True)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._saved:
+            while self._saved_version < version and self._flush_error is None:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if not background or (remaining is not None and remaining <= 0):
+                    return False
+                self._saved.wait(remaining)
+        error, self._flush_error = self._flush_error, None
+        if error is not None:
+            raise error
+        return True
+
+    def _persist(self, compact=False):
+        """Write the contents to storage; called by `_write_json` once it
+        decided a write is due."""
+        save = self._prepare_save(compact)
+        with self._writing:
+            try:
+                with _timed(self, "save"):
+                    save.write()
+            except BaseException:
+                save.abandon()
+                raise
+        save.finish()
+
+    def _prepare_save(self, compact=False, snapshot=False):
+        """Capture what the next save writes, see `_Save`."""
+        return _Save(self, compact, snapshot)
+
+    def compact(self):
+        """Rewrite the backing file in full and discard the journal."""
+        with self._lock:
+            _write_json(self, forced=True, compact=True)
+            return self
+
     # internal helpers
     def _target(self):
         """Resolve the container selected by a prior `find()`, always
@@ -549,32 +1162,322 @@ class Arkivist(dict):
             raise ArkivistException(f"Parent `{parent}` is not a dictionary.")
         return None
 
-    def _resolve_query(self, sort, reverse):
-        """Finalize any pending query and reset the query state."""
-        matches = self._matches
-        if matches is None:
-            matches = dict(self)
-        if self._operation is not None and not self._query_complete:
-            matches = _query(
-                matches,
-                self._operation,
-                self._child,
-                self._keyword,
-                self._exact,
-                self._sensitivity,
-            )
-        if sort:
-            matches = dict(sorted(matches.items(), reverse=reverse))
-        # clears query data after the operation
-        self._query_complete = False
-        self._operation = None
-        self._child = None
-        self._keyword = None
-        self._exact = None
-        self._sensitivity = None
-        self._matches = None
+    def _watched_files(self):
+        """The files whose changes make this instance stale; the first one
+        also names the `.lock` and `.http` sidecars."""
+        if self._filepath is None:
+            return ()
+        return (self._filepath, _journal_path(self._filepath))
+
+    def _records(self, keys=None):
+        """The `(key, value)` pairs of `keys`, or of every record."""
+        if keys is None:
+            return dict.items(self)
+        return ((key, dict.__getitem__(self, key)) for key in keys)
+
+    def _query_lock(self):
+        """The shared side of the lock, or the lock itself while a query is
+        pending, since resolving it resets the query state."""
+        if self._querying():
+            return self._lock
+        return self._lock.shared()
+
+    def _querying(self):
+        pending = self._clauses or self._open_clause is not None
+        return bool(pending or self._limit is not None or self._offset)
+
+    def _unfiltered(self, sort):
+        """Whether the results are all contents as they are: no query or
+        sort is pending, and every value is read."""
+        return not (sort or self._unloaded or self._querying())
+
+    def _resolve_query(self, sort, reverse, limit=None):
+        """Evaluate the pending query in a single pass over the records,
+        stopping early once the limit (`limit` if given) is reached, and
+        reset its state."""
+        metrics = self._metrics
+        if metrics is None:
+            return self._evaluate_query(sort, reverse, limit)
+        scanned = [0]
+        with _timed(self, "query"):
+            matches = self._evaluate_query(sort, reverse, limit, scanned)
+        metrics.count("queries")
+        metrics.observe("query_scanned", scanned[0], unit=1)
         return matches
 
+    def _evaluate_query(self, sort, reverse, limit, scanned=None):
+        """See `_resolve_query`; counts the records looked at in
+        `scanned[0]` when given."""
+        clauses = self._clauses
+        if self._open_clause is not None:
+            clauses.append(self._open_clause)
+        limit = self._limit if limit is None else limit
+        offset = self._offset
+        # clears query data before evaluating, so a failure cannot leak it
+        self._child = None
+        self._clauses = []
+        self._open_clause = None
+        self._limit = None
+        self._offset = 0
+
+        if not clauses and limit is None and not offset:
+            matches = self._records()
+            if sort:
+                matches = sorted(matches, reverse=reverse)
+            matches = dict(matches)
+            if scanned is not None:
+                scanned[0] = len(matches)
+            return matches
+
+        source, tests = None, []
+        for operation, child, keyword, exact, sensitivity in clauses:
+            keys = _index_keys(self, child, keyword, exact, sensitivity)
+            if keys is None:
+                tests.append(_predicate(operation, child, keyword, exact, sensitivity))
+            elif operation == "exclude":
+                tests.append(lambda key, data, keys=keys: key not in keys)
+            elif source is None or len(keys) < len(source):
+                if source is not None:
+                    tests.append(lambda key, data, keys=source: key in keys)
+                source = keys
+            else:
+                tests.append(lambda key, data, keys=keys: key in keys)
+        if source is not None and not sort:
+            # in the order a scan finds them, so `first()` and `limit()`
+            # do not depend on the indexes
+            source = _in_store_order(self, source)
+        records = self._records(source)
+        if scanned is not None:
+            records = _counted(records, scanned)
+
+        if sort:
+            # every match is needed before the first one is known
+            stop, skip = None, 0
+        else:
+            stop, skip = limit, offset
+        matches = []
+        if stop != 0:
+            for key, data in records:
+                if all(test(key, data) for test in tests):
+                    if skip:
+                        skip -= 1
+                        continue
+                    matches.append((key, data))
+                    if stop is not None and len(matches) >= stop:
+                        break
+        if sort:
+            matches.sort(reverse=reverse)
+            end = None if limit is None else offset + limit
+            matches = matches[offset:end]
+        return dict(matches)
+
+
+class _LazyLoading:
+    """Mixin for instances that read their contents on demand.
+
+    Subclasses keep whatever is still unread in `_unloaded`, and implement
+    `_load_key(key)`, making one key and its value available, and
+    `_load_all()`. `_load_keys()` makes every key available, even if not
+    every value; it defaults to `_load_all()`.
+
+    Keyed operations all go through `in`, so only the keys they touch are
+    read; the operations listed below read everything else first.
+    """
+
+    def __contains__(self, key):
+        if self._unloaded:
+            self._load_key(key)
+        return dict.__contains__(self, key)
+
+    def __delitem__(self, key):
+        if self._unloaded:
+            self._load_key(key)
+        super().__delitem__(key)
+
+    def _load_key(self, key):
+        raise NotImplementedError
+
+    def _load_all(self):
+        raise NotImplementedError
+
+    def _load_keys(self):
+        self._load_all()
+
+
+def _loading(name, loader):
+    """Wrap the `name` method of the next class in line, so it calls
+    `loader` first while anything is still unread."""
+
+    def method(self, *args, **kwargs):
+        if self._unloaded:
+            getattr(self, loader)()
+        return getattr(super(_LazyLoading, self), name)(*args, **kwargs)
+
+    method.__name__ = name
+    method.__qualname__ = f"_LazyLoading.{name}"
+    return method
+
+
+for _name in (
+    "__iter__",
+    "__len__",
+    "__reversed__",
+    "keys",
+    "random",
+    "clear",
+    "reset",
+    "load",
+    "fetch",
+    "create_index",
+    "iter_flatten",
+    "_resolve_query",
+):
+    setattr(_LazyLoading, _name, _loading(_name, "_load_keys"))
+for _name in (
+    "__repr__",
+    "__eq__",
+    "__ne__",
+    "__or__",
+    "__ror__",
+    "__ior__",
+    "values",
+    "items",
+    "copy",
+    "snapshot",
+    "popitem",
+    "flatten",
+    "invert",
+    "encrypt",
+):
+    setattr(_LazyLoading, _name, _loading(_name, "_load_all"))
+del _name
+
+
+class _Span:
+    """A value not decoded yet: its byte range in the buffer it was
+    scanned from."""
+
+    __slots__ = ("buffer", "start", "end")
+
+    def __init__(self, buffer, start, end):
+        self.buffer = buffer
+        self.start = start
+        self.end = end
+
+    def raw(self):
+        return memoryview(self.buffer)[self.start : self.end]
+
+    def decode(self, codec=None):
+        try:
+            return _get_codec(codec).loads(self.buffer[self.start : self.end])
+        except ValueError as e:
+            raise ArkivistException(f"Cannot decode a stored value ({e}).") from e
+
+
+class _LazyValues(_LazyLoading):
+    """Decodes each top-level value on first access; `_unloaded` holds
+    the keys whose value is still a `_Span`."""
+
+    def _load_key(self, key):
+        with self._lock:
+            if key in self._unloaded:
+                value = dict.get(self, key)
+                if type(value) is _Span:
+                    dict.__setitem__(self, key, value.decode(self._codec))
+                self._unloaded.discard(key)
+
+    def _load_all(self):
+        with self._lock:
+            for key in list(self._unloaded):
+                self._load_key(key)
+
+    def _load_keys(self):
+        # every key is known from the start
+        pass
+
+    def _records(self, keys=None):
+        # decoded for the caller only, so a query does not keep every value
+        codec = self._codec
+        for key, value in super()._records(keys):
+            if type(value) is _Span:
+                value = value.decode(codec)
+            yield key, value
+
+
+class _MappedValues(_LazyValues):
+    """Read-only variant whose spans point into a memory-mapped file."""
+
+    def save(self, save_as=None):
+        """Only copies can be saved from a memory-mapped instance."""
+        if save_as is None:
+            _read_only(self)
+        return super().save(save_as)
+
+
+def _read_only(self, *args, **kwargs):
+    raise ArkivistException(
+        f"`{self._filepath}` is memory-mapped and opened read-only."
+    )
+
+
+for _name in (
+    "__setitem__",
+    "__delitem__",
+    "__ior__",
+    "set",
+    "update",
+    "setdefault",
+    "pop",
+    "popitem",
+    "clear",
+    "fetch",
+    "append_in",
+    "remove_in",
+    "apply",
+    "invert",
+    "load",
+    "reset",
+    "encrypt",
+    "compact",
+):
+    setattr(_MappedValues, _name, _read_only)
+del _name
+
+
+_LAZY_CLASSES = {}
+
+
+def _lazy_class(cls, mapped=False):
+    """The lazily decoding, or memory-mapped, variant of an Arkivist class."""
+    lazy = _LAZY_CLASSES.get((cls, mapped))
+    if lazy is None:
+        lazy = _LAZY_CLASSES[(cls, mapped)] = type(
+            cls.__name__,
+            (_MappedValues if mapped else _LazyValues, cls),
+            {"__module__": cls.__module__, "__qualname__": cls.__qualname__},
+        )
+    return lazy
+
+
+def _track_spans(obj):
+    """Record which values are still undecoded after a lazy read."""
+    if obj._lazy and isinstance(obj, _LazyValues):
+        obj._unloaded = {
+            key for key, value in dict.items(obj) if type(value) is _Span
+        }
+
+
+def convert(source, target, authfile=None):
+    """Copy the contents of the file `source` into the file `target`, each
+    in the format and compression selected by its extension, e.g. `.json`
+    to `.msgpack` or `.json.gz`.
+
+    Encrypted files stay encrypted, with the same `authfile`.
+    """
+    _validate_filepath(target)
+    Arkivist(source, mode="r", authfile=authfile).save(save_as=target)
+    return target
+
 
 def _warn_deprecated(feature, replacement):
     warnings.warn(
@@ -597,6 +1500,247 @@ def _requests():
     return requests
 
 
+def _check_fetch(conditional, paginate, max_pages):
+    if paginate and conditional:
+        raise ArkivistException("`conditional` cannot be combined with `paginate`.")
+    if paginate is not True and paginate is not False and not callable(paginate):
+        raise ArkivistException("`paginate` must be a boolean or a function.")
+    if max_pages is not None and (
+        not isinstance(max_pages, int) or isinstance(max_pages, bool) or max_pages < 1
+    ):
+        raise ArkivistException("`max_pages` must be a positive integer.")
+
+
+def _fetch(obj, url, timeout, headers, conditional, stream, paginate, max_pages):
+    """Download what `fetch()` loads into `obj`, see `_download`."""
+    if paginate:
+        payload = _download_pages(url, timeout, headers, stream, obj._codec, paginate, max_pages)
+        return payload, None
+    validators = _cached_validators(obj, url) if conditional else None
+    return _download(url, timeout, headers, validators=validators, stream=stream, codec=obj._codec)
+
+
+def _check_url(url):
+    if not isinstance(url, str) or not url.lower().startswith(("http://", "https://")):
+        raise ArkivistException(
+            "Unsupported URL, only `http://` and `https://` schemes are allowed."
+        )
+
+
+def _download(
+    url, timeout=10, headers=None, session=None, validators=None, stream=False, codec=None
+):
+    """GET the JSON object at `url`, through `session` if given.
+
+    Returns the object and the validators of the response. With the
+    `validators` of an earlier response the request is conditional, and
+    the object is None if it did not change. See `_decode_response` for
+    `stream`.
+    """
+    requests = session or _requests()
+    _check_url(url)
+    if validators:
+        headers = dict(headers or {})
+        for name, value in validators.items():
+            headers[_VALIDATORS[name]] = value
+    with requests.get(url, timeout=timeout, headers=headers, stream=stream) as source:
+        if validators and source.status_code == 304:
+            return None, validators
+        source.raise_for_status()
+        payload = _decode_response(source, stream, codec)
+        validators = {
+            name: source.headers[name] for name in _VALIDATORS if name in source.headers
+        }
+    return payload, validators
+
+
+def _download_pages(url, timeout, headers, stream, codec, paginate, max_pages=None):
+    """GET the JSON object at `url` and those of the pages following it,
+    over one session, merged in order. A page already fetched ends the
+    sequence."""
+    requests = _requests()
+    merged, seen = {}, set()
+    with requests.Session() as session:
+        while url is not None and url not in seen:
+            if max_pages is not None and len(seen) >= max_pages:
+                break
+            seen.add(url)
+            _check_url(url)
+            with session.get(url, timeout=timeout, headers=headers, stream=stream) as source:
+                source.raise_for_status()
+                page = _decode_response(source, stream, codec)
+                if paginate is True:
+                    url = source.links.get("next", {}).get("url")
+                else:
+                    url = paginate(source, page)
+                if url is not None:
+                    url = urljoin(source.url, url)
+            merged.update(page)
+    return merged
+
+
+def _decode_response(source, stream=False, codec=None):
+    """Decode the JSON object in the body of the response `source`; with
+    `stream`, a run of members at a time as the body arrives, see
+    `scanner.iter_members()`."""
+    if not stream:
+        payload = source.json()
+        if not isinstance(payload, dict):
+            raise ArkivistException("The URL did not return a JSON object.")
+        return payload
+    loads = _get_codec(codec).loads
+    payload = {}
+    try:
+        for members in iter_members(source.iter_content(_STREAM_CHUNK)):
+            payload.update(loads(members))
+    except ValueError as e:
+        raise ArkivistException(f"The URL did not return a JSON object: {e}") from e
+    return payload
+
+
+def _download_many(urls, max_workers, timeout=10, headers=None):
+    """GET the JSON objects at `urls` concurrently, over a session whose
+    pool keeps a connection per worker. Returns the objects merged in the
+    order of `urls`, or None if every request failed, and the errors by
+    URL."""
+    if isinstance(urls, str):
+        raise ArkivistException("`urls` must be a list of URLs.")
+    urls = list(urls)
+    try:
+        max_workers = int(max_workers)
+    except (TypeError, ValueError):
+        max_workers = 0
+    if max_workers < 1:
+        raise ArkivistException("`max_workers` must be a positive integer.")
+    requests = _requests()
+    if not urls:
+        return None, {}
+    workers = min(max_workers, len(urls))
+    adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    with requests.Session() as session:
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        def download(url):
+            try:
+                return _download(url, timeout, headers, session)[0], None
+            except ArkivistException as e:
+                return None, e
+            except Exception as e:
+                error = ArkivistException(str(e))
+                error.__cause__ = e
+                return None, error
+
+        with ThreadPoolExecutor(workers, thread_name_prefix="arkivist-fetch") as pool:
+            results = list(pool.map(download, urls))
+    merged, errors = None, {}
+    for url, (payload, error) in zip(urls, results):
+        if error is not None:
+            errors[url] = error
+        elif merged is None:
+            merged = payload
+        else:
+            merged.update(payload)
+    return merged, errors
+
+
+def _apply_download(obj, payload, extend=False, url=None, validators=None):
+    """Replace the contents of `obj` with `payload`, or add it with
+    `extend`, and autosave. For a conditional fetch of `url`, count the
+    response and remember its `validators`; a None `payload` was not
+    modified."""
+    if url is not None:
+        if payload is None:
+            obj._fetch_hits += 1
+            return
+        obj._fetch_misses += 1
+    if not extend:
+        _release(obj)
+        dict.clear(obj)
+        _mark_dirty(obj)
+    if payload:
+        _preserve(obj, *payload)
+        dict.update(obj, payload)
+        _mark_dirty(obj, *((key,) for key in payload))
+    _write_json(obj)
+    if url is not None:
+        _remember_validators(obj, url, validators, extend)
+
+
+def _validators_path(obj):
+    files = obj._watched_files()
+    if not files or not isinstance(_validate_filepath(files[0]), str):
+        return None
+    return files[0] + _VALIDATORS_SUFFIX
+
+
+def _cached_validators(obj, url):
+    """The validators kept for `url`, reading the sidecar on first use."""
+    with obj._lock:
+        if obj._validators is None:
+            obj._validators = {}
+            path = _validators_path(obj)
+            cached = None
+            if path is not None:
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        cached = json.load(f)
+                except (OSError, ValueError):
+                    # missing or unreadable, the next responses replace it
+                    pass
+            if isinstance(cached, dict):
+                obj._validators = {
+                    key: value
+                    for key, value in cached.items()
+                    if isinstance(value, dict) and set(value) <= set(_VALIDATORS)
+                }
+        return obj._validators.get(url)
+
+
+def _remember_validators(obj, url, validators, extend):
+    """Keep the `validators` of `url`, to be written with the contents
+    they describe."""
+    _cached_validators(obj, url)
+    if not extend:
+        # the contents fetched from other URLs are gone
+        obj._validators.clear()
+    if validators:
+        obj._validators[url] = validators
+    else:
+        obj._validators.pop(url, None)
+    obj._validators_due = obj._version
+    if obj._saved_version >= obj._version:
+        _save_validators(obj)
+
+
+def _forget_validators(obj):
+    """Drop the validators once the contents they describe are replaced,
+    so the next conditional fetch downloads again; the sidecar is
+    rewritten with the contents."""
+    if obj._validators is None:
+        path = _validators_path(obj)
+        if path is None or not os.path.exists(path):
+            return
+    elif not obj._validators:
+        return
+    obj._validators = {}
+    obj._validators_due = obj._version
+    if obj._saved_version >= obj._version:
+        _save_validators(obj)
+
+
+def _save_validators(obj):
+    """Write the validators sidecar; failing to only costs a download."""
+    obj._validators_due = None
+    path = _validators_path(obj)
+    if path is None:
+        return
+    try:
+        _atomic_write(path, json.dumps(obj._validators, indent=2))
+    except ArkivistException as e:
+        warnings.warn(f"Arkivist could not save the fetch validators: {e}")
+
+
 def _fernet():
     """Lazily import Fernet so the package works without `cryptography`."""
     try:
@@ -610,103 +1754,1487 @@ def _fernet():
 
 
 def _query(collection, operation, child, keyword, exact, sensitivity):
-    matches = {}
     if operation not in ("matches", "exclude"):
         return collection
-    sensitivity = isinstance(sensitivity, bool) and bool(sensitivity)
+    test = _predicate(operation, child, keyword, exact, sensitivity)
+    return {parent: data for parent, data in collection.items() if test(parent, data)}
 
-    def evaluate(keyword, value):
-        if not exact and isinstance(value, (str, list, set, tuple, dict)):
-            try:
-                evaluation = keyword in value
-            except TypeError:
-                evaluation = False
-        else:
-            evaluation = keyword == value
-        if operation == "matches":
-            return evaluation
-        return not evaluation
 
-    for parent, data in collection.items():
+def _counted(records, scanned):
+    """Yield `records`, counting them in `scanned[0]`."""
+    for record in records:
+        scanned[0] += 1
+        yield record
+
+
+def _predicate(operation, child, keyword, exact, sensitivity):
+    """Compile a query clause into a test on a single `(key, record)`."""
+    sensitivity = isinstance(sensitivity, bool) and bool(sensitivity)
+    matches = operation == "matches"
+    lowered = keyword.lower() if isinstance(keyword, str) else keyword
+
+    def test(parent, data):
         value = data
         if child is not None:
             value = data.get(child, None) if isinstance(data, dict) else None
         term = keyword
         if not sensitivity and isinstance(value, str) and isinstance(term, str):
-            term = term.lower()
+            term = lowered
             value = value.lower()
-        if evaluate(term, value):
-            matches[parent] = data
-    return matches
-
-
-def _flattener(data):
-    """Flatten nested JSON object."""
-    out = {}
-    ## https://www.geeksforgeeks.org/flattening-json-objects-in-python/
-    def flatten(x, name=""):
-        if isinstance(x, dict):
-            for a in x:
-                flatten(x[a], name + str(a) + ".")
-        elif isinstance(x, (list, set, tuple)):
-            for i, item in enumerate(x):
-                flatten(item, name + str(i) + ".")
+        if not exact and isinstance(value, (str, list, set, tuple, dict)):
+            try:
+                evaluation = term in value
+            except TypeError:
+                evaluation = False
         else:
-            out[name[:-1]] = x
+            evaluation = term == value
+        return evaluation if matches else not evaluation
 
-    flatten(data)
-    return out
+    return test
 
 
-def _new_encryption_key(authfile):
-    """Create a new key file, never overwriting an existing one."""
-    if not isinstance(authfile, str):
-        timestamp = str(int(time.time()))
-        authfile = f"arkivist-auth-{timestamp}.txt"
-    if os.path.exists(authfile):
-        return authfile
-    Fernet = _fernet()
-    key = Fernet.generate_key().decode("utf-8")
-    directory = os.path.dirname(os.path.abspath(authfile))
-    os.makedirs(directory, exist_ok=True)
-    # restrict permissions where the platform supports it
-    fd = os.open(authfile, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
-    with os.fdopen(fd, "w", encoding="utf-8") as f:
-        f.write(key)
-    return authfile
+class _Patch:
+    """The operations of `apply()`, made on copies of the containers they
+    change; the instance itself only changes on `commit()`, once they all
+    succeeded."""
 
+    def __init__(self, obj):
+        self.obj = obj
+        # new top-level values, or `_REMOVED`
+        self.values = {}
+        # containers copied by this patch, which it may change in place
+        self.owned = {}
+        # paths changed, for `_mark_dirty`
+        self.paths = {}
 
-def _load_cypher(authfile):
-    if authfile is None:
-        return None
-    filepath = _validate_filepath(authfile, extension="txt")
-    Fernet = _fernet()
+    def apply(self, number, operation):
+        if not isinstance(operation, dict) or operation.get("op") not in _PATCH_OPERATIONS:
+            raise ArkivistException(
+                f"Operation {number} is invalid; each operation is a dictionary whose `op` "
+                "is one of: " + ", ".join(_PATCH_OPERATIONS) + "."
+            )
+        op = operation["op"]
+        try:
+            path = _patch_path(operation.get("path"))
+            if op in ("move", "copy"):
+                source = _patch_path(operation.get("from"))
+            if op in ("add", "replace", "test") and "value" not in operation:
+                raise ArkivistException("`value` is missing")
+            if op == "add":
+                self.add(path, operation["value"])
+            elif op == "remove":
+                self.remove(path)
+            elif op == "replace":
+                self.replace(path, operation["value"])
+            elif op == "move":
+                if len(path) > len(source) and path[: len(source)] == source:
+                    raise ArkivistException("cannot move a value into itself")
+                value = self.remove(source)
+                self.add(path, value)
+            elif op == "copy":
+                self.add(path, deepcopy(self.get(source)))
+            elif not _json_equal(self.get(path), operation["value"]):
+                raise ArkivistException("the value differs")
+        except ArkivistException as e:
+            raise ArkivistException(
+                f"Cannot apply operation {number} (`{op}` at `{operation.get('path')}`): {e}."
+            ) from None
+
+    def get(self, path):
+        container, key = self.parent(path, copy=False)
+        value = self.lookup(container, key)
+        if value is _REMOVED:
+            raise ArkivistException(f"`{key}` does not exist")
+        return value
+
+    def add(self, path, value):
+        container, key = self.parent(path)
+        if isinstance(container, list):
+            index = len(container) if key == "-" else _patch_index(container, key, end=True)
+            container.insert(index, value)
+        else:
+            self.put(container, key, value)
+
+    def replace(self, path, value):
+        container, key = self.parent(path)
+        if self.lookup(container, key) is _REMOVED:
+            raise ArkivistException(f"`{key}` does not exist")
+        self.put(container, key, value)
+
+    def remove(self, path):
+        container, key = self.parent(path)
+        value = self.lookup(container, key)
+        if value is _REMOVED:
+            raise ArkivistException(f"`{key}` does not exist")
+        if container is None:
+            self.values[key] = _REMOVED
+        elif isinstance(container, dict):
+            del container[key]
+        else:
+            del container[_patch_index(container, key)]
+        return value
+
+    def parent(self, path, copy=True):
+        """The container holding the last key of `path`, None for a
+        top-level key, and that key. With `copy`, the containers on the
+        way are copied, unless they already are, and the path is marked
+        changed."""
+        container, key = None, path[0]
+        # journal records follow dictionaries only
+        dirty, following = path[:1], True
+        for child in path[1:]:
+            value = self.lookup(container, key)
+            if not isinstance(value, (dict, list)):
+                raise ArkivistException(f"`{key}` is not a dictionary or a list")
+            if copy:
+                value = self.own(value)
+                self.put(container, key, value)
+            container, key = value, child
+            if following and isinstance(container, dict):
+                dirty += (child,)
+            else:
+                following = False
+        if copy:
+            self.paths[dirty] = None
+        return container, key
+
+    def lookup(self, container, key):
+        if container is None:
+            return self.top(key)
+        return _patch_get(container, key)
+
+    def put(self, container, key, value):
+        if container is None:
+            self.values[key] = value
+        elif isinstance(container, dict):
+            container[key] = value
+        else:
+            container[_patch_index(container, key)] = value
+
+    def top(self, key):
+        if key in self.values:
+            return self.values[key]
+        # `in` first, which reads the key of lazily loading instances
+        if key in self.obj:
+            return dict.__getitem__(self.obj, key)
+        return _REMOVED
+
+    def own(self, container):
+        if id(container) not in self.owned:
+            container = container.copy()
+            self.owned[id(container)] = container
+        return container
+
+    def commit(self):
+        obj = self.obj
+        changed = set()
+        for key, value in self.values.items():
+            found = key in obj
+            if value is _REMOVED:
+                if found:
+                    _preserve(obj, key, removing=True)
+                    dict.__delitem__(obj, key)
+                    changed.add(key)
+            # containers not copied by the patch were left unchanged
+            elif not (found and _identical(dict.__getitem__(obj, key), value, shared=True)):
+                _preserve(obj, key)
+                dict.__setitem__(obj, key, value)
+                changed.add(key)
+        paths = [path for path in self.paths if path[0] in changed]
+        if paths:
+            _mark_dirty(obj, *paths)
+
+
+def _patch_path(path):
+    """The keys of a JSON pointer, a dotted path or a list of keys."""
+    if isinstance(path, (list, tuple)):
+        keys = tuple(path)
+    elif isinstance(path, str) and path.startswith("/"):
+        keys = tuple(
+            key.replace("~1", "/").replace("~0", "~") for key in path[1:].split("/")
+        )
+    elif isinstance(path, str) and path:
+        keys = tuple(path.split("."))
+    else:
+        raise ArkivistException("`path` must be a non-empty JSON pointer, dotted path or list of keys")
+    if not keys:
+        raise ArkivistException("the whole contents cannot be patched, use `load()`")
+    return keys
+
+
+def _patch_index(items, key, end=False):
+    """The list index `key`, as an integer or a string of digits, which
+    may be the length of the list with `end`."""
+    if isinstance(key, str) and key.isdigit() and (key == "0" or not key.startswith("0")):
+        key = int(key)
+    if type(key) is not int or not 0 <= key < len(items) + end:
+        raise ArkivistException(f"`{key}` is not an index of the list")
+    return key
+
+
+def _patch_get(container, key):
+    """The value at `key` of a dictionary or list, or `_REMOVED`."""
+    if isinstance(container, dict):
+        return container.get(key, _REMOVED)
     try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            key = f.read().strip()
-        return Fernet(key.encode("utf-8"))
-    except FileNotFoundError as e:
-        raise ArkivistException(f"Authfile not found: `{filepath}`") from e
-    except (OSError, ValueError) as e:
+        return container[_patch_index(container, key)]
+    except ArkivistException:
+        return _REMOVED
+
+
+def _target_path(obj, key):
+    """Path of `key` inside the container a prior `find()` selected."""
+    if obj._parent is None:
+        return (key,)
+    return (obj._parent, key)
+
+
+class _Snapshot(Mapping):
+    """The contents of an instance at one version, read without its lock.
+
+    Reads the live records, except for the entries changed since, whose
+    earlier value (or `_ABSENT`) writers save in `_saved` first, see
+    `_preserve()`; before the first key is added or removed, they keep
+    the earlier keys in `_keys`.
+    """
+
+    __slots__ = ("_live", "_saved", "_len", "_keys", "__weakref__")
+    # tracked by identity in `_views`
+    __hash__ = object.__hash__
+
+    def __init__(self, obj):
+        self._live = obj
+        self._saved = {}
+        self._len = dict.__len__(obj)
+        self._keys = None
+
+    def __getitem__(self, key):
+        # the live value first: a writer saves the entry before changing it
+        value = dict.get(self._live, key, _ABSENT)
+        value = self._saved.get(key, value)
+        if value is _ABSENT:
+            raise KeyError(key)
+        return value
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        done = 0
+        if self._keys is None:
+            try:
+                for key in islice(dict.keys(self._live), self._len):
+                    if self._keys is not None:
+                        # read after keys changed, so read it again
+                        break
+                    yield key
+                    done += 1
+                else:
+                    return
+            except RuntimeError:
+                # keys changed while iterating, and were kept first
+                pass
+        yield from islice(self._keys, done, None)
+
+
+def _view(obj):
+    """The `_Snapshot` of the current version of `obj`, shared until the
+    next change; called under the lock."""
+    with obj._viewing:
+        view = obj._view() if obj._view is not None else None
+        if view is None or obj._view_version != obj._version:
+            view = _Snapshot(obj)
+            obj._views.add(view)
+            obj._view = weakref.ref(view)
+            obj._view_version = obj._version
+            # every nested value is shared again
+            obj._detached = set()
+        return view
+
+
+def _preserve(obj, *keys, removing=False):
+    """Save what the top-level `keys` hold in the `snapshot()` views in
+    use, before they are set, or removed with `removing`."""
+    if not obj._views:
+        return
+    for view in obj._views:
+        if view._live is not obj:
+            continue
+        if removing and view._keys is None:
+            view._keys = tuple(islice(dict.keys(obj), view._len))
+        saved = view._saved
+        for key in keys:
+            if key in saved:
+                continue
+            value = saved[key] = dict.get(obj, key, _ABSENT)
+            # a key added for the first time, the others were kept already
+            if value is _ABSENT and view._keys is None:
+                view._keys = tuple(islice(dict.keys(obj), view._len))
+
+
+def _release(obj):
+    """Save every entry in the `snapshot()` views in use, before all
+    contents are replaced; the views stop reading `obj`."""
+    if not obj._views:
+        return
+    _preserve(obj, *dict.keys(obj), removing=True)
+    for view in obj._views:
+        view._live = {}
+    obj._view = None
+
+
+def _sharing(obj):
+    """Whether a save in progress or a `snapshot()` may share the nested
+    values of `obj`."""
+    return bool(obj._snapshots or obj._views)
+
+
+def _detach(obj, *keys):
+    """Copy the containers found by following `keys` from the top level,
+    before they are changed in place, while a save may still be writing
+    the earlier contents; returns the innermost one. Each container is
+    copied once per save."""
+    container = obj
+    for depth, key in enumerate(keys, 1):
+        if not isinstance(container, dict) or key not in container:
+            return None
+        value = dict.__getitem__(container, key)
+        if _sharing(obj) and keys[:depth] not in obj._detached:
+            if not isinstance(value, (dict, list)):
+                return value
+            if depth == 1:
+                _preserve(obj, key)
+            value = value.copy()
+            dict.__setitem__(container, key, value)
+            obj._detached.add(keys[:depth])
+        container = value
+    return container
+
+
+def _mark_dirty(obj, *paths):
+    """Record which entries changed since the last save; without any
+    paths, the whole contents are considered changed."""
+    obj._version += 1
+    if obj._positions is not None:
+        _check_positions(obj, paths)
+    if obj._indexes or obj._text_indexes:
+        _refresh_indexes(obj, *{path[0]: None for path in paths})
+    if obj._flat_cache is not None:
+        if paths:
+            entries = obj._flat_cache[2]
+            for path in paths:
+                entries.pop(path[0], None)
+        else:
+            obj._flat_cache = None
+    if not paths:
+        _forget_validators(obj)
+    if obj._dirty_keys is not None:
+        if not paths:
+            obj._dirty_keys = _ALL_KEYS
+        elif obj._dirty_keys is not _ALL_KEYS:
+            obj._dirty_keys.update(path[0] for path in paths)
+    if not obj._journal:
+        return
+    if not paths:
+        obj._pending = None
+    elif obj._pending is not None:
+        for path in paths:
+            # re-marking moves the path last, keeping replay order intact
+            obj._pending.pop(path, None)
+            obj._pending[path] = None
+
+
+def _identical(old, new, shared=False):
+    """Whether writing `new` over `old` would leave the file unchanged.
+
+    Unlike `==`, `1`, `1.0` and `True` are told apart, as are dictionaries
+    with a different key order. A container compared with itself counts as
+    changed, since it may have been modified in place before being set,
+    unless `shared` tells that it was not.
+    """
+    if old is new:
+        return shared or not isinstance(old, (dict, list))
+    if type(old) is not type(new):
+        return False
+    if isinstance(old, dict):
+        return list(old) == list(new) and all(
+            _identical(value, new[key], shared) for key, value in old.items()
+        )
+    if isinstance(old, (list, tuple)):
+        return len(old) == len(new) and all(
+            _identical(value, item, shared) for value, item in zip(old, new)
+        )
+    return old == new
+
+
+def _json_equal(left, right):
+    """Whether two values are the same JSON value, for the `test` patch
+    operation: objects compare regardless of key order, but unlike `==`,
+    `1`, `1.0` and `True` are told apart."""
+    if isinstance(left, dict) and isinstance(right, dict):
+        return left.keys() == right.keys() and all(
+            _json_equal(value, right[key]) for key, value in left.items()
+        )
+    if isinstance(left, (list, tuple)) and isinstance(right, (list, tuple)):
+        return len(left) == len(right) and all(map(_json_equal, left, right))
+    return type(left) is type(right) and left == right
+
+
+def _json_key(key):
+    """Convert a dictionary key the same way `json.dumps` does."""
+    if isinstance(key, str):
+        return key
+    if key is None or isinstance(key, bool):
+        return json.dumps(key)
+    if isinstance(key, (int, float)):
+        return json.dumps(key)
+    raise ArkivistException(
+        f"Keys must be str, int, float, bool or None, not {type(key).__name__}."
+    )
+
+
+class _HashIndex:
+    """Map the values of one child field to the keys holding them."""
+
+    def __init__(self, child):
+        self.child = child
+        self._values = {}
+        self._buckets = {}
+
+    def build(self, items):
+        self._values.clear()
+        self._buckets.clear()
+        for key, record in items:
+            self.add(key, record)
+
+    def add(self, key, record):
+        value = record.get(self.child) if isinstance(record, dict) else None
+        try:
+            bucket = self._buckets.setdefault(value, {})
+        except TypeError:
+            # unhashable values can never equal a hashable keyword
+            return
+        bucket[key] = None
+        self._values[key] = value
+
+    def discard(self, key):
+        if key in self._values:
+            value = self._values.pop(key)
+            bucket = self._buckets[value]
+            del bucket[key]
+            if not bucket:
+                del self._buckets[value]
+
+    def lookup(self, keyword):
+        """Keys whose value equals `keyword`; raises `TypeError` when the
+        keyword is unhashable and cannot be looked up."""
+        return self._buckets.get(keyword, {})
+
+
+class _TextIndex:
+    """Trigram index over the lowercased string values of one child field,
+    for substring and case-insensitive queries."""
+
+    def __init__(self, child):
+        self.child = child
+        self._texts = {}
+        self._others = {}
+        self._grams = {}
+
+    def build(self, items):
+        self._texts.clear()
+        self._others.clear()
+        self._grams.clear()
+        for key, record in items:
+            self.add(key, record)
+
+    def add(self, key, record):
+        value = record.get(self.child) if isinstance(record, dict) else None
+        if not isinstance(value, str):
+            self._others[key] = None
+            return
+        text = value.lower()
+        self._texts[key] = text
+        for gram in _trigrams(text):
+            self._grams.setdefault(gram, set()).add(key)
+
+    def discard(self, key):
+        self._others.pop(key, None)
+        text = self._texts.pop(key, None)
+        if text is not None:
+            for gram in _trigrams(text):
+                postings = self._grams[gram]
+                postings.discard(key)
+                if not postings:
+                    del self._grams[gram]
+
+    def text(self, key):
+        return self._texts[key]
+
+    def others(self):
+        """Keys whose value is not a string, and must be checked as is."""
+        return self._others
+
+    def candidates(self, term):
+        """Keys whose lowercased text may contain the lowercased `term`, in
+        no particular order; queries put them in the order of the records."""
+        grams = _trigrams(term)
+        if not grams:
+            return list(self._texts)
+        postings = sorted((self._grams.get(gram, ()) for gram in grams), key=len)
+        if not postings[0]:
+            return []
+        return set(postings[0]).intersection(*postings[1:])
+
+
+def _trigrams(text):
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def _refresh_indexes(obj, *keys):
+    """Update the indexes for the given top-level keys, or rebuild them
+    entirely when no keys are given."""
+    for index in (*obj._indexes.values(), *obj._text_indexes.values()):
+        if not keys:
+            index.build(obj._records())
+            continue
+        for key in keys:
+            index.discard(key)
+            if key in obj:
+                index.add(key, dict.__getitem__(obj, key))
+
+
+def _in_store_order(obj, keys):
+    """`keys`, found through an index, in the order of the records."""
+    if len(keys) * 8 >= dict.__len__(obj):
+        # a large share of the records, picked out faster than sorted
+        return [key for key in dict.keys(obj) if key in keys]
+    positions = obj._positions
+    if positions is None:
+        positions = obj._positions = {key: i for i, key in enumerate(dict.keys(obj))}
+        obj._next_position = len(positions)
+    return sorted(keys, key=positions.__getitem__)
+
+
+def _check_positions(obj, paths):
+    """Follow added and removed keys in the key positions: a new key goes
+    last, like in the dict; other changes keep the order of the keys."""
+    if not paths:
+        obj._positions = None
+        return
+    positions = obj._positions
+    for path in paths:
+        key = path[0]
+        if not dict.__contains__(obj, key):
+            positions.pop(key, None)
+        elif key not in positions:
+            positions[key] = obj._next_position
+            obj._next_position += 1
+
+
+def _index_keys(obj, child, keyword, exact, sensitivity):
+    """Keys of the records matching a clause, looked up through an index
+    on `child`, or None when the records have to be scanned."""
+    if not (obj._indexes or obj._text_indexes):
+        return None
+    sensitivity = isinstance(sensitivity, bool) and bool(sensitivity)
+    keys = _lookup_hash_index(obj, child, keyword, exact, sensitivity)
+    if keys is None:
+        keys = _lookup_text_index(obj, child, keyword, exact, sensitivity)
+    return keys
+
+
+def _lookup_hash_index(obj, child, keyword, exact, sensitivity):
+    index = obj._indexes.get(child)
+    if index is None or not exact:
+        return None
+    if not sensitivity and isinstance(keyword, str):
+        return None
+    try:
+        return index.lookup(keyword)
+    except TypeError:
+        return None
+
+
+def _lookup_text_index(obj, child, keyword, exact, sensitivity):
+    index = obj._text_indexes.get(child)
+    if index is None or not isinstance(keyword, str) or (exact and sensitivity):
+        return None
+    term = keyword.lower()
+    keys = {}
+    for key in index.candidates(term):
+        text = index.text(key)
+        if exact:
+            found = text == term
+        else:
+            found = term in text
+        if found:
+            keys[key] = None
+    if sensitivity:
+        # the folded text only narrows the records down; `_records` decodes
+        # the values of a lazily loaded store
+        records = obj._records(keys)
+        keys = {key: None for key, record in records if keyword in record[child]}
+    # values that are not strings keep the scanning semantics
+    others = dict(obj._records(index.others()))
+    keys.update(_query(others, "matches", child, keyword, exact, sensitivity))
+    return keys
+
+
+def _check_flatten(separator, max_depth):
+    if separator is not None and not isinstance(separator, str):
+        raise ArkivistException("`separator` must be a string or None.")
+    if max_depth is not None and (
+        not isinstance(max_depth, int) or isinstance(max_depth, bool) or max_depth < 1
+    ):
+        raise ArkivistException("`max_depth` must be a positive integer or None.")
+
+
+def _iter_flat(items, separator=".", max_depth=None):
+    """Flatten `(key, value)` pairs depth-first, in order, with an explicit
+    stack of iterators instead of recursion, so deep documents do not hit
+    the recursion limit; empty dictionaries and lists leave no entry.
+
+    Each level keeps the key prefix of its container, `"a.b."` or
+    `("a", "b")` without `separator`, so a key costs a single concatenation.
+    """
+    joined = separator is not None
+    stack = [(iter(items), "" if joined else (), 1)]
+    while stack:
+        iterator, prefix, depth = stack[-1]
+        for key, value in iterator:
+            name = prefix + str(key) if joined else prefix + (str(key),)
+            if max_depth is None or depth < max_depth:
+                if isinstance(value, dict):
+                    children = iter(value.items())
+                elif isinstance(value, (list, set, tuple)):
+                    children = enumerate(value)
+                else:
+                    children = None
+                if children is not None:
+                    stack.append((children, name + separator if joined else name, depth + 1))
+                    break
+            yield name, value
+        else:
+            stack.pop()
+
+
+def _new_encryption_key(authfile):
+    """Create a new key file, never overwriting an existing one."""
+    if not isinstance(authfile, str):
+        timestamp = str(int(time.time()))
+        authfile = f"arkivist-auth-{timestamp}.txt"
+    if os.path.exists(authfile):
+        return authfile
+    Fernet = _fernet()
+    key = Fernet.generate_key().decode("utf-8")
+    directory = os.path.dirname(os.path.abspath(authfile))
+    os.makedirs(directory, exist_ok=True)
+    # restrict permissions where the platform supports it
+    fd = os.open(authfile, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(key)
+    return authfile
+
+
+def _load_cypher(authfile):
+    if authfile is None:
+        return None
+    filepath = _validate_filepath(authfile, extensions=("txt",), compressed=False)
+    Fernet = _fernet()
+    try:
+        with open(filepath, "r", encoding="utf-8") as f:
+            key = f.read().strip()
+        return Fernet(key.encode("utf-8"))
+    except FileNotFoundError as e:
+        raise ArkivistException(f"Authfile not found: `{filepath}`") from e
+    except (OSError, ValueError) as e:
         raise ArkivistException(
             f"Unable to load the encryption key from `{filepath}`: {e}"
         ) from e
 
 
-def _validate_filepath(filepath, extension="json"):
+def _validate_filepath(filepath, extensions=tuple(_FORMATS), compressed=True):
+    """Check the extension of `filepath`, which may be followed by the
+    suffix of a compression method when `compressed`, e.g. `.json.gz`."""
     if filepath is None:
         return None
     if not isinstance(filepath, str) or not filepath.strip():
         return None
-    if filepath.rsplit(".", 1)[-1].lower() == extension:
+    name = _strip_compression(filepath) if compressed else filepath
+    if _extension(name) in extensions:
         return filepath
-    raise ArkivistException(
-        f"Unsupported file `{filepath}`, expected a `.{extension}` file."
-    )
+    expected = " or ".join(f"`.{extension}`" for extension in extensions)
+    raise ArkivistException(f"Unsupported file `{filepath}`, expected a {expected} file.")
+
+
+def _extension(filepath):
+    return filepath.rsplit(".", 1)[-1].lower()
+
+
+def _strip_compression(filepath):
+    """`filepath` without the suffix of its compression method."""
+    if _extension(filepath) in compression.EXTENSIONS:
+        return filepath.rsplit(".", 1)[0]
+    return filepath
+
+
+def _file_format(filepath):
+    """The storage format selected by the extension of `filepath`."""
+    if not isinstance(filepath, str):
+        return "json"
+    return _FORMATS.get(_extension(_strip_compression(filepath)), "json")
+
+
+def _file_compression(filepath):
+    """The compression method selected by the extension of `filepath`."""
+    if not isinstance(filepath, str):
+        return None
+    return compression.EXTENSIONS.get(_extension(filepath))
+
+
+def _keep_detected(obj, detected):
+    """Write the file back in the format and compression it was found
+    in, unless they were given when opening it."""
+    for name in obj._detect & detected.keys():
+        setattr(obj, "_" + name, detected[name])
+
+
+def _decompress(filepath, temp):
+    """Decompress the raw bytes of a stored document, if compressed."""
+    try:
+        return compression.decompress(temp)
+    except ValueError as e:
+        raise ArkivistException(
+            f"`{filepath}` holds corrupted compressed data ({e})."
+        ) from e
+
+
+def _is_binary(temp):
+    """Whether a stored document is MessagePack: its first byte is a map
+    header, where a JSON document starts with `{` or whitespace."""
+    if not len(temp):
+        return False
+    first = temp[0]
+    return 0x80 <= first <= 0x8F or first in (0xDE, 0xDF)
+
+
+class _Lock(_thread.RLock):
+    """The re-entrant lock of an instance; operations that only read the
+    contents take it through `shared()`."""
+
+    def shared(self):
+        return self
+
+    def downgraded(self):
+        return nullcontext()
+
+
+class _RWLock:
+    """Re-entrant readers-writer lock, preferring writers.
+
+    Any number of threads may hold the shared side, taken through
+    `shared()`, while the exclusive side (`with lock:`) waits for them to
+    leave; once a writer waits, new readers wait too, so writers cannot
+    starve. A thread holding the exclusive side may take either side
+    again. A thread holding only the shared side that asks for the
+    exclusive side gives its shared holds up while it waits, and gets them
+    back when it releases the exclusive side.
+
+    Within `downgraded()`, the writer lets readers in while it only reads
+    the contents, e.g. to save them, and keeps other writers out.
+    """
+
+    def __init__(self):
+        self._mutex = _thread.allocate_lock()
+        self._condition = threading.Condition(self._mutex)
+        # shared holds of each reading thread
+        self._readers = {}
+        self._writer = None
+        self._depth = 0
+        self._waiting = 0
+        # shared holds given up by the writer, see above
+        self._suspended = 0
+        self._downgraded = False
+        self._shared = _SharedSide(self)
+
+    def acquire(self):
+        me = _thread.get_ident()
+        with self._mutex:
+            if self._writer == me:
+                if self._downgraded:
+                    self._exclude_readers()
+                self._depth += 1
+                return True
+            suspended = self._readers.pop(me, 0)
+            if suspended and not self._readers:
+                self._condition.notify_all()
+            self._waiting += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting -= 1
+            self._writer = me
+            self._depth = 1
+            self._suspended = suspended
+            return True
+
+    def release(self):
+        me = _thread.get_ident()
+        with self._mutex:
+            if self._writer != me:
+                raise RuntimeError("cannot release un-acquired lock")
+            self._depth -= 1
+            if self._depth:
+                return
+            self._writer = None
+            if self._suspended:
+                # handed back before anyone else can get in
+                self._readers[me] = self._suspended
+                self._suspended = 0
+            self._condition.notify_all()
+
+    def acquire_shared(self):
+        me = _thread.get_ident()
+        with self._mutex:
+            readers = self._readers
+            if self._writer is None and not self._waiting:
+                readers[me] = readers.get(me, 0) + 1
+            elif self._writer == me:
+                self._depth += 1
+            elif me in readers or self._downgraded:
+                # re-entrant, even with writers waiting
+                readers[me] = readers.get(me, 0) + 1
+            else:
+                while not self._downgraded and (self._writer is not None or self._waiting):
+                    self._condition.wait()
+                readers[me] = readers.get(me, 0) + 1
+            return True
+
+    def release_shared(self):
+        me = _thread.get_ident()
+        with self._mutex:
+            if self._writer == me:
+                self._depth -= 1
+                return
+            readers = self._readers
+            holds = readers.get(me, 0)
+            if holds > 1:
+                readers[me] = holds - 1
+            elif holds:
+                del readers[me]
+                if not readers and (self._waiting or self._writer is not None):
+                    self._condition.notify_all()
+            else:
+                raise RuntimeError("cannot release un-acquired lock")
+
+    @contextmanager
+    def downgraded(self):
+        me = _thread.get_ident()
+        with self._mutex:
+            # only the outermost hold, which nothing else relies on
+            downgrade = self._writer == me and self._depth == 1
+            if downgrade:
+                self._downgraded = True
+                self._condition.notify_all()
+        try:
+            yield
+        finally:
+            if downgrade:
+                with self._mutex:
+                    self._exclude_readers()
+
+    def _exclude_readers(self):
+        self._downgraded = False
+        while self._readers:
+            self._condition.wait()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def shared(self):
+        return self._shared
+
+
+class _SharedSide:
+    """The shared side of a lock, as a context manager."""
+
+    __slots__ = ("_lock",)
+
+    def __init__(self, lock):
+        self._lock = lock
+
+    def __enter__(self):
+        self._lock.acquire_shared()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._lock.release_shared()
+
+
+class _FileLock:
+    """Lock of an instance kept in sync with its file, wrapping the lock
+    the instance had.
+
+    The outermost acquisition by a thread reloads the contents when the
+    file changed since the instance last read or wrote it, unless changes
+    are still unsaved. With `lock`, an advisory `flock` on the `.lock`
+    sidecar is also held while any thread holds the lock: shared when
+    first acquired through `shared()` and exclusive otherwise, so
+    processes sharing the file take turns.
+    """
+
+    def __init__(self, obj):
+        self._ref = weakref.ref(obj)
+        self._inner = obj._lock
+        self._local = threading.local()
+        # threads holding the lock, and the mode of the `flock`
+        self._guard = threading.Lock()
+        self._holders = 0
+        self._mode = None
+        self._fd = None
+        self._shared = _SharedSide(self)
+        if obj._locking:
+            self._fcntl = _fcntl()
+            path = obj._watched_files()[0] + _LOCK_SUFFIX
+            try:
+                directory = os.path.dirname(os.path.abspath(path))
+                os.makedirs(directory, exist_ok=True)
+                self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            except OSError as e:
+                raise ArkivistException(f"Unable to open the lock file `{path}`: {e}") from e
+            weakref.finalize(self, os.close, self._fd)
+
+    def __enter__(self):
+        self._inner.acquire()
+        self._enter(shared=False)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._exit()
+        self._inner.release()
+
+    def shared(self):
+        return self._shared
+
+    def downgraded(self):
+        return self._inner.downgraded()
+
+    def acquire_shared(self):
+        self._inner.shared().__enter__()
+        self._enter(shared=True)
+
+    def release_shared(self):
+        self._exit()
+        self._inner.shared().__exit__(None, None, None)
+
+    def _enter(self, shared):
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        try:
+            if self._fd is not None:
+                self._lock_file(shared, depth)
+            if not depth:
+                obj = self._ref()
+                if obj is not None:
+                    _refresh(obj)
+        except BaseException:
+            self._exit()
+            raise
+
+    def _lock_file(self, shared, depth):
+        fcntl = self._fcntl
+        with self._guard:
+            if not depth:
+                self._holders += 1
+            if self._mode == fcntl.LOCK_EX or (shared and self._mode == fcntl.LOCK_SH):
+                return
+            # taken, or converted from shared when a thread holding the
+            # shared side takes the exclusive side
+            mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+            fcntl.flock(self._fd, mode)
+            self._mode = mode
+
+    def _exit(self):
+        depth = self._local.depth - 1
+        self._local.depth = depth
+        if depth or self._fd is None:
+            return
+        with self._guard:
+            self._holders -= 1
+            if not self._holders:
+                self._mode = None
+                self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+
+    def generation(self):
+        """The number of saves recorded in the lock file, which tells saves
+        apart even when the file metadata cannot, or None without `lock`."""
+        if self._fd is None:
+            return None
+        return int.from_bytes(os.pread(self._fd, 8, 0), "little")
+
+    def record_write(self):
+        if self._fd is not None:
+            generation = (self.generation() + 1) % 2**64
+            os.pwrite(self._fd, generation.to_bytes(8, "little"), 0)
+
+
+def _fcntl():
+    """Lazily import `fcntl`, which only POSIX systems provide."""
+    try:
+        import fcntl
+    except ImportError as e:
+        raise ArkivistException(
+            "`lock=True` relies on `fcntl`, which is only available on POSIX systems."
+        ) from e
+    return fcntl
+
+
+def _lock_files(obj):
+    """Keep `obj` in sync with its file, see `_FileLock`; with metrics, the
+    file lock goes inside the timed lock, so waits for `flock` count."""
+    timed = obj._lock if isinstance(obj._lock, _TimedLock) else None
+    if timed is not None:
+        obj._lock = timed._inner
+    obj._lock = _FileLock(obj)
+    if timed is not None:
+        timed._inner, obj._lock = obj._lock, timed
+
+
+def _file_lock(obj):
+    """The `_FileLock` of `obj`, or None."""
+    lock = obj._lock
+    if isinstance(lock, _TimedLock):
+        lock = lock._inner
+    return lock if isinstance(lock, _FileLock) else None
+
+
+class _Metrics:
+    """Counters and histograms of an instance created with `metrics`.
+
+    Histograms keep a count per power of two of their unit (microseconds
+    for timings), so percentiles are estimated to within a factor of two
+    while recording stays cheap. `hook`, if given, is called with the name
+    and value of every measurement.
+    """
+
+    def __init__(self, hook=None):
+        self._hook = hook
+        self._guard = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def count(self, name, amount=1):
+        with self._guard:
+            self._counters[name] = self._counters.get(name, 0) + amount
+        if self._hook is not None:
+            self._call_hook(name, amount)
+
+    def observe(self, name, value, unit=1e-6):
+        # values up to `unit` share the first bucket
+        exponent = math.frexp(value / unit)[1] if value > unit else 0
+        with self._guard:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = [unit, 0, 0, value, value, {}]
+            histogram[1] += 1
+            histogram[2] += value
+            histogram[3] = min(histogram[3], value)
+            histogram[4] = max(histogram[4], value)
+            buckets = histogram[5]
+            buckets[exponent] = buckets.get(exponent, 0) + 1
+        if self._hook is not None:
+            self._call_hook(name, value)
+
+    def _call_hook(self, name, value):
+        try:
+            self._hook(name, value)
+        except Exception as e:
+            # a broken exporter must not break saving
+            warnings.warn(f"The metrics hook failed on `{name}`: {e!r}", RuntimeWarning)
+
+    def snapshot(self, reset=False):
+        with self._guard:
+            counters = dict(self._counters)
+            histograms = {
+                name: (unit, count, total, low, high, dict(buckets))
+                for name, (unit, count, total, low, high, buckets) in self._histograms.items()
+            }
+            if reset:
+                self._counters.clear()
+                self._histograms.clear()
+        stats = {"counters": counters, "timings": {}, "sizes": {}}
+        for name, (unit, count, total, low, high, buckets) in sorted(histograms.items()):
+            bounds = [(min(unit * 2**exponent, high), buckets[exponent]) for exponent in sorted(buckets)]
+            summary = {
+                "count": count,
+                "total": total,
+                "min": low,
+                "max": high,
+                "mean": total / count,
+            }
+            for label, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+                summary[label] = _percentile(bounds, count * fraction)
+            summary["buckets"] = dict(bounds)
+            stats["timings" if unit < 1 else "sizes"][name] = summary
+        return stats
+
+
+def _percentile(bounds, rank):
+    """The upper bound of the bucket holding the value of rank `rank`."""
+    seen = 0
+    for bound, count in bounds:
+        seen += count
+        if seen >= rank:
+            return bound
+    return bounds[-1][0]
+
+
+class _Timer:
+    """Record the time spent in a block as the timing `name`."""
+
+    __slots__ = ("_metrics", "_name", "_start")
+
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._metrics.observe(self._name, time.perf_counter() - self._start)
+
+
+_UNTIMED = nullcontext()
+
+
+def _timed(obj, name):
+    """Context manager timing a block for the metrics of `obj`; does
+    nothing unless `obj` records metrics."""
+    if obj._metrics is None:
+        return _UNTIMED
+    return _Timer(obj._metrics, name)
+
+
+class _TimedLock:
+    """Lock of an instance recording metrics, wrapping the lock the
+    instance had: the outermost acquisition by a thread records how long
+    it waited for the lock as `lock_wait`, and how long it held it as
+    `lock_hold`."""
+
+    def __init__(self, inner, metrics):
+        self._inner = inner
+        self._metrics = metrics
+        self._local = threading.local()
+        self._shared = _SharedSide(self)
+
+    def __enter__(self):
+        self._acquire(self._inner.__enter__)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._inner.__exit__(exc_type, exc_value, traceback)
+        self._release()
+
+    def shared(self):
+        return self._shared
+
+    def downgraded(self):
+        return self._inner.downgraded()
+
+    def acquire_shared(self):
+        self._acquire(self._inner.shared().__enter__)
+
+    def release_shared(self):
+        self._inner.shared().__exit__(None, None, None)
+        self._release()
+
+    def _acquire(self, acquire):
+        depth = getattr(self._local, "depth", 0)
+        if depth:
+            acquire()
+        else:
+            start = time.perf_counter()
+            acquire()
+            self._local.acquired = time.perf_counter()
+            self._metrics.observe("lock_wait", self._local.acquired - start)
+        self._local.depth = depth + 1
+
+    def _release(self):
+        depth = self._local.depth - 1
+        self._local.depth = depth
+        if not depth:
+            self._metrics.observe("lock_hold", time.perf_counter() - self._local.acquired)
+
+
+def _signature(obj):
+    """The inode, size and modification time of the files behind `obj`;
+    saving, appending to or removing a file changes it. With `lock`, the
+    save count of the lock file is included too."""
+    signature = []
+    lock = _file_lock(obj)
+    if lock is not None:
+        signature.append(lock.generation())
+    for filepath in obj._watched_files():
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            signature.append(None)
+        else:
+            signature.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
 
+def _record_write(obj):
+    """Note that `obj` just saved its files, so they are not stale to it."""
+    lock = _file_lock(obj)
+    if lock is not None:
+        lock.record_write()
+    obj._signature = _signature(obj)
 
-def _read_json(filepath, mode, cypher=None):
-    """Read and parse a JSON file into a Python dictionary."""
+
+def _refresh(obj):
+    """Reload `obj` if its file changed and it holds no unsaved changes."""
+    if obj._version == obj._saved_version and obj.is_stale():
+        obj.reload()
+
+
+class _Flusher:
+    """Background thread that writes a deferred-autosave instance at most
+    once per flush interval, coalescing every change in between."""
+
+    def __init__(self, obj):
+        self._ref = weakref.ref(obj)
+        self._interval = obj._flush_interval
+        self._wakeup = threading.Event()
+        # set to skip what is left of the flush interval
+        self._hurry = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="arkivist-flusher", daemon=True
+        )
+        self._thread.start()
+
+    def schedule(self, now=False):
+        if now:
+            self._hurry.set()
+        self._wakeup.set()
+
+    def _run(self):
+        # the first save also waits for a whole interval
+        last = time.monotonic()
+        while True:
+            if not self._wakeup.wait(1.0):
+                # idle; stop once the instance has been garbage collected
+                if self._ref() is None:
+                    return
+                continue
+            delay = last + self._interval - time.monotonic()
+            if delay > 0:
+                self._hurry.wait(delay)
+            self._hurry.clear()
+            self._wakeup.clear()
+            obj = self._ref()
+            if obj is None:
+                return
+            try:
+                _save_snapshot(obj)
+            except Exception as e:
+                # e.g. a value that cannot be encoded; reported to the
+                # waiters, and the next change is saved again
+                obj._flush_error = e
+                with obj._saved:
+                    obj._saved.notify_all()
+            last = time.monotonic()
+            del obj
+
+
+def _save_snapshot(obj):
+    """Save unsaved changes of `obj`, copying the contents under its lock,
+    then encoding and writing the copy without it, so other threads only
+    wait for the copy."""
+    with obj._lock:
+        if obj._version == obj._saved_version:
+            return
+        save = obj._prepare_save(snapshot=True)
+        # taken before letting go of the lock, so saves land in order
+        obj._writing.acquire()
+    error = None
+    try:
+        with _timed(obj, "save"):
+            save.write()
+    except BaseException as e:
+        error = e
+    finally:
+        obj._writing.release()
+    with obj._lock:
+        if error is None:
+            save.finish()
+        else:
+            save.abandon()
+    if error is not None:
+        raise error
+
+
+def _schedule_flush(obj, now=False):
+    if obj._flusher is None:
+        obj._flusher = _Flusher(obj)
+        _DEFERRED[id(obj)] = obj
+    obj._flusher.schedule(now)
+
+
+@atexit.register
+def _flush_deferred():
+    """Write out every deferred-autosave instance before exiting."""
+    for obj in list(_DEFERRED.values()):
+        try:
+            obj.flush()
+        except Exception as e:
+            warnings.warn(f"Arkivist could not save `{obj.filepath}`: {e}")
+
+
+def _journal_path(filepath):
+    return filepath + _JOURNAL_SUFFIX
+
+
+def _measure_journal(obj):
+    """Pick up the on-disk sizes used to decide when to compact."""
+    try:
+        obj._base_size = os.path.getsize(obj._filepath)
+    except OSError:
+        # missing base file, the first save must create it
+        obj._base_size = 0
+        obj._pending = None
+        return
+    try:
+        obj._journal_size = os.path.getsize(_journal_path(obj._filepath))
+    except OSError:
+        obj._journal_size = 0
+    obj._pending = {}
+
+
+def _replay_journal(filepath, content, cypher=None, codec=None):
+    """Apply the records of a journal sidecar, in order, onto `content`."""
+    try:
+        with open(_journal_path(filepath), "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return content
+    except OSError as e:
+        raise ArkivistException(f"Unable to read the journal of `{filepath}`: {e}") from e
+
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            if not line.startswith("{"):
+                if cypher is None:
+                    raise ArkivistException(
+                        f"The journal of `{filepath}` is encrypted; a valid `authfile` is required to read it."
+                    )
+                line = cypher.decrypt(line.encode("utf-8")).decode("utf-8")
+            record = _get_codec(codec).loads(line)
+            op, path = record["op"], record["path"]
+        except ArkivistException:
+            raise
+        except Exception as e:
+            if number == len(lines):
+                # a record cut short by an interrupted append
+                break
+            raise ArkivistException(
+                f"The journal of `{filepath}` is corrupted at line {number}."
+            ) from e
+        if len(path) > 1 and type(content.get(path[0])) is _Span:
+            content[path[0]] = content[path[0]].decode(codec)
+        container = content
+        for key in path[:-1]:
+            container = container.get(key) if isinstance(container, dict) else None
+        if not isinstance(container, dict):
+            continue
+        if op == "set":
+            container[path[-1]] = record.get("value")
+        elif op == "del":
+            container.pop(path[-1], None)
+    return content
+
+
+def _journal_records(obj):
+    """The journal record of each pending path, holding the current value
+    at the path or deleting it."""
+    records = []
+    for path in obj._pending:
+        container, found = obj, True
+        for key in path:
+            if isinstance(container, dict) and key in container:
+                container = dict.__getitem__(container, key)
+            else:
+                found = False
+                break
+        record = {"op": "set" if found else "del", "path": [_json_key(k) for k in path]}
+        if found:
+            record["value"] = container
+        records.append(record)
+    return records
+
+
+def _append_journal(obj, filepath, records):
+    """Append `records` to the journal sidecar, one line each."""
+    lines = []
+    for record in records:
+        line = _get_codec(obj._codec).dumps(record)
+        if obj._encrypt:
+            if obj._cypher is None:
+                raise ArkivistException(
+                    "Encryption is enabled but no valid authfile is loaded."
+                )
+            line = obj._cypher.encrypt(line.encode("utf-8")).decode("utf-8")
+        lines.append(line + "\n")
+    if not lines:
+        return
+    content = "".join(lines).encode("utf-8")
+    try:
+        with _timed(obj, "write"), open(_journal_path(filepath), "ab") as f:
+            f.write(content)
+    except OSError as e:
+        raise ArkivistException(f"Unable to write to `{filepath}`: {e}") from e
+    obj._journal_size += len(content)
+    if obj._metrics is not None:
+        obj._metrics.count("bytes_written", len(content))
+
+
+def _discard_journal(filepath):
+    """Remove the journal sidecar once its records are in the base file."""
+    try:
+        os.remove(_journal_path(filepath))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        raise ArkivistException(
+            f"Unable to remove the journal of `{filepath}`: {e}"
+        ) from e
+
+
+def _read_json(
+    filepath, mode, cypher=None, codec=None, lazy=False, mapped=False, sealed=None, detected=None
+):
+    """Read and parse a JSON file into a Python dictionary.
+
+    With `lazy`, the top-level values are left as `_Span` placeholders;
+    with `mapped`, they point into a memory map of the file, or into the
+    decrypted chunks of an encrypted one. Compressed files are
+    decompressed in memory instead of being mapped. The tokens of
+    encrypted chunks are added to `sealed`, see `_seal`, and a MessagePack
+    format or a compression found in the file to `detected`.
+    """
+    if detected is None:
+        detected = {}
     encrypt, content = False, {}
     filepath = _validate_filepath(filepath)
     if not isinstance(filepath, str):
@@ -716,34 +3244,157 @@ def _read_json(filepath, mode, cypher=None):
         return encrypt, content
 
     try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            temp = f.read().strip()
+        with open(filepath, "rb") as f:
+            if mapped:
+                temp, members = _map_file(filepath, f)
+            else:
+                temp = f.read()
+            method = compression.detect(temp)
+            if method:
+                detected["compression"] = method
+                mapped = False
+                temp = _decompress(filepath, temp)
+            if _is_binary(temp):
+                detected["format"] = "msgpack"
+                # binary documents are always decoded whole
+                mapped = lazy = False
+                temp = temp[:]
     except FileNotFoundError as e:
         if mode == "r":
             raise ArkivistException(f"File not found: `{filepath}`") from e
-        return encrypt, content
+        return encrypt, _replay_journal(filepath, content, cypher, codec)
     except OSError as e:
         raise ArkivistException(f"Unable to read `{filepath}`: {e}") from e
 
-    if temp in ("", "{}"):
+    if mapped:
+        encrypt, content = _scan_document(filepath, temp, cypher, codec, members, sealed)
+        if members is None and not encrypt:
+            _save_offsets(filepath, temp, content)
+    elif lazy:
+        encrypt, content = _scan_document(filepath, temp, cypher, codec, sealed=sealed)
+    else:
+        encrypt, content = _decode_document(filepath, temp, cypher, codec, sealed)
+    if encrypt and sealed:
+        # the chunks are compressed, not the envelope
+        method = next(iter(sealed))[0]
+        if method:
+            detected["compression"] = method
+    return encrypt, _replay_journal(filepath, content, cypher, codec)
+
+
+def _scan_document(filepath, temp, cypher=None, codec=None, members=None, sealed=None):
+    """Like `_decode_document`, but only locate the top-level values,
+    unless their offsets are already known from `members`."""
+    if not len(temp):
+        return False, {}
+    if members is None:
+        try:
+            members = scan_object(temp)
+        except ValueError as e:
+            if not temp[:].strip():
+                return False, {}
+            raise ArkivistException(
+                f"`{filepath}` does not contain a valid JSON object ({e})."
+            ) from e
+    if len(members) == len(_ENVELOPE_KEYS) and {
+        key for key, _, _ in members
+    } == set(_ENVELOPE_KEYS):
+        # the values are located in the decrypted chunks instead
+        return _decode_document(filepath, temp[:], cypher, codec, sealed, lazy=True)
+    return False, {key: _Span(temp, start, end) for key, start, end in members}
+
+
+def _offsets_path(filepath):
+    return filepath + _OFFSETS_SUFFIX
+
+
+def _map_file(filepath, f):
+    """Memory-map an open file, with the member offsets of its `.idx`
+    sidecar, or None when the sidecar is missing or out of date."""
+    stat = os.fstat(f.fileno())
+    if not stat.st_size:
+        return b"", None
+    buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return buffer, _load_offsets(filepath, stat)
+
+
+def _load_offsets(filepath, stat):
+    try:
+        with open(_offsets_path(filepath), "rb") as f:
+            header = json.loads(f.readline())
+            if (
+                header.get("arkivist") != _OFFSETS_VERSION
+                or header.get("size") != stat.st_size
+                or header.get("mtime_ns") != stat.st_mtime_ns
+            ):
+                return None
+            keys = json.loads(f.readline())
+            offsets = array("q")
+            offsets.frombytes(f.read())
+    except (OSError, ValueError, AttributeError):
+        return None
+    if header.get("byteorder") != _BYTEORDER:
+        offsets.byteswap()
+    if len(keys) * 2 != len(offsets):
+        return None
+    return list(zip(keys, offsets[0::2], offsets[1::2]))
+
+
+def _save_offsets(filepath, buffer, content):
+    """Write the `.idx` sidecar, skipping it silently when the directory
+    is not writable: it only speeds up the next open."""
+    try:
+        stat = os.stat(filepath)
+        if stat.st_size != len(buffer):
+            return
+        offsets = array("q")
+        for span in content.values():
+            offsets.extend((span.start, span.end))
+        header = {
+            "arkivist": _OFFSETS_VERSION,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "byteorder": _BYTEORDER,
+        }
+        _atomic_write(
+            _offsets_path(filepath),
+            [
+                json.dumps(header).encode("utf-8") + b"\n",
+                json.dumps(list(content), ensure_ascii=False).encode("utf-8") + b"\n",
+                offsets.tobytes(),
+            ],
+        )
+    except (OSError, ArkivistException):
+        pass
+
+
+def _decode_document(filepath, temp, cypher=None, codec=None, sealed=None, lazy=False):
+    """Parse the raw bytes of a stored JSON or MessagePack object,
+    decompressing them and decrypting them as needed.
+
+    The values of encrypted JSON chunks are left as `_Span` placeholders
+    when `lazy`, and the chunk tokens are added to `sealed`.
+    """
+    encrypt, content = False, {}
+    temp = _decompress(filepath, temp)
+    if not temp or temp.isspace():
         return encrypt, content
+    if _is_binary(temp):
+        loads, kind = binary.unpackb, "MessagePack"
+    else:
+        loads, kind = _get_codec(codec).loads, "JSON"
     try:
-        content = json.loads(temp)
-    except json.JSONDecodeError as e:
+        content = loads(temp)
+    except ValueError as e:
         raise ArkivistException(
-            f"`{filepath}` does not contain valid JSON ({e})."
+            f"`{filepath}` does not contain valid {kind} ({e})."
         ) from e
     if not isinstance(content, dict):
         raise ArkivistException(
-            f"`{filepath}` must contain a JSON object at the root."
+            f"`{filepath}` must contain a {kind} object at the root."
         )
 
-    if (
-        len(content) == len(_ENVELOPE_KEYS)
-        and all(key in content for key in _ENVELOPE_KEYS)
-        and content.get("encryption") == "fernet"
-        and isinstance(content.get("content"), str)
-    ):
+    if _is_envelope(content):
         encrypt = True
         try:
             version = float(content["arkivist"])
@@ -755,53 +3406,309 @@ def _read_json(filepath, mode, cypher=None):
             raise ArkivistException(
                 f"`{filepath}` is encrypted; a valid `authfile` is required to read it."
             )
+        content = _unseal(filepath, content["content"], cypher, codec, sealed, lazy)
+    return encrypt, content
+
+
+def _is_envelope(content):
+    """Whether a stored object is an encryption envelope: its content is
+    a single token up to version 1.3, and a list of chunk tokens since."""
+    if len(content) != len(_ENVELOPE_KEYS) or content.get("encryption") != "fernet":
+        return False
+    if not all(key in content for key in _ENVELOPE_KEYS):
+        return False
+    tokens = content.get("content")
+    if isinstance(tokens, list):
+        return all(isinstance(token, str) for token in tokens)
+    return isinstance(tokens, str)
+
+
+def _unseal(filepath, tokens, cypher, codec=None, sealed=None, lazy=False):
+    """Decrypt and merge the chunks of an envelope, see `_seal`."""
+    content = {}
+    for token in [tokens] if isinstance(tokens, str) else tokens:
         try:
-            encrypted = content["content"].encode("utf-8")
-            decrypted = cypher.decrypt(encrypted).decode("utf-8").strip()
-            content = json.loads(decrypted if decrypted else "{}")
+            plaintext = cypher.decrypt(token.encode("utf-8"))
+            method = compression.detect(plaintext)
+            plaintext = compression.decompress(plaintext)
+            if not plaintext or plaintext.isspace():
+                plaintext = b"{}"
+            if lazy and not _is_binary(plaintext):
+                members = scan_object(plaintext)
+                content.update(
+                    (key, _Span(plaintext, start, end)) for key, start, end in members
+                )
+            elif _is_binary(plaintext):
+                content.update(binary.unpackb(plaintext))
+            else:
+                content.update(_get_codec(codec).loads(plaintext))
         except Exception as e:
             raise ArkivistException(
                 f"Failed to decrypt `{filepath}`; the authfile may not match this file."
             ) from e
-    return encrypt, content
+        if sealed is not None:
+            sealed[(method, _digest(plaintext))] = token
+    return content
 
 
-def _write_json(obj, forced=False):
-    """Write JSON object as string representation into file, atomically."""
-    if not (forced or obj._autosave):
-        return
+def _digest(plaintext):
+    return hashlib.blake2b(plaintext, digest_size=16).digest()
 
-    filepath = obj._save_as if obj._save_as is not None else obj._filepath
-    filepath = _validate_filepath(filepath)
-    if not isinstance(filepath, str):
-        return
 
-    dataset = obj
+def _write_json(obj, forced=False, compact=False):
+    """Write JSON object as string representation into file, atomically.
+
+    In journal mode, pending changes are appended to the journal instead,
+    and the file is only rewritten once the journal grows too large. With
+    deferred autosave, the write is left to the background flusher.
+    """
+    if not forced:
+        if obj._version == obj._saved_version:
+            obj._skipped_writes += 1
+            if obj._metrics is not None:
+                obj._metrics.count("writes_skipped")
+            return
+        if not obj._autosave or obj._deferred:
+            if obj._autosave and obj._filepath is not None:
+                _schedule_flush(obj)
+            return
+    # readers may go on while the contents are saved
+    with obj._lock.downgraded():
+        obj._persist(compact)
+
+
+class _Save:
+    """A save of an instance, prepared while holding its lock.
+
+    Preparing captures what is written: the contents, or in journal mode
+    the records of the changed paths. With `snapshot`, the contents are a
+    shallow copy, and containers changed in place are copied first (see
+    `_detach()`), so `write()` can run without the lock while the
+    instance keeps changing. Saves are written one at a time, holding
+    `_writing`; `finish()` or `abandon()` then records the outcome, under
+    the lock again.
+    """
+
+    def __init__(self, obj, compact=False, snapshot=False):
+        self.obj = obj
+        self.version = obj._version
+        self.save_as = obj._save_as
+        self.snapshot = snapshot
+        self.filepath = _validate_filepath(obj._filepath if self.save_as is None else self.save_as)
+        self.records = None
+        self.dataset = None
+        if not isinstance(self.filepath, str):
+            self.filepath = None
+            return
+        if snapshot:
+            obj._snapshots += 1
+            obj._detached = set()
+        if obj._journal and self.save_as is None:
+            threshold = max(_COMPACT_MIN_BYTES, obj._base_size * _COMPACT_RATIO)
+            # a snapshot cannot be compacted after appending, see `write()`
+            overgrown = snapshot and obj._journal_size > threshold
+            if obj._pending is not None and not compact and not overgrown:
+                self.records = _journal_records(obj)
+                obj._pending = {}
+                if not snapshot:
+                    self.dataset = obj
+                return
+            # changes made from now on are journaled after this save
+            obj._pending = {}
+        if not snapshot:
+            self.dataset = obj
+            return
+        if obj._lazy and obj._format != "json":
+            # only JSON documents copy undecoded values as they are
+            obj._load_all()
+        self.dataset = dict.copy(obj)
+
+    def write(self):
+        obj = self.obj
+        if self.filepath is None:
+            return
+        if self.records is not None:
+            _append_journal(obj, self.filepath, self.records)
+            threshold = max(_COMPACT_MIN_BYTES, obj._base_size * _COMPACT_RATIO)
+            # without the contents, the next save compacts instead
+            if self.dataset is None or obj._journal_size <= threshold:
+                return
+        content = _encode_document(obj, self.dataset, self.save_as)
+        _atomic_write(self.filepath, content, obj._metrics)
+        if self.save_as is None:
+            # the base file now holds every journaled change
+            _discard_journal(self.filepath)
+            obj._base_size = _content_size(content)
+            obj._journal_size = 0
+
+    def finish(self):
+        obj = self.obj
+        if self.filepath is not None and obj._metrics is not None:
+            obj._metrics.count("writes")
+        if self.filepath is not None and self.save_as is None:
+            obj._saved_version = max(obj._saved_version, self.version)
+            _record_write(obj)
+            if obj._validators_due is not None and obj._saved_version >= obj._validators_due:
+                _save_validators(obj)
+        self._done()
+
+    def abandon(self):
+        if self.obj._journal and self.save_as is None:
+            # the pending records may be lost, rewrite everything next
+            self.obj._pending = None
+        self._done()
+
+    def _done(self):
+        obj = self.obj
+        if self.snapshot and self.filepath is not None:
+            obj._snapshots -= 1
+        with obj._saved:
+            obj._saved.notify_all()
+
+
+def _encode_document(obj, dataset, save_as=None, slot=None):
+    """Serialize `dataset` the way `obj` stores it on disk, in the format
+    and compression of `obj`, or those selected by the extension of
+    `save_as`: sorted when autosort is enabled, and wrapped in an envelope
+    when encrypted. Encrypted contents are compressed before encryption,
+    and the envelope is left uncompressed; `slot` names the document among
+    those of `obj`, see `_seal`.
+
+    Returns bytes, or a list of byte chunks when undecoded values are
+    copied as they are or the document is compressed.
+    """
+    if save_as is None:
+        format, method = obj._format, obj._compression
+    else:
+        format, method = _file_format(save_as), _file_compression(save_as)
+    if obj._lazy and any(type(value) is _Span for value in dict.values(dataset)):
+        if not obj._encrypt and format == "json":
+            with _timed(obj, "encode"):
+                content = _encode_spans(obj, dataset)
+            return _compress(obj, content, method) if method else content
+        if format != "json":
+            obj._load_all()
     if obj._autosort:
-        dataset = dict(sorted(obj.items(), reverse=bool(obj._reverse)))
+        dataset = dict(sorted(dataset.items(), reverse=bool(obj._reverse)))
 
+    if format == "msgpack":
+        encode = binary.packb
+    else:
+        encode = _get_codec(obj._codec).encode
     if obj._encrypt:
         if obj._cypher is None:
             raise ArkivistException(
                 "Encryption is enabled but no valid authfile is loaded."
             )
-        payload = json.dumps(dataset, ensure_ascii=False)
-        envelope = {
-            "arkivist": _ENVELOPE_VERSION,
-            "encryption": "fernet",
-            "content": obj._cypher.encrypt(payload.encode("utf-8")).decode("utf-8"),
-        }
-        content = json.dumps(envelope, ensure_ascii=False)
-    else:
+        # chunks are encoded and compressed as they are sealed
+        with _timed(obj, "encrypt"):
+            sealed = _seal(obj, dataset, encode, method, slot, save_as is None)
+        with _timed(obj, "encode"):
+            return encode({"arkivist": _ENVELOPE_VERSION, "encryption": "fernet", "content": sealed})
+    with _timed(obj, "encode"):
+        if format == "msgpack":
+            content = encode(dataset)
+        else:
+            indent = obj._indent if obj._indent in (0, 1, 2, 3, 4) else 4
+            content = encode(dataset, indent)
+    return _compress(obj, content, method) if method else content
+
+
+def _compress(obj, content, method):
+    with _timed(obj, "compress"):
+        return _compressed(content, method, obj._level)
+
+
+def _compressed(content, method, level):
+    try:
+        return compression.compress(content, method, level)
+    except ValueError as e:
+        raise ArkivistException(f"Unable to compress with `{method}` ({e}).") from e
+
+
+def _seal(obj, dataset, encode, method=None, slot=None, remember=True):
+    """Encrypt `dataset` as a list of Fernet tokens, one per chunk of
+    consecutive keys, see `_CHUNK_KEYS`.
+
+    A chunk whose plaintext is unchanged since it was last read or
+    written keeps its token, so saves only encrypt the chunks that
+    changed; as a consequence, the file shows which chunks changed
+    between saves. Chunks still holding undecoded values are encoded
+    without decoding them.
+    """
+    cache = obj._sealed.get(slot, {})
+    tokens, used = [], {}
+    chunk = {}
+    items = list(dict.items(dataset))
+    for number, (key, value) in enumerate(items, start=1):
+        chunk[key] = value
+        if number < len(items) and zlib.crc32(_json_key(key).encode("utf-8")) % _CHUNK_KEYS:
+            continue
+        if any(type(value) is _Span for value in chunk.values()):
+            plaintext = b"".join(_encode_spans(obj, chunk, indent=0))
+        else:
+            plaintext = encode(chunk)
+        digest = (method, _digest(plaintext))
+        token = cache.get(digest)
+        if token is None:
+            if method:
+                plaintext = b"".join(_compressed(plaintext, method, obj._level))
+            token = obj._cypher.encrypt(plaintext).decode("utf-8")
+        tokens.append(token)
+        used[digest] = token
+        chunk = {}
+    if remember:
+        obj._sealed[slot] = used
+    return tokens
+
+
+def _encode_spans(obj, dataset, indent=None):
+    """Serialize `dataset` member by member, copying the bytes of values
+    that were never decoded instead of decoding and encoding them again;
+    with the indent of `obj` unless `indent` is given."""
+    items = dict.items(dataset)
+    if obj._autosort:
+        items = sorted(items, reverse=bool(obj._reverse))
+    codec = _get_codec(obj._codec)
+    if indent is None:
         indent = obj._indent if obj._indent in (0, 1, 2, 3, 4) else 4
-        content = json.dumps(dataset, indent=indent, ensure_ascii=False)
-    _atomic_write(filepath, content)
+    prefix = b" " * indent
+    members = []
+    for key, value in items:
+        if type(value) is _Span:
+            key = _json_key(key)
+            if key.isprintable() and '"' not in key and "\\" not in key:
+                # nothing to escape
+                key = b'"' + key.encode("utf-8") + b'"'
+            else:
+                key = codec.encode(key)
+            members.extend((b",\n" if indent else b", ", prefix, key, b": ", value.raw()))
+        else:
+            # encoded as a one-member object, so nested values are indented
+            member = codec.encode({key: value}, indent or None)[1:-1].strip(b"\r\n")
+            members.extend((b",\n" if indent else b", ", member))
+    if not members:
+        return [b"{}"]
+    members[0] = b"{\n" if indent else b"{"
+    members.append(b"\n}" if indent else b"}")
+    return members
+
 
+def _content_size(content):
+    if isinstance(content, (str, bytes)):
+        return len(content)
+    return sum(len(chunk) for chunk in content)
 
-def _atomic_write(filepath, content):
+
+def _atomic_write(filepath, content, metrics=None):
     """Write to a temporary file and move it into place, so an interrupted
-    write can never leave a truncated or corrupted JSON file behind."""
+    write can never leave a truncated or corrupted JSON file behind.
+
+    `content` may be text, written as UTF-8, already encoded bytes, or a
+    list of byte chunks. `metrics` times both steps and counts the bytes.
+    """
     directory = os.path.dirname(os.path.abspath(filepath))
+    start = time.perf_counter() if metrics is not None else None
     try:
         os.makedirs(directory, exist_ok=True)
         fd, temppath = tempfile.mkstemp(
@@ -810,9 +3717,21 @@ def _atomic_write(filepath, content):
     except OSError as e:
         raise ArkivistException(f"Unable to write to `{filepath}`: {e}") from e
     try:
-        with os.fdopen(fd, "w", encoding="utf-8") as f:
-            f.write(content)
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        with os.fdopen(fd, "wb") as f:
+            if isinstance(content, bytes):
+                f.write(content)
+            else:
+                f.writelines(content)
+        if metrics is not None:
+            written = time.perf_counter()
+            metrics.observe("write", written - start)
+            size = len(content) if isinstance(content, bytes) else sum(map(len, content))
+            metrics.count("bytes_written", size)
         os.replace(temppath, filepath)
+        if metrics is not None:
+            metrics.observe("rename", time.perf_counter() - written)
     except OSError as e:
         try:
             os.remove(temppath)
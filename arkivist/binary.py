@@ -0,0 +1,274 @@
+"""
+    (c) 2020 Rodney Maniego Jr.
+    Arkivist
+
+    MessagePack encoding of Arkivist contents, the binary alternative to JSON.
+
+    Documents hold the same data a JSON file would: dictionary keys are
+    converted to strings the way `json.dumps` converts them, tuples become
+    lists, and integers beyond 64 bits are kept exactly as extension type 0.
+    The pure Python implementation below is always available; when the
+    `msgpack` package is installed, it is used instead for speed.
+"""
+
+import gc
+import json
+import struct
+from contextlib import contextmanager
+
+__all__ = ["packb", "unpackb"]
+
+# extension type of the integers that do not fit in 64 bits
+_BIGINT = 0
+
+_msgpack = None
+
+
+def _backend():
+    """The `msgpack` module, or False when it is not installed."""
+    global _msgpack
+    if _msgpack is None:
+        try:
+            import msgpack
+        except ImportError:
+            msgpack = False
+        _msgpack = msgpack
+    return _msgpack
+
+
+def packb(data):
+    """Encode `data` as MessagePack; unsupported values raise a `TypeError`."""
+    msgpack = _backend()
+    if msgpack and not _foreign_keys(data):
+        try:
+            return msgpack.packb(data, use_bin_type=True)
+        except (OverflowError, msgpack.PackOverflowError):
+            # integers beyond 64 bits need the extension type
+            pass
+    parts = []
+    _pack(data, parts.append)
+    return b"".join(parts)
+
+
+def unpackb(buffer):
+    """Decode a MessagePack document; malformed input raises a `ValueError`."""
+    msgpack = _backend()
+    with _paused_gc():
+        if msgpack:
+            try:
+                return msgpack.unpackb(
+                    buffer, raw=False, strict_map_key=False, ext_hook=_ext_hook
+                )
+            except (ValueError, msgpack.UnpackException) as e:
+                raise ValueError(f"Invalid MessagePack document ({e})") from e
+        unpacker = _Unpacker(bytes(buffer))
+        value = unpacker.unpack()
+    if unpacker.pos != len(unpacker.data):
+        raise ValueError(f"Extra data at byte {unpacker.pos}")
+    return value
+
+
+@contextmanager
+def _paused_gc():
+    """Pause the cyclic garbage collector, which would otherwise run over
+    and over while a large document allocates its containers; decoded
+    documents hold no reference cycles."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _key(key):
+    """Convert a dictionary key the same way `json.dumps` does."""
+    if isinstance(key, str):
+        return key
+    if key is None or isinstance(key, (bool, int, float)):
+        return json.dumps(key)
+    raise TypeError(
+        f"keys must be str, int, float, bool or None, not {type(key).__name__}"
+    )
+
+
+def _foreign_keys(value):
+    """Whether a dictionary inside `value` has keys that are not strings."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if type(key) is not str:
+                return True
+            if isinstance(item, (dict, list, tuple)) and _foreign_keys(item):
+                return True
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            if isinstance(item, (dict, list, tuple)) and _foreign_keys(item):
+                return True
+    return False
+
+
+def _ext_hook(code, data):
+    if code == _BIGINT:
+        return int(data.decode("ascii"))
+    raise ValueError(f"Unsupported extension type {code}")
+
+
+_UINT = ((0xFF, 0xCC, ">B"), (0xFFFF, 0xCD, ">H"), (0xFFFFFFFF, 0xCE, ">I"), (2**64 - 1, 0xCF, ">Q"))
+_INT = ((-(2**7), 0xD0, ">b"), (-(2**15), 0xD1, ">h"), (-(2**31), 0xD2, ">i"), (-(2**63), 0xD3, ">q"))
+
+
+def _pack(value, write):
+    kind = type(value)
+    if kind is str or isinstance(value, str):
+        data = value.encode("utf-8")
+        size = len(data)
+        if size < 32:
+            write(bytes((0xA0 | size,)))
+        else:
+            _pack_size(size, write, 0xD9, 0xDA, 0xDB)
+        write(data)
+    elif value is None:
+        write(b"\xc0")
+    elif value is True:
+        write(b"\xc3")
+    elif value is False:
+        write(b"\xc2")
+    elif kind is int or isinstance(value, int):
+        _pack_int(int(value), write)
+    elif kind is float or isinstance(value, float):
+        write(struct.pack(">Bd", 0xCB, value))
+    elif isinstance(value, dict):
+        size = len(value)
+        if size < 16:
+            write(bytes((0x80 | size,)))
+        else:
+            _pack_size(size, write, None, 0xDE, 0xDF)
+        for key, item in value.items():
+            _pack(_key(key), write)
+            _pack(item, write)
+    elif isinstance(value, (list, tuple)):
+        size = len(value)
+        if size < 16:
+            write(bytes((0x90 | size,)))
+        else:
+            _pack_size(size, write, None, 0xDC, 0xDD)
+        for item in value:
+            _pack(item, write)
+    else:
+        raise TypeError(f"Object of type {kind.__name__} is not MessagePack serializable")
+
+
+def _pack_size(size, write, code8, code16, code32):
+    if code8 is not None and size < 0x100:
+        write(struct.pack(">BB", code8, size))
+    elif size < 0x10000:
+        write(struct.pack(">BH", code16, size))
+    elif size < 0x100000000:
+        write(struct.pack(">BI", code32, size))
+    else:
+        raise ValueError("Object too large for MessagePack")
+
+
+def _pack_int(value, write):
+    if 0 <= value < 0x80:
+        write(bytes((value,)))
+        return
+    if -32 <= value < 0:
+        write(bytes((value & 0xFF,)))
+        return
+    for limit, code, layout in _UINT if value > 0 else _INT:
+        if (value <= limit) if value > 0 else (value >= limit):
+            write(bytes((code,)) + struct.pack(layout, value))
+            return
+    data = str(value).encode("ascii")
+    _pack_size(len(data), write, 0xC7, 0xC8, 0xC9)
+    write(bytes((_BIGINT,)))
+    write(data)
+
+
+class _Unpacker:
+    """Pure Python MessagePack decoder over a bytes buffer."""
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def read(self, size):
+        start, end = self.pos, self.pos + size
+        if end > len(self.data):
+            raise ValueError("Unexpected end of MessagePack data")
+        self.pos = end
+        return self.data[start:end]
+
+    def number(self, layout):
+        size = struct.calcsize(layout)
+        return struct.unpack(layout, self.read(size))[0]
+
+    def unpack(self):
+        code = self.read(1)[0]
+        if code <= 0x7F:
+            return code
+        if code >= 0xE0:
+            return code - 0x100
+        if 0x80 <= code <= 0x8F:
+            return self.map(code & 0x0F)
+        if 0x90 <= code <= 0x9F:
+            return self.array(code & 0x0F)
+        if 0xA0 <= code <= 0xBF:
+            return self.text(code & 0x1F)
+        if code == 0xC0:
+            return None
+        if code == 0xC2:
+            return False
+        if code == 0xC3:
+            return True
+        if code in (0xC4, 0xC5, 0xC6):
+            return self.read(self.number(_SIZES[code]))
+        if code in (0xC7, 0xC8, 0xC9):
+            size = self.number(_SIZES[code])
+            return _ext_hook(self.read(1)[0], self.read(size))
+        if code in (0xD4, 0xD5, 0xD6, 0xD7, 0xD8):
+            size = 1 << (code - 0xD4)
+            return _ext_hook(self.read(1)[0], self.read(size))
+        if code in _NUMBERS:
+            return self.number(_NUMBERS[code])
+        if code in (0xD9, 0xDA, 0xDB):
+            return self.text(self.number(_SIZES[code]))
+        if code in (0xDC, 0xDD):
+            return self.array(self.number(_SIZES[code]))
+        if code in (0xDE, 0xDF):
+            return self.map(self.number(_SIZES[code]))
+        raise ValueError(f"Invalid MessagePack byte 0x{code:02x} at {self.pos - 1}")
+
+    def text(self, size):
+        try:
+            return self.read(size).decode("utf-8")
+        except UnicodeDecodeError as e:
+            raise ValueError(str(e)) from e
+
+    def array(self, size):
+        return [self.unpack() for _ in range(size)]
+
+    def map(self, size):
+        content = {}
+        for _ in range(size):
+            key = self.unpack()
+            try:
+                content[key] = self.unpack()
+            except TypeError as e:
+                raise ValueError(f"Unhashable MessagePack map key at {self.pos}") from e
+        return content
+
+
+_SIZES = {
+    0xC4: ">B", 0xC5: ">H", 0xC6: ">I",
+    0xC7: ">B", 0xC8: ">H", 0xC9: ">I",
+    0xD9: ">B", 0xDA: ">H", 0xDB: ">I",
+    0xDC: ">H", 0xDD: ">I", 0xDE: ">H", 0xDF: ">I",
+}
+_NUMBERS = {
+    0xCA: ">f", 0xCB: ">d",
+    0xCC: ">B", 0xCD: ">H", 0xCE: ">I", 0xCF: ">Q",
+    0xD0: ">b", 0xD1: ">h", 0xD2: ">i", 0xD3: ">q",
+}
@@ -0,0 +1,227 @@
+"""
+    (c) 2020 Rodney Maniego Jr.
+    Arkivist
+
+    Interchangeable JSON codecs used to serialize Arkivist contents.
+
+    The standard library `json` module is the default and the reference for
+    every other backend. `orjson`, `msgspec` and `ujson` are imported lazily
+    and only when selected, so none of them is required.
+"""
+
+import json
+import math
+
+__all__ = ["available_codecs", "get_codec", "set_default_codec"]
+
+
+class JSONCodec:
+    """Standard library codec.
+
+    `dumps()` returns compact JSON when `indent` is None and indented JSON
+    otherwise, never escaping non-ASCII characters. Dictionary keys that
+    are not strings are converted the way `json.dumps` converts them.
+    """
+
+    name = "json"
+
+    def dumps(self, data, indent=None):
+        return json.dumps(data, indent=indent, ensure_ascii=False)
+
+    def encode(self, data, indent=None):
+        """Like `dumps()`, but returns UTF-8 encoded bytes."""
+        return self.dumps(data, indent).encode("utf-8")
+
+    def loads(self, text):
+        """Parse a `str` or UTF-8 `bytes` document; malformed input raises
+        a `ValueError`."""
+        return json.loads(text)
+
+
+class _FastCodec(JSONCodec):
+    """Base for third-party backends.
+
+    Backends produce the same documents as the standard library, except
+    for whitespace: an `indent` of 0 is written compact, and only the
+    indents a backend supports natively are delegated to it. Input a
+    backend rejects (such as integers beyond 64 bits, or keys it cannot
+    convert) is serialized by the standard library instead, and so are
+    NaN and infinities where a backend writes them differently.
+    """
+
+    indents = (None, 0)
+    # what the backend writes in place of NaN and infinities, where it
+    # differs from the standard library
+    non_finite_marks = ()
+
+    def dumps(self, data, indent=None):
+        return self.encode(data, indent).decode("utf-8")
+
+    def encode(self, data, indent=None):
+        if indent in self.indents:
+            try:
+                content = self._encode(data, indent or None)
+            except (TypeError, OverflowError):
+                pass
+            else:
+                # only documents with a mark can hold a non-finite float
+                marked = any(mark in content for mark in self.non_finite_marks)
+                if not (marked and _non_finite(data)):
+                    return content
+        return json.dumps(data, indent=indent, ensure_ascii=False).encode("utf-8")
+
+    def _encode(self, data, indent):
+        raise NotImplementedError
+
+
+class OrjsonCodec(_FastCodec):
+    name = "orjson"
+    indents = (None, 0, 2)
+    non_finite_marks = (b"null",)
+
+    def __init__(self):
+        import orjson
+
+        self._orjson = orjson
+
+    def _encode(self, data, indent):
+        option = self._orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= self._orjson.OPT_INDENT_2
+        return self._orjson.dumps(data, option=option)
+
+    def loads(self, text):
+        try:
+            return self._orjson.loads(text)
+        except ValueError:
+            # NaN and infinities are only read by the standard library
+            return json.loads(text)
+
+
+class MsgspecCodec(_FastCodec):
+    name = "msgspec"
+    indents = (None, 0, 1, 2, 3, 4)
+    non_finite_marks = (b"null",)
+
+    def __init__(self):
+        import msgspec
+
+        self._msgspec = msgspec
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+
+    def _encode(self, data, indent):
+        content = self._encoder.encode(data)
+        if indent:
+            content = self._msgspec.json.format(content, indent=indent)
+        return content
+
+    def loads(self, text):
+        try:
+            return self._decoder.decode(text)
+        except self._msgspec.DecodeError:
+            # NaN and infinities are only read by the standard library
+            return json.loads(text)
+
+
+class UjsonCodec(_FastCodec):
+    name = "ujson"
+    indents = (None, 0, 1, 2, 3, 4)
+    # NaN and infinities as keys only
+    non_finite_marks = (b'"nan"', b'"inf"', b'"-inf"')
+
+    def __init__(self):
+        import ujson
+
+        self._ujson = ujson
+
+    def _encode(self, data, indent):
+        return self._ujson.dumps(
+            data,
+            ensure_ascii=False,
+            escape_forward_slashes=False,
+            indent=indent or 0,
+        ).encode("utf-8")
+
+    def loads(self, text):
+        return self._ujson.loads(text)
+
+
+def _non_finite(data):
+    """Whether `data` holds a NaN or infinite float, as a value or key."""
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            for key in value:
+                if isinstance(key, float) and not math.isfinite(key):
+                    return True
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+        elif isinstance(value, float) and not math.isfinite(value):
+            return True
+    return False
+
+
+_BACKENDS = {
+    "json": JSONCodec,
+    "orjson": OrjsonCodec,
+    "msgspec": MsgspecCodec,
+    "ujson": UjsonCodec,
+}
+_CODECS = {}
+_default = "json"
+
+
+def get_codec(name=None):
+    """Return the codec registered as `name`, or the default codec.
+
+    Raises `ArkivistException` for unknown names and when the backend is
+    not installed.
+    """
+    name = _default if name is None else name
+    try:
+        return _load(name)
+    except (ValueError, ImportError) as e:
+        # imported here, since `arkivist.arkivist` imports this module
+        from .arkivist import ArkivistException
+
+        if isinstance(e, ValueError):
+            raise ArkivistException(str(e)) from e
+        raise ArkivistException(
+            f"The `{name}` package is required for the `{name}` codec. "
+            f"Install it with `pip install {name}`."
+        ) from e
+
+
+def _load(name):
+    """The codec registered as `name`; raises `ValueError` for unknown
+    names and `ImportError` when the backend is not installed."""
+    codec = _CODECS.get(name)
+    if codec is None:
+        if name not in _BACKENDS:
+            raise ValueError(
+                f"Unknown codec `{name}`, use one of: " + ", ".join(_BACKENDS) + "."
+            )
+        codec = _CODECS[name] = _BACKENDS[name]()
+    return codec
+
+
+def available_codecs():
+    """Names of the codecs whose backend is installed."""
+    names = []
+    for name in _BACKENDS:
+        try:
+            _load(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def set_default_codec(name):
+    """Select the codec used by every instance without an explicit `codec`."""
+    global _default
+    get_codec(name)
+    _default = name
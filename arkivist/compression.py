@@ -0,0 +1,105 @@
+"""
+    (c) 2020 Rodney Maniego Jr.
+    Arkivist
+
+    Transparent compression of stored documents.
+
+    Compressed documents are recognized by their magic bytes, so reading
+    never depends on the file name; `gzip` and `zlib` use the standard
+    library `zlib` module and `lzma` writes `.xz` streams. Levels go from
+    0 (fastest) to 9 (smallest).
+"""
+
+import zlib
+
+__all__ = ["METHODS", "EXTENSIONS", "compress", "decompress", "detect"]
+
+METHODS = ("gzip", "lzma", "zlib")
+# file name suffixes, e.g. `data.json.gz`
+EXTENSIONS = {"gz": "gzip", "xz": "lzma", "zz": "zlib"}
+DEFAULT_LEVEL = 6
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_XZ_MAGIC = b"\xfd7zXZ\x00"
+# window sizes selecting the gzip and the zlib containers
+_WBITS = {"gzip": 16 + zlib.MAX_WBITS, "zlib": zlib.MAX_WBITS}
+
+
+def detect(data):
+    """The compression method of `data`, or None when it is not
+    compressed. JSON documents start with `{` or whitespace and
+    MessagePack documents with a map header, none of which is a magic."""
+    head = bytes(data[:6])
+    if head.startswith(_GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(_XZ_MAGIC):
+        return "lzma"
+    # zlib header: deflate with a 32K window, checksummed over 31
+    if len(head) >= 2 and head[0] == 0x78 and (head[0] << 8 | head[1]) % 31 == 0:
+        return "zlib"
+    return None
+
+
+def compress(content, method, level=None):
+    """Compress `content`, bytes or a list of byte chunks, into a list of
+    byte chunks, without joining the input first; failures raise a
+    `ValueError`."""
+    level = DEFAULT_LEVEL if level is None else level
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        content = (content,)
+    if method == "lzma":
+        lzma = _lzma()
+        try:
+            compressor = lzma.LZMACompressor(preset=level)
+            chunks = [compressor.compress(chunk) for chunk in content]
+            chunks.append(compressor.flush())
+        except lzma.LZMAError as e:
+            raise ValueError(str(e)) from e
+    else:
+        try:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, _WBITS[method])
+            chunks = [compressor.compress(chunk) for chunk in content]
+            chunks.append(compressor.flush())
+        except zlib.error as e:
+            raise ValueError(str(e)) from e
+    return [chunk for chunk in chunks if chunk]
+
+
+def decompress(data):
+    """Decompress `data` if it is compressed, or return it unchanged;
+    corrupted input raises a `ValueError`."""
+    method = detect(data)
+    if method is None:
+        return data
+    try:
+        if method == "lzma":
+            lzma = _lzma()
+            try:
+                return lzma.decompress(data)
+            except lzma.LZMAError as e:
+                raise ValueError(str(e)) from e
+        if method == "gzip":
+            # concatenated gzip members decode as one stream
+            decompressor = zlib.decompressobj(_WBITS["gzip"])
+            parts = []
+            while True:
+                parts.append(decompressor.decompress(data))
+                data = decompressor.unused_data
+                if not data:
+                    break
+                decompressor = zlib.decompressobj(_WBITS["gzip"])
+            if not decompressor.eof:
+                raise ValueError("Compressed data ended before the end-of-stream marker")
+            return b"".join(parts)
+        return zlib.decompress(data, _WBITS["zlib"])
+    except zlib.error as e:
+        raise ValueError(str(e)) from e
+
+
+def _lzma():
+    """Lazily import `lzma`, which some Python builds lack."""
+    try:
+        import lzma
+    except ImportError as e:
+        raise ValueError("The `lzma` module is not available in this Python build.") from e
+    return lzma
@@ -0,0 +1,188 @@
+"""
+    (c) 2020 Rodney Maniego Jr.
+    Arkivist
+
+    Locate the members of a top-level JSON object without decoding them.
+
+    Only the keys are decoded; each value is reported as a byte range of the
+    buffer, which may be `bytes` or any buffer `re` can search, such as an
+    `mmap`. Values are skipped by hopping between strings and brackets, not
+    validated; a malformed value is only reported once it is decoded.
+
+    `iter_members()` does the same for a document arriving in chunks, such
+    as a response body, buffering only the member being read.
+"""
+
+import json
+import re
+
+__all__ = ["iter_members", "scan_object"]
+
+_WHITESPACE = re.compile(rb"[ \t\n\r]*")
+_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_MEMBER = re.compile(rb'[ \t\n\r]*"([^"\\]*(?:\\.[^"\\]*)*)"[ \t\n\r]*:[ \t\n\r]*', re.DOTALL)
+_DELIMITER = re.compile(rb"[ \t\n\r]*([,}])")
+# text and strings up to the next bracket, written so that it never
+# backtracks more than linearly
+_TEXT = rb'[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*'
+# also skips over the containers that hold no other container
+_FILLER = re.compile(_TEXT + rb"(?:[\[{]" + _TEXT + rb"[\]}]" + _TEXT + rb")*", re.DOTALL)
+_SCALAR = re.compile(rb"[^\s,\]}]+")
+
+
+def scan_object(buffer):
+    """Return a `(key, start, end)` tuple for each member of the JSON object
+    held by `buffer`, in order; raises `ValueError` when the buffer does not
+    hold a single JSON object."""
+    members = []
+    pos = _skip_whitespace(buffer, 0)
+    _expect(buffer, pos, b"{")
+    pos = _skip_whitespace(buffer, pos + 1)
+    if buffer[pos : pos + 1] == b"}":
+        pos += 1
+    else:
+        while True:
+            match = _MEMBER.match(buffer, pos)
+            if match is None:
+                raise ValueError(f"Expecting a property name and `:` at byte {pos}")
+            key = match.group(1)
+            if b"\\" in key:
+                key = json.loads(match.group(1).join((b'"', b'"')))
+            else:
+                key = key.decode("utf-8")
+            start = match.end()
+            end = _skip_value(buffer, start)
+            members.append((key, start, end))
+            match = _DELIMITER.match(buffer, end)
+            if match is None:
+                raise ValueError(f"Expecting `,` or `}}` at byte {end}")
+            pos = match.end()
+            if match.group(1) == b"}":
+                break
+    if _skip_whitespace(buffer, pos) != len(buffer):
+        raise ValueError(f"Extra data at byte {pos}")
+    return members
+
+
+def iter_members(chunks):
+    """Read the JSON object whose bytes arrive in `chunks`, buffering only
+    the members that are still incomplete.
+
+    Yields JSON documents, each an object holding the next run of members
+    that arrived complete, so each one can be decoded in a single call.
+    Raises `ValueError` when the chunks do not hold a single JSON object.
+    """
+    chunks = iter(chunks)
+    buffer = bytearray()
+    pos = 0
+    opened = closed = final = False
+    first = True
+    # an incomplete member is only scanned again once what is buffered of
+    # it doubled, so a large member is scanned a logarithmic number of times
+    wanted = 0
+    while True:
+        if not final and (closed or len(buffer) - pos < wanted):
+            chunk = next(chunks, None)
+            if chunk is None:
+                final = True
+            else:
+                if pos:
+                    del buffer[:pos]
+                    pos = 0
+                buffer += chunk
+                continue
+        if closed:
+            end = _skip_whitespace(buffer, pos)
+            if end != len(buffer):
+                raise ValueError(f"Extra data at byte {end}")
+            if final:
+                return
+            pos = end
+            continue
+        if not opened:
+            start = _skip_whitespace(buffer, pos)
+            if start == len(buffer) and not final:
+                wanted = len(buffer) - pos + 1
+                continue
+            _expect(buffer, start, b"{")
+            pos, opened = start + 1, True
+        start = end = pos
+        while not closed:
+            try:
+                end, pos, closed = _read_member(buffer, pos, final, first)
+            except _Incomplete:
+                wanted = max(1, 2 * (len(buffer) - pos))
+                break
+            first = False
+        if end > start:
+            yield b"{" + buffer[start:end] + b"}"
+
+
+class _Incomplete(Exception):
+    """More chunks are needed to read the next member."""
+
+
+def _read_member(buffer, pos, final, first=False):
+    """Read the member at `pos`, following `{` if `first` or else `,`;
+    returns where its value ends, where the next member starts and whether
+    it was the last. Unless `final`, raises `_Incomplete` when the member
+    may not have fully arrived."""
+    try:
+        if first:
+            start = _skip_whitespace(buffer, pos)
+            if buffer[start : start + 1] == b"}":
+                return pos, start + 1, True
+        match = _MEMBER.match(buffer, pos)
+        if match is None:
+            raise ValueError(f"Expecting a property name and `:` at byte {pos}")
+        end = _skip_value(buffer, match.end())
+        match = _DELIMITER.match(buffer, end)
+        if match is None:
+            raise ValueError(f"Expecting `,` or `}}` at byte {end}")
+    except ValueError:
+        # what is missing may be in the next chunks
+        if final:
+            raise
+        raise _Incomplete
+    if end == len(buffer) and not final:
+        raise _Incomplete
+    return end, match.end(), match.group(1) == b"}"
+
+
+def _skip_whitespace(buffer, pos):
+    return _WHITESPACE.match(buffer, pos).end()
+
+
+def _expect(buffer, pos, token):
+    if buffer[pos : pos + 1] != token:
+        raise ValueError(f"Expecting `{token.decode()}` at byte {pos}")
+
+
+def _skip_value(buffer, pos):
+    """Return the end of the value starting at `pos`."""
+    first = buffer[pos : pos + 1]
+    if first == b'"':
+        match = _STRING.match(buffer, pos)
+        if match is None:
+            raise ValueError(f"Unterminated string at byte {pos}")
+        return match.end()
+    if first not in (b"{", b"["):
+        match = _SCALAR.match(buffer, pos)
+        if match is None:
+            raise ValueError(f"Expecting a value at byte {pos}")
+        return match.end()
+    depth = 0
+    while True:
+        token = buffer[pos : pos + 1]
+        if token in (b"{", b"["):
+            depth += 1
+        elif token in (b"}", b"]"):
+            depth -= 1
+        elif token == b'"':
+            raise ValueError(f"Unterminated string at byte {pos}")
+        else:
+            raise ValueError(f"Unterminated value at byte {pos}")
+        pos += 1
+        if depth == 0:
+            return pos
+        pos = _FILLER.match(buffer, pos).end()
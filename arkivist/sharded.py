@@ -0,0 +1,400 @@
+"""
+    (c) 2020 Rodney Maniego Jr.
+    Arkivist
+
+    Directory-backed Arkivist that spreads its top-level keys over several
+    shard files, so saving a change only rewrites the shards it touched.
+"""
+
+import os
+import re
+import zlib
+
+from .arkivist import (
+    Arkivist,
+    ArkivistException,
+    _ALL_KEYS,
+    _COMPRESSIONS,
+    _DEFERRED_LOCKING,
+    _ENVELOPE_VERSION,
+    _FORMATS,
+    _LazyLoading,
+    _Save,
+    _atomic_write,
+    _decode_document,
+    _encode_document,
+    _get_codec,
+    _json_key,
+    _lock_files,
+    _mark_dirty,
+    _refresh_indexes,
+    _release,
+    _signature,
+    _timed,
+    _write_json,
+)
+from .compression import EXTENSIONS
+
+__all__ = ["ShardedArkivist"]
+
+_MANIFEST = "manifest.json"
+# `compression` not given: an existing directory keeps its own
+_KEEP = object()
+_DEFAULT_SHARDS = 16
+_SHARD_FILE = re.compile(
+    r"shard-(?:\d+-)?\d{4,}\.(?:" + "|".join(_FORMATS) + r")(?:\.(?:" + "|".join(EXTENSIONS) + "))?"
+)
+
+
+class ShardedArkivist(_LazyLoading, Arkivist):
+    """Arkivist backed by a directory of shard files.
+
+    Each top-level key is hashed into one of `shards` files; a small
+    `manifest.json` records the shard count and encryption. Saves only
+    rewrite the shards holding keys that changed since the last save.
+
+    With `lazy=True`, a shard is only read the first time one of its keys
+    is accessed; operations over the whole contents (iteration, `len()`,
+    queries, ...) read the remaining shards first. Keys are iterated in
+    the order their shards were read.
+
+    Shards are JSON files unless `format="msgpack"` is given, and are
+    compressed with `compression` and `level`, as for `Arkivist`; an
+    existing directory keeps its compression unless `compression` is
+    given, `compression=None` leaving it uncompressed. Changing `shards`,
+    `format` or `compression` for an existing directory rewrites every
+    shard; the new shards are written under other names before the
+    manifest, so an interrupted change leaves the previous ones in use.
+    An explicit `save()` rewrites every shard read so far, saving values
+    changed in place too. `lock`, `auto_reload`, `rwlock` and `metrics` work as for
+    `Arkivist`, and the lock file is `manifest.json.lock`.
+
+    As with `Arkivist(data, filepath)`, passing `data` replaces whatever
+    the directory held.
+    """
+
+    def __init__(
+        self,
+        directory,
+        data=None,
+        shards=None,
+        mode="r+",
+        indent=0,
+        autosave=True,
+        autosort=False,
+        reverse=False,
+        authfile=None,
+        flush_interval=100,
+        codec=None,
+        lazy=False,
+        format=None,
+        compression=_KEEP,
+        level=None,
+        lock=False,
+        auto_reload=False,
+        rwlock=False,
+        metrics=False,
+    ):
+        if not isinstance(directory, str) or not directory.strip():
+            raise ArkivistException("`directory` must be a non-empty path.")
+        if shards is not None:
+            try:
+                shards = int(shards)
+            except (TypeError, ValueError):
+                shards = 0
+            if shards < 1:
+                raise ArkivistException("`shards` must be a positive integer.")
+        if data is not None and not isinstance(data, dict):
+            raise ArkivistException("`data` must be a dictionary.")
+        super().__init__(
+            mode=mode,
+            indent=indent,
+            autosave=autosave,
+            autosort=autosort,
+            reverse=reverse,
+            authfile=authfile,
+            flush_interval=flush_interval,
+            codec=codec,
+            lazy=lazy,
+            format=format or "json",
+            compression=None if compression is _KEEP else compression,
+            level=level,
+            rwlock=rwlock,
+            metrics=metrics,
+        )
+        self._filepath = directory
+        self._dirty_keys = set()
+        self._manifest = None
+        self._shard_count = shards or _DEFAULT_SHARDS
+        # bumped when the shard count changes, so that new shards do not
+        # overwrite the files the manifest still points at
+        self._generation = 0
+        # keys stored in each shard, `None` until the shard is read
+        self._members = []
+        self._unloaded = set()
+        self._locking = bool(lock)
+        if lock and self._deferred:
+            raise ArkivistException(_DEFERRED_LOCKING)
+        if lock or auto_reload:
+            _lock_files(self)
+
+        with self._lock:
+            if data is not None:
+                self._open("w+", shards, format, compression)
+                dict.update(self, data)
+                _mark_dirty(self)
+                _write_json(self)
+            else:
+                self._open(self._read_mode, shards, format, compression)
+                if self._read_mode != "r":
+                    _write_json(self, forced=True)
+
+    @property
+    def directory(self):
+        """The directory holding the manifest and the shard files."""
+        return self._filepath
+
+    @property
+    def shards(self):
+        """The number of shard files."""
+        return self._shard_count
+
+    def reload(self):
+        """Re-read the manifest and the shards, replacing in-memory
+        contents."""
+        with self._lock:
+            _release(self)
+            dict.clear(self)
+            self._flat_cache = self._positions = None
+            self._open("r+", None, None, None)
+            if self._indexes or self._text_indexes:
+                self._load_all()
+                _refresh_indexes(self)
+            return self
+
+    # internal helpers
+    def _open(self, mode, shards, format, compression):
+        """Read the manifest and, unless lazy, every shard."""
+        self._manifest = None
+        self._dirty_keys = set()
+        self._sealed = {}
+        self._saved_version = self._version
+        manifest = None if mode == "w+" else self._read_manifest(mode)
+        if manifest is None:
+            if mode == "w+":
+                self._generation = self._next_generation()
+            self._members = [{} for _ in range(self._shard_count)]
+            self._unloaded = set()
+            if mode == "w+":
+                self._dirty_keys = _ALL_KEYS
+                self._version += 1
+            self._signature = _signature(self)
+            return
+
+        self._manifest = manifest
+        self._encrypt = manifest.get("encryption") is not None
+        self._shard_count = manifest["shards"]
+        self._generation = manifest.get("generation", 0)
+        self._format = manifest.get("format", "json")
+        self._compression = manifest.get("compression")
+        self._members = [None] * self._shard_count
+        self._unloaded = set(range(self._shard_count))
+        if (
+            (shards is not None and shards != self._shard_count)
+            or (format is not None and format != self._format)
+            or (compression is not _KEEP and compression != self._compression)
+        ):
+            self._load_all()
+            if shards is not None and shards != self._shard_count:
+                self._generation += 1
+            self._shard_count = shards or self._shard_count
+            self._format = format or self._format
+            if compression is not _KEEP:
+                self._compression = compression
+            self._dirty_keys = _ALL_KEYS
+            self._version += 1
+        elif not self._lazy:
+            self._load_all()
+        self._signature = _signature(self)
+
+    def _read_manifest(self, mode):
+        filepath = os.path.join(self._filepath, _MANIFEST)
+        try:
+            with open(filepath, "rb") as f:
+                manifest = _get_codec(self._codec).loads(f.read())
+        except FileNotFoundError as e:
+            if mode == "r":
+                raise ArkivistException(f"Manifest not found: `{filepath}`") from e
+            return None
+        except OSError as e:
+            raise ArkivistException(f"Unable to read `{filepath}`: {e}") from e
+        except ValueError as e:
+            raise ArkivistException(f"Invalid manifest `{filepath}`: {e}") from e
+        shards = manifest.get("shards") if isinstance(manifest, dict) else None
+        if not isinstance(shards, int) or isinstance(shards, bool) or shards < 1:
+            raise ArkivistException(f"Invalid manifest `{filepath}`.")
+        generation = manifest.get("generation", 0)
+        if not isinstance(generation, int) or isinstance(generation, bool) or generation < 0:
+            raise ArkivistException(f"Invalid manifest `{filepath}`.")
+        if manifest.get("format", "json") not in _FORMATS.values() or manifest.get(
+            "compression"
+        ) not in (None,) + _COMPRESSIONS:
+            raise ArkivistException(f"Invalid manifest `{filepath}`.")
+        return manifest
+
+    def _next_generation(self):
+        """The generation of shards replacing whatever the directory holds:
+        the current one, unless the shard count changes."""
+        try:
+            manifest = self._read_manifest("r+")
+        except ArkivistException:
+            manifest = None
+        if manifest is None:
+            return 0
+        generation = manifest.get("generation", 0)
+        return generation + 1 if manifest["shards"] != self._shard_count else generation
+
+    def _watched_files(self):
+        return (os.path.join(self._filepath, _MANIFEST),) + tuple(
+            self._shard_path(shard) for shard in range(self._shard_count)
+        )
+
+    def _shard_path(self, shard):
+        prefix = f"shard-{self._generation}-" if self._generation else "shard-"
+        name = f"{prefix}{shard:04d}.{self._format}"
+        for suffix, method in EXTENSIONS.items():
+            if method == self._compression:
+                name += "." + suffix
+        return os.path.join(self._filepath, name)
+
+    def _shard_of(self, key):
+        # keys that would be equal once saved, e.g. `1` and `"1"`, share a shard
+        return zlib.crc32(_json_key(key).encode("utf-8")) % self._shard_count
+
+    def _load_key(self, key):
+        try:
+            shard = self._shard_of(key)
+        except ArkivistException:
+            # such keys cannot be stored, so they are in no shard
+            return
+        if shard in self._unloaded:
+            self._load_shard(shard)
+
+    def _load_all(self):
+        for shard in sorted(self._unloaded):
+            self._load_shard(shard)
+
+    def _load_shard(self, shard):
+        with self._lock:
+            if shard not in self._unloaded:
+                return
+            filepath = self._shard_path(shard)
+            with _timed(self, "read"):
+                try:
+                    with open(filepath, "rb") as f:
+                        temp = f.read()
+                except FileNotFoundError:
+                    temp = b""
+                except OSError as e:
+                    raise ArkivistException(f"Unable to read `{filepath}`: {e}") from e
+                self._sealed[shard] = {}
+                _, content = _decode_document(
+                    filepath, temp, self._cypher, self._codec, self._sealed[shard]
+                )
+            for key, value in content.items():
+                dict.setdefault(self, key, value)
+            self._members[shard] = dict.fromkeys(content)
+            self._unloaded.discard(shard)
+
+    def _prepare_save(self, compact=False, snapshot=False):
+        """Capture the manifest and the shards holding changed keys; a
+        `save_as` copy is written as a single file."""
+        if self._save_as is not None:
+            self._load_all()
+            return super()._prepare_save(compact, snapshot)
+        return _ShardSave(self, compact, snapshot)
+
+    def _remove_stale_shards(self):
+        """Delete shard files left behind by a larger shard count, another
+        format or another compression."""
+        current = {os.path.basename(self._shard_path(shard)) for shard in range(self._shard_count)}
+        for name in os.listdir(self._filepath):
+            if _SHARD_FILE.fullmatch(name) and name not in current:
+                try:
+                    os.remove(os.path.join(self._filepath, name))
+                except OSError as e:
+                    raise ArkivistException(f"Unable to remove `{name}`: {e}") from e
+
+
+class _ShardSave(_Save):
+    """A save of the manifest and of the shards holding changed keys, or
+    with `compact` of every shard read; the records of each shard are
+    copied when it is prepared."""
+
+    def __init__(self, obj, compact=False, snapshot=False):
+        self.obj = obj
+        self.version = obj._version
+        self.save_as = None
+        self.snapshot = snapshot
+        self.filepath = obj._filepath
+        if snapshot:
+            obj._snapshots += 1
+            obj._detached = set()
+
+        dirty = obj._dirty_keys
+        if dirty is _ALL_KEYS:
+            obj._load_all()
+            obj._members = [{} for _ in range(obj._shard_count)]
+            for key in dict.keys(obj):
+                obj._members[obj._shard_of(key)][key] = None
+            shards = set(range(obj._shard_count))
+        else:
+            shards = set()
+            for key in dirty:
+                shard = obj._shard_of(key)
+                obj._load_shard(shard)
+                if dict.__contains__(obj, key):
+                    obj._members[shard][key] = None
+                else:
+                    obj._members[shard].pop(key, None)
+                shards.add(shard)
+            if compact:
+                # values changed in place are not in `_dirty_keys`
+                shards.update(set(range(obj._shard_count)) - obj._unloaded)
+
+        manifest = {
+            "arkivist": _ENVELOPE_VERSION,
+            "shards": obj._shard_count,
+            "encryption": "fernet" if obj._encrypt else None,
+            "format": obj._format,
+            "compression": obj._compression,
+        }
+        if obj._generation:
+            manifest["generation"] = obj._generation
+        self.manifest = manifest if manifest != obj._manifest else None
+        self.documents = []
+        for shard in sorted(shards):
+            records = {key: dict.__getitem__(obj, key) for key in obj._members[shard]}
+            self.documents.append((shard, obj._shard_path(shard), records))
+        self.dirty = dirty
+        obj._dirty_keys = set()
+
+    def write(self):
+        obj = self.obj
+        # the manifest last, so it only points at shards fully written
+        for shard, filepath, records in self.documents:
+            _atomic_write(filepath, _encode_document(obj, records, slot=shard), obj._metrics)
+        if self.manifest is not None:
+            content = _get_codec(obj._codec).encode(self.manifest, 2)
+            _atomic_write(os.path.join(obj._filepath, _MANIFEST), content, obj._metrics)
+            obj._manifest = self.manifest
+        if self.dirty is _ALL_KEYS:
+            obj._remove_stale_shards()
+
+    def abandon(self):
+        obj = self.obj
+        if self.dirty is _ALL_KEYS or obj._dirty_keys is _ALL_KEYS:
+            obj._dirty_keys = _ALL_KEYS
+        else:
+            obj._dirty_keys |= self.dirty
+        self._done()
@@ -0,0 +1 @@
+"""Performance benchmarks for Arkivist, see the individual modules."""
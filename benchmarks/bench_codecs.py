@@ -0,0 +1,65 @@
+"""Compare the JSON codecs on typical Arkivist store shapes.
+
+Run from the repository root:
+    python -m benchmarks.bench_codecs [--size 20000] [--repeat 5]
+
+Codecs whose backend is not installed are skipped.
+"""
+
+import argparse
+import random
+import string
+import time
+
+from arkivist.codecs import available_codecs, get_codec
+
+
+def shapes(size):
+    rng = random.Random(1)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=8)) for _ in range(256)]
+    return {
+        "records": {
+            str(i): {
+                "name": " ".join(rng.choices(words, k=3)),
+                "status": rng.choice(["open", "closed", "pending"]),
+                "count": rng.randint(0, 10**6),
+                "tags": rng.sample(words, 3),
+            }
+            for i in range(size)
+        },
+        "numeric": {str(i): [rng.random() for _ in range(16)] for i in range(size // 4)},
+        "text": {str(i): " ".join(rng.choices(words, k=64)) for i in range(size // 8)},
+    }
+
+
+def best_of(repeat, function, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'shape':<10}{'codec':<10}{'dumps ms':>10}{'indent ms':>11}{'loads ms':>10}{'bytes':>12}")
+    for shape, data in shapes(args.size).items():
+        for name in available_codecs():
+            codec = get_codec(name)
+            encoded = codec.encode(data)
+            dumps = best_of(args.repeat, codec.encode, data)
+            indented = best_of(args.repeat, codec.encode, data, 2)
+            loads = best_of(args.repeat, codec.loads, encoded)
+            print(
+                f"{shape:<10}{name:<10}{dumps * 1000:>10.1f}{indented * 1000:>11.1f}"
+                f"{loads * 1000:>10.1f}{len(encoded):>12}"
+            )
+
+
+if __name__ == "__main__":
+    main()
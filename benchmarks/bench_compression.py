@@ -0,0 +1,73 @@
+"""Compare compression methods and levels for stored files.
+
+Run from the repository root:
+    python -m benchmarks.bench_compression [--size 50000] [--mbps 20]
+
+Reports the file size and the time to save and to open a store for each
+method and level. `save+io` and `open+io` add the time a filesystem
+moving `--mbps` megabytes per second (e.g. a network share) would spend
+transferring the file, to show where compression pays for itself.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from arkivist import Arkivist
+
+SETTINGS = [(None, None)] + [
+    (method, level) for method in ("zlib", "gzip") for level in (1, 6, 9)
+] + [("lzma", level) for level in (0, 6)]
+
+
+def build(size):
+    return {
+        str(i): {
+            "name": f"record {i}",
+            "status": "open" if i % 3 else "closed",
+            "tags": ["alpha", "beta", "gamma"],
+            "scores": [i, i * 2, i * 3],
+        }
+        for i in range(size)
+    }
+
+
+def measure(filepath, data, method, level, repeat=3):
+    storage = Arkivist(filepath, autosave=False, compression=method, level=level)
+    dict.update(storage, data)
+    saves, opens = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        storage.save()
+        saves.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        Arkivist(filepath, mode="r")
+        opens.append(time.perf_counter() - start)
+    return os.path.getsize(filepath), min(saves), min(opens)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=50000)
+    parser.add_argument("--mbps", type=float, default=20.0)
+    args = parser.parse_args()
+
+    data = build(args.size)
+    throughput = args.mbps * 2**20
+    print(f"{'method':<8}{'level':>6}{'size MiB':>10}{'save ms':>10}{'open ms':>10}"
+          f"{'save+io ms':>12}{'open+io ms':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = os.path.join(directory, "storage.json")
+        for method, level in SETTINGS:
+            size, saved, opened = measure(filepath, data, method, level)
+            io = size / throughput
+            print(
+                f"{method or 'none':<8}{'-' if level is None else level:>6}"
+                f"{size / 2**20:>10.2f}{saved * 1000:>10.1f}{opened * 1000:>10.1f}"
+                f"{(saved + io) * 1000:>12.1f}{(opened + io) * 1000:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Compare the JSON and MessagePack storage formats.
+
+Run from the repository root:
+    python -m benchmarks.bench_formats [--size 100000] [--indent 4]
+
+Reports the file size and the time to open and to save a numeric-heavy
+store in each format. MessagePack uses the `msgpack` package when it is
+installed and the built-in pure Python encoder otherwise.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from arkivist import Arkivist, binary
+
+
+def build(size):
+    return {
+        str(i): {
+            "id": i,
+            "scores": [i * 0.5, i * 1.25, i * 2.75],
+            "counts": [i, i * 2, i * 3, i * 4],
+            "active": bool(i % 2),
+        }
+        for i in range(size)
+    }
+
+
+def measure(filepath, data, indent, repeat=3):
+    storage = Arkivist(filepath, autosave=False, indent=indent)
+    dict.update(storage, data)
+    saves, opens = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        storage.save()
+        saves.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        Arkivist(filepath, mode="r")
+        opens.append(time.perf_counter() - start)
+    return os.path.getsize(filepath), min(opens), min(saves)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--indent", type=int, default=4)
+    args = parser.parse_args()
+
+    data = build(args.size)
+    backend = "msgpack" if binary._backend() else "pure Python"
+    print(f"MessagePack backend: {backend}")
+    print(f"{'format':<10}{'size MiB':>10}{'open ms':>10}{'save ms':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ("json", "msgpack"):
+            filepath = os.path.join(directory, f"storage.{name}")
+            size, opened, saved = measure(filepath, data, args.indent)
+            print(f"{name:<10}{size / 2**20:>10.1f}{opened * 1000:>10.1f}{saved * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Compare eager, lazy and memory-mapped opening of a large Arkivist file.
+
+Run from the repository root:
+    python -m benchmarks.bench_lazy [--size 200000] [--touch 10]
+
+Reports the time and peak traced memory to open the file and read a few
+keys, and the time to save one change. Memory-mapped instances are
+read-only; `mmap` scans the file, `mmap+idx` reads the `.idx` sidecar.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from arkivist import Arkivist
+
+
+def build(filepath, size):
+    storage = Arkivist(filepath, autosave=False)
+    for i in range(size):
+        storage[str(i)] = {
+            "name": f"record {i}",
+            "tags": ["alpha", "beta", "gamma"],
+            "scores": [i, i * 2, i * 3],
+            "meta": {"created": "2026-01-01", "active": bool(i % 2)},
+        }
+    storage.save()
+
+
+MODES = {
+    "eager": {},
+    "lazy": {"lazy": True},
+    "mmap": {"mode": "r", "mmap": True},
+    "mmap+idx": {"mode": "r", "mmap": True},
+}
+
+
+def open_and_touch(filepath, options, touch, index):
+    if not index and os.path.exists(filepath + ".idx"):
+        os.remove(filepath + ".idx")
+    storage = Arkivist(filepath, autosave=False, **options)
+    for i in range(touch):
+        storage.get(str(i))
+    return storage
+
+
+def measure(filepath, options, touch, index):
+    # tracing slows allocations down, so memory is measured separately
+    tracemalloc.start()
+    open_and_touch(filepath, options, touch, index)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    storage = open_and_touch(filepath, options, touch, index)
+    opened = time.perf_counter() - start
+    if options.get("mmap"):
+        return opened, peak, None
+    storage["0"] = "changed"
+    start = time.perf_counter()
+    storage.save()
+    saved = time.perf_counter() - start
+    return opened, peak, saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=200000)
+    parser.add_argument("--touch", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = os.path.join(directory, "large.json")
+        build(filepath, args.size)
+        print(f"file size: {os.path.getsize(filepath) / 2**20:.1f} MiB")
+        print(f"{'mode':<8}{'open+get ms':>13}{'peak MiB':>10}{'save ms':>10}")
+        for name, options in MODES.items():
+            index = name == "mmap+idx"
+            if not index:
+                build(filepath, args.size)
+            opened, peak, saved = measure(filepath, options, args.touch, index)
+            saved = "-" if saved is None else f"{saved * 1000:.1f}"
+            print(f"{name:<8}{opened * 1000:>13.1f}{peak / 2**20:>10.1f}{saved:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Compare read throughput under the default lock and `rwlock=True`.
+
+Run from the repository root:
+    python -m benchmarks.bench_locks [--size 20000] [--seconds 2] [--writers 1]
+
+Reader threads call `get` and `matches` in a loop while `--writers` threads
+keep changing a key, each change saving the whole file, for 1 to
+`--threads` readers. Reported are the reads per second, the longest a
+single read waited, and the number of saves.
+
+With the default lock, every reader waits while a change is saved; with
+`rwlock=True` readers go on during saves, so reads keep flowing and no
+read waits for a whole save. Under the GIL, pure Python reads still take
+turns, so read throughput only grows with the thread count on
+free-threaded builds (`python3.13t`). An uncontended read costs more with
+`rwlock=True` (`--writers 0` shows it), which is why it is opt-in.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from arkivist import Arkivist
+
+
+def build(size):
+    return {str(i): {"name": f"record {i}", "tags": ["alpha", "beta"]} for i in range(size)}
+
+
+def measure(filepath, data, rwlock, readers, writers, seconds):
+    storage = Arkivist(filepath, autosave=False, rwlock=rwlock)
+    storage.update(data)
+    storage.autosave = True
+    stop = threading.Event()
+    counts = [0] * readers
+    waits = [0.0] * readers
+    saves = [0] * writers
+
+    def read(slot):
+        keys = list(data)[:50]
+        while not stop.is_set():
+            for key in keys:
+                start = time.perf_counter()
+                storage.get(key)
+                storage.matches(key, None)
+                waits[slot] = max(waits[slot], time.perf_counter() - start)
+            counts[slot] += len(keys) * 2
+
+    def write(slot):
+        while not stop.is_set():
+            storage[f"counter-{slot}"] = saves[slot]
+            saves[slot] += 1
+
+    threads = [threading.Thread(target=read, args=(slot,)) for slot in range(readers)]
+    threads += [threading.Thread(target=write, args=(slot,)) for slot in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / seconds, max(waits) * 1000, sum(saves)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=1)
+    args = parser.parse_args()
+
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"python {sys.version.split()[0]}, GIL {'enabled' if gil else 'disabled'}, "
+          f"{args.size} records, {args.writers} writer(s)")
+    print(f"{'readers':>8}{'lock':>8}{'reads/s':>12}{'max wait ms':>13}{'saves':>7}")
+    data = build(args.size)
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = os.path.join(directory, "bench.json")
+        readers = 1
+        while readers <= args.threads:
+            for name, rwlock in (("RLock", False), ("rwlock", True)):
+                reads, wait, saves = measure(
+                    filepath, data, rwlock, readers, args.writers, args.seconds
+                )
+                print(f"{readers:>8}{name:>8}{reads:>12,.0f}{wait:>13.1f}{saves:>7}")
+            readers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""Time the hot paths of Arkivist, and compare runs between commits.
+
+Run from the repository root:
+    python -m benchmarks.bench_suite [--sizes 1000,10000,100000] [--repeat 3]
+        [--only where,flatten] [--output results.json]
+        [--compare baseline.json] [--threshold 0.25] [--min-delta 0.5]
+
+Each case is timed at every size, on records shaped like a typical store,
+and the best of `--repeat` runs is kept; preparing the store is not timed.
+Cases repeating a change do so a fixed number of times for a given size,
+so runs at the same sizes compare directly. Add 1000000 to `--sizes` for
+the largest stores; cases whose changes cost in proportion to the store
+make fewer of them there, so that it still completes.
+
+`--output` writes the results as JSON. `--compare` reads such a file and
+reports, for the cases both runs have, how much slower or faster this run
+was; it exits with status 1 if any case got slower by more than
+`--threshold` (a fraction) and by more than `--min-delta` milliseconds,
+which keeps the shortest cases from failing on noise. A typical check:
+
+    git stash && python -m benchmarks.bench_suite --output base.json
+    git stash pop && python -m benchmarks.bench_suite --compare base.json
+
+Encrypted saves are skipped without the `cryptography` package.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import arkivist
+from arkivist import Arkivist
+
+try:
+    import cryptography  # noqa: F401
+
+    HAS_CRYPTOGRAPHY = True
+except ImportError:
+    HAS_CRYPTOGRAPHY = False
+
+# changes made by the cases that repeat one, see `repeats()`
+CHANGES = 1000
+SAVED_CHANGES = 100
+
+
+def records(size):
+    return {
+        str(i): {
+            "name": f"record {i}",
+            "status": ("open", "closed", "pending")[i % 3],
+            "count": i * 7 % 1000,
+            "tags": ["alpha", "beta", "gamma"][: i % 3 + 1],
+            "meta": {"created": "2026-01-01", "active": bool(i % 2)},
+        }
+        for i in range(size)
+    }
+
+
+def build(filepath, size, **options):
+    storage = Arkivist(filepath, autosave=False, **options)
+    storage.update(records(size))
+    storage.save()
+    return storage
+
+
+def repeats(size, limit):
+    """How many changes a case makes when each one costs in proportion to
+    the size of the store, so that larger stores still take seconds."""
+    return max(1, min(limit, 10**6 // max(size, 1)))
+
+
+# each case prepares a store in `directory` and returns the call to time
+
+
+def case_open(directory, size):
+    filepath = os.path.join(directory, "open.json")
+    build(filepath, size)
+    return lambda: Arkivist(filepath)
+
+
+def case_reload(directory, size):
+    storage = build(os.path.join(directory, "reload.json"), size)
+    return storage.reload
+
+
+def case_save(directory, size):
+    storage = build(os.path.join(directory, "save.json"), size)
+    return storage.save
+
+
+def case_set_autosave(directory, size):
+    storage = build(os.path.join(directory, "autosave.json"), size)
+    storage.autosave = True
+    count = repeats(size, SAVED_CHANGES)
+
+    def run():
+        for i in range(count):
+            storage.set(f"new-{i}", i)
+
+    return run
+
+
+def case_set_no_autosave(directory, size):
+    storage = build(os.path.join(directory, "no-autosave.json"), size)
+
+    def run():
+        for i in range(CHANGES):
+            storage.set(f"new-{i}", i)
+
+    return run
+
+
+def case_set_batch(directory, size):
+    storage = build(os.path.join(directory, "batch.json"), size)
+    storage.autosave = True
+
+    def run():
+        with storage.batch():
+            for i in range(CHANGES):
+                storage.set(f"new-{i}", i)
+
+    return run
+
+
+def case_where_exact(directory, size):
+    storage = build(os.path.join(directory, "exact.json"), size)
+    return lambda: storage.where("status", "open", exact=True).show()
+
+
+def case_where_chain(directory, size):
+    storage = build(os.path.join(directory, "chain.json"), size)
+    return lambda: (
+        storage.where("status", "open", exact=True)
+        .where("name", "RECORD 1", sensitivity=False)
+        .exclude("record 12")
+        .show()
+    )
+
+
+def case_where_indexed(directory, size):
+    storage = build(os.path.join(directory, "indexed.json"), size)
+    storage.create_index("status")
+    return lambda: storage.where("status", "open", exact=True).show()
+
+
+def case_snapshot(directory, size):
+    storage = build(os.path.join(directory, "snapshot.json"), size)
+    count = repeats(size, SAVED_CHANGES)
+
+    def run():
+        # a change between views, so none is shared
+        for i in range(count):
+            storage.set("changed", i)
+            for _ in storage.snapshot().items():
+                pass
+
+    return run
+
+
+def case_flatten(directory, size):
+    storage = build(os.path.join(directory, "flatten.json"), size)
+    return storage.flatten
+
+
+def case_flatten_cached(directory, size):
+    storage = build(os.path.join(directory, "flatten-cached.json"), size)
+    storage.flatten(cached=True)
+    storage["0"] = "changed"
+    return lambda: storage.flatten(cached=True)
+
+
+def case_append_unique(directory, size):
+    storage = build(os.path.join(directory, "append.json"), 0)
+    storage.set("list", list(range(size)))
+
+    count = repeats(size, CHANGES)
+
+    def run():
+        for i in range(count):
+            storage.append_in("list", size + i % 10, unique=True)
+
+    return run
+
+
+def case_encrypted_save(directory, size):
+    authfile = os.path.join(directory, "auth.txt")
+    storage = build(os.path.join(directory, "encrypted.json"), size, authfile=authfile)
+    storage.encrypt()
+    storage["0"] = "changed"
+    return storage.save
+
+
+CASES = {
+    "open": case_open,
+    "reload": case_reload,
+    "save": case_save,
+    "set-autosave": case_set_autosave,
+    "set-no-autosave": case_set_no_autosave,
+    "set-batch": case_set_batch,
+    "where-exact": case_where_exact,
+    "where-chain": case_where_chain,
+    "where-indexed": case_where_indexed,
+    "snapshot": case_snapshot,
+    "flatten": case_flatten,
+    "flatten-cached": case_flatten_cached,
+    "append-unique": case_append_unique,
+    "encrypted-save": case_encrypted_save,
+}
+
+
+def measure(case, size, repeat):
+    """Best time of `repeat` runs, in milliseconds, each on a new store."""
+    best = None
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as directory:
+            run = case(directory, size)
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def commit():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def compare(results, baseline, threshold, min_delta):
+    """Print how each case changed since `baseline`; returns the names of
+    the cases that regressed."""
+    regressions = []
+    print(f"\ncompared with {baseline.get('commit') or 'baseline'}:")
+    print(f"{'case':<28}{'before ms':>12}{'after ms':>12}{'change':>9}")
+    for name, after in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        change = (after - before) / before if before else 0.0
+        slower = change > threshold and after - before > min_delta
+        if slower:
+            regressions.append(name)
+        flag = "  REGRESSION" if slower else ""
+        print(f"{name:<28}{before:>12.2f}{after:>12.2f}{change:>+9.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", default=None, help="comma-separated case names")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None)
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--min-delta", type=float, default=0.5)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    names = list(CASES) if args.only is None else args.only.split(",")
+    unknown = set(names) - set(CASES)
+    if unknown:
+        parser.error("unknown cases: " + ", ".join(sorted(unknown)) + "; use " + ", ".join(CASES))
+    if not HAS_CRYPTOGRAPHY and "encrypted-save" in names:
+        names.remove("encrypted-save")
+        print("encrypted-save skipped: cryptography is not installed")
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print(f"arkivist {arkivist.__version__}, python {platform.python_version()}, "
+          f"best of {args.repeat}")
+    print(f"{'case':<28}{'ms':>12}")
+    results = {}
+    for size in sizes:
+        for name in names:
+            key = f"{name}@{size}"
+            results[key] = measure(CASES[name], size, args.repeat)
+            print(f"{key:<28}{results[key]:>12.2f}", flush=True)
+
+    if args.output is not None:
+        document = {
+            "arkivist": arkivist.__version__,
+            "commit": commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold, args.min_delta)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) slower by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Tests for the asyncio interface."""
+
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from arkivist import Arkivist, ArkivistException, AsyncArkivist
+from arkivist import arkivist as arkivist_module
+
+
+class AsyncTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix="arkivist-aio-")
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.tempdir, name)
+
+    def on_disk(self, name):
+        with open(self.path(name), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+
+class TestAsyncArkivist(AsyncTestCase):
+    async def test_changes_and_reads(self):
+        async with AsyncArkivist(self.path("a.json")) as store:
+            await store.set("a", 1)
+            await store.update({"b": 2, "c": 3})
+            await store.append_in("list", 1)
+            await store.delete("c")
+            self.assertEqual(await store.pop("b"), 2)
+            self.assertEqual(await store.setdefault("d", 4), 4)
+            self.assertEqual(await store.get("a"), 1)
+            self.assertTrue(await store.matches("list", [1]))
+            self.assertEqual(await store.keys(), ["a", "list", "d"])
+            await store.apply([{"op": "add", "path": "/list/-", "value": 2}])
+        self.assertEqual(self.on_disk("a.json"), {"a": 1, "list": [1, 2], "d": 4})
+
+    async def test_in_memory(self):
+        async def use():
+            async with AsyncArkivist(durable=True) as store:
+                await store.set("a", 1)
+                await store.save()
+                return await store.show()
+
+        self.assertEqual(await asyncio.wait_for(use(), 5), {"a": 1})
+
+    async def test_opens_on_first_use(self):
+        Arkivist(self.path("b.json")).set("a", 1)
+        store = AsyncArkivist(self.path("b.json"), mode="r")
+        self.assertIsNone(store.arkivist)
+        self.assertEqual(await store.get("a"), 1)
+        self.assertIsInstance(store.arkivist, Arkivist)
+
+    async def test_concurrent_changes_share_writes(self):
+        with mock.patch(
+            "arkivist.arkivist._atomic_write", wraps=arkivist_module._atomic_write
+        ) as write:
+            store = await AsyncArkivist(self.path("c.json"), durable=True).open()
+            opened = write.call_count
+            await asyncio.gather(*(store.set(str(i), i) for i in range(100)))
+            self.assertLessEqual(write.call_count - opened, 2)
+        self.assertEqual(len(self.on_disk("c.json")), 100)
+
+    async def test_save_waits_for_changes(self):
+        store = AsyncArkivist(self.path("d.json"), flush_interval=60000)
+        await store.set("a", 1)
+        await store.save()
+        self.assertEqual(self.on_disk("d.json"), {"a": 1})
+
+    async def test_failed_saves_raise(self):
+        store = await AsyncArkivist(self.path("j.json"), durable=True).open()
+        with mock.patch.object(
+            arkivist_module, "_atomic_write", side_effect=ArkivistException("disk full")
+        ):
+            results = await asyncio.gather(
+                store.set("a", 1), store.set("b", 2), return_exceptions=True
+            )
+        self.assertTrue(all(isinstance(result, ArkivistException) for result in results))
+        await store.save()
+        self.assertEqual(self.on_disk("j.json"), {"a": 1, "b": 2})
+
+    async def test_without_autosave(self):
+        store = AsyncArkivist(self.path("e.json"), autosave=False)
+        await store.set("a", 1)
+        self.assertEqual(self.on_disk("e.json"), {})
+        await store.save()
+        self.assertEqual(self.on_disk("e.json"), {"a": 1})
+
+    async def test_queries(self):
+        store = AsyncArkivist(self.path("f.json"))
+        await store.update({str(i): {"n": i, "even": i % 2 == 0} for i in range(10)})
+        evens = [key async for key, _ in store.where("even", True, exact=True)]
+        self.assertEqual(evens, ["0", "2", "4", "6", "8"])
+        query = store.where("even", True, exact=True).limit(2)
+        self.assertEqual(await query.show(), {"0": {"n": 0, "even": True}, "2": {"n": 2, "even": True}})
+        self.assertEqual(await store.where("n", 3, exact=True).first(), ("3", {"n": 3, "even": False}))
+        self.assertEqual(len([item async for item in store.query()]), 10)
+        self.assertEqual(len(await store.show()), 10)
+        self.assertEqual(len(await store.snapshot()), 10)
+
+    async def test_batch_keeps_other_coroutines_out(self):
+        store = AsyncArkivist(self.path("g.json"))
+        await store.set("count", 0)
+
+        async def increment():
+            async with store.batch():
+                count = await store.get("count")
+                await asyncio.sleep(0)
+                await store.set("count", count + 1)
+
+        await asyncio.gather(*(increment() for _ in range(20)))
+        self.assertEqual(await store.get("count"), 20)
+        await store.save()
+        self.assertEqual(self.on_disk("g.json"), {"count": 20})
+
+    @staticmethod
+    def response(document):
+        response = mock.MagicMock()
+        response.__enter__.return_value = response
+        response.json.return_value = document
+        return response
+
+    async def test_fetch(self):
+        requests = mock.Mock()
+        requests.get.return_value = self.response({"remote": True})
+        store = AsyncArkivist(self.path("h.json"))
+        await store.set("local", True)
+        with mock.patch.object(arkivist_module, "_requests", return_value=requests):
+            await store.fetch("https://example.com/data.json", extend=True)
+            with self.assertRaises(ArkivistException):
+                await store.fetch("ftp://example.com/data.json", noerror=False)
+        requests.get.assert_called_once()
+        self.assertEqual(await store.show(), {"local": True, "remote": True})
+
+    async def test_fetch_many(self):
+        session = mock.MagicMock()
+        session.__enter__.return_value = session
+        session.get.side_effect = lambda url, **options: self.response({"url": url})
+        requests = mock.Mock()
+        requests.Session.return_value = session
+        store = AsyncArkivist(self.path("k.json"))
+        with mock.patch.object(arkivist_module, "_requests", return_value=requests):
+            errors = await store.fetch_many(["https://a.test/1", "https://a.test/2", "ftp://a.test"])
+        self.assertEqual(list(errors), ["ftp://a.test"])
+        self.assertEqual(await store.show(), {"url": "https://a.test/2"})
+
+    async def test_reload(self):
+        store = AsyncArkivist(self.path("i.json"))
+        await store.set("a", 1)
+        await store.save()
+        Arkivist(self.path("i.json")).set("a", 2)
+        await store.reload()
+        self.assertEqual(await store.get("a"), 2)
+
+    async def test_file_locks_stay_off_the_loop(self):
+        reload = Arkivist.reload
+        threads = []
+
+        def record(store):
+            threads.append(threading.current_thread())
+            return reload(store)
+
+        store = AsyncArkivist(self.path("j.json"), auto_reload=True)
+        await store.set("a", 1)
+        await store.save()
+        Arkivist(self.path("j.json")).set("a", "changed")
+        with mock.patch.object(Arkivist, "reload", record):
+            self.assertEqual(await store.get("a"), "changed")
+            await store.set("b", 2)
+            self.assertEqual(await store.show(), {"a": "changed", "b": 2})
+        self.assertTrue(threads)
+        self.assertNotIn(threading.current_thread(), threads)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,14 +6,20 @@ Run with either:
 """
 
 import json
+import multiprocessing
 import os
 import shutil
 import tempfile
 import threading
+import time
 import unittest
 import warnings
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
 from arkivist import Arkivist, ArkivistException
+from arkivist import arkivist as arkivist_module
 
 try:
     import cryptography  # noqa: F401
@@ -22,6 +28,13 @@ try:
 except ImportError:
     HAS_CRYPTOGRAPHY = False
 
+try:
+    import requests  # noqa: F401
+
+    HAS_REQUESTS = True
+except ImportError:
+    HAS_REQUESTS = False
+
 
 class ArkivistTestCase(unittest.TestCase):
     def setUp(self):
@@ -185,6 +198,212 @@ class TestListHelpers(ArkivistTestCase):
         self.assertEqual(test["nums"], [1, 3])
 
 
+class TestPatch(ArkivistTestCase):
+    def setUp(self):
+        super().setUp()
+        self.storage = Arkivist(self.path("patch.json"))
+        self.storage.update({"users": {"ana": {"age": 30, "tags": ["a", "b"]}}, "count": 1})
+
+    def test_operations(self):
+        self.storage.apply(
+            [
+                {"op": "replace", "path": "/users/ana/age", "value": 31},
+                {"op": "add", "path": "users.ana.tags.-", "value": "c"},
+                {"op": "add", "path": "/users/ana/tags/0", "value": "z"},
+                {"op": "remove", "path": ["users", "ana", "tags", 1]},
+                {"op": "add", "path": "/users/bo~1b", "value": {"age": 5}},
+                {"op": "move", "from": "/count", "path": "/users/bo~1b/count"},
+                {"op": "copy", "from": "/users/ana/tags", "path": "/tags"},
+                {"op": "test", "path": "/tags/2", "value": "c"},
+            ]
+        )
+        expected = {
+            "users": {"ana": {"age": 31, "tags": ["z", "b", "c"]}, "bo/b": {"age": 5, "count": 1}},
+            "tags": ["z", "b", "c"],
+        }
+        self.assertEqual(dict(self.storage), expected)
+        self.assertEqual(json.loads(self.read_raw("patch.json")), expected)
+        self.assertEqual(list(self.storage["users"]["ana"]), ["age", "tags"])
+
+    def test_test_compares_json_values(self):
+        self.storage.apply(
+            [
+                {"op": "test", "path": "/count", "value": 1},
+                {"op": "test", "path": "/users/ana", "value": {"tags": ["a", "b"], "age": 30}},
+            ]
+        )
+
+    def test_one_write(self):
+        operations = [
+            {"op": "replace", "path": "/users/ana/age", "value": 31},
+            {"op": "add", "path": "/users/ana/city", "value": "Lima"},
+            {"op": "remove", "path": "/count"},
+        ]
+        with mock.patch("arkivist.arkivist._atomic_write", wraps=arkivist_module._atomic_write) as write:
+            self.storage.apply(operations)
+        self.assertEqual(write.call_count, 1)
+        self.assertEqual(json.loads(self.read_raw("patch.json")), dict(self.storage))
+
+    def test_failures_change_nothing(self):
+        users = self.storage["users"]
+        before = json.loads(self.read_raw("patch.json"))
+        failing = (
+            [{"op": "test", "path": "/count", "value": 2}],
+            [{"op": "test", "path": "/count", "value": True}],
+            [{"op": "test", "path": "/count", "value": 1.0}],
+            [{"op": "test", "path": "/users/ana", "value": {"age": 30.0, "tags": ["a", "b"]}}],
+            [{"op": "remove", "path": "/users/bob"}],
+            [{"op": "replace", "path": "/users/ana/tags/2", "value": "c"}],
+            [{"op": "add", "path": "/count/x", "value": 1}],
+            [{"op": "move", "from": "/users", "path": "/users/ana/users"}],
+            [{"op": "add", "path": "/users/ana/tags/01", "value": 1}],
+            [{"op": "add", "path": "", "value": {}}],
+            [{"op": "increment", "path": "/count"}],
+            [{"op": "add", "path": "/count"}],
+            {"op": "add", "path": "/count", "value": 2},
+        )
+        for operations in failing:
+            if isinstance(operations, list):
+                operations = [{"op": "replace", "path": "/users/ana/age", "value": 99}] + operations
+            with self.subTest(operations=operations):
+                with self.assertRaises(ArkivistException):
+                    self.storage.apply(operations)
+        self.assertIs(self.storage["users"], users)
+        self.assertEqual(users["ana"], {"age": 30, "tags": ["a", "b"]})
+        self.assertEqual(json.loads(self.read_raw("patch.json")), before)
+
+    def test_added_values_are_not_changed(self):
+        value = {"nested": {"x": 1}}
+        self.storage.apply(
+            [
+                {"op": "add", "path": "/new", "value": value},
+                {"op": "add", "path": "/new/nested/y", "value": 2},
+            ]
+        )
+        self.assertEqual(value, {"nested": {"x": 1}})
+        self.assertEqual(self.storage["new"], {"nested": {"x": 1, "y": 2}})
+
+    def test_journal_and_indexes(self):
+        storage = Arkivist(self.path("patch-journal.json"), journal=True)
+        storage.update({"a": {"status": "open", "list": [1, 2]}, "b": {"status": "open"}})
+        storage.create_index("status")
+        storage.apply(
+            [
+                {"op": "replace", "path": "/a/status", "value": "closed"},
+                {"op": "remove", "path": "/a/list/0"},
+                {"op": "remove", "path": "/b"},
+            ]
+        )
+        self.assertEqual(storage.where("status", "closed", exact=True).show(), {"a": {"status": "closed", "list": [2]}})
+        self.assertEqual(storage.where("status", "open", exact=True).show(), {})
+        self.assertEqual(dict(Arkivist(self.path("patch-journal.json"))), dict(storage))
+
+    def test_unchanged_patch_is_not_written(self):
+        skipped = self.storage.skipped_writes
+        self.storage.apply([{"op": "replace", "path": "/users/ana/age", "value": 30}])
+        self.assertGreater(self.storage.skipped_writes, skipped)
+
+
+class TestSnapshot(ArkivistTestCase):
+    def setUp(self):
+        super().setUp()
+        self.storage = Arkivist(self.path("snapshot.json"))
+        self.storage.update({"a": {"b": 1}, "list": [1, 2], "c": 3})
+        self.before = {"a": {"b": 1}, "list": [1, 2], "c": 3}
+
+    def test_read_only(self):
+        view = self.storage.snapshot()
+        self.assertEqual(view, self.before)
+        with self.assertRaises(TypeError):
+            view["c"] = 4
+        with self.assertRaises(AttributeError):
+            view.pop("c")
+
+    def test_later_changes_are_not_seen(self):
+        view = self.storage.snapshot()
+        self.storage.set("c", 4)
+        self.storage.find("a").set("b", 2)
+        self.storage.append_in("list", 3)
+        self.storage.remove_in("list", 1)
+        self.storage.apply([{"op": "add", "path": "/a/d", "value": 5}])
+        del self.storage["c"]
+        self.assertEqual(view, self.before)
+        self.assertEqual(dict(self.storage), {"a": {"b": 2, "d": 5}, "list": [2, 3]})
+        self.assertEqual(self.storage.snapshot(), dict(self.storage))
+
+    def test_views_share_the_contents_until_changed(self):
+        first = self.storage.snapshot()
+        self.assertIs(first["a"], self.storage["a"])
+        view = self.storage._view()
+        self.storage.snapshot()
+        list(self.storage.query())
+        self.assertIs(self.storage._view(), view)
+        self.storage.set("c", 4)
+        self.assertIsNot(self.storage.snapshot(), view)
+        self.assertEqual(first, self.before)
+
+    def test_nothing_is_copied_without_a_view(self):
+        self.storage.string()
+        list(self.storage.query())
+        list(self.storage.iter_flatten())
+        nested = self.storage["a"]
+        self.storage.find("a").set("b", 2)
+        self.assertIs(self.storage["a"], nested)
+        self.assertEqual(len(self.storage._views), 0)
+
+    def test_keys_removed_and_added(self):
+        view = self.storage.snapshot()
+        keys = iter(view)
+        self.assertEqual(next(keys), "a")
+        del self.storage["a"]
+        self.storage.set("a", 1)
+        self.storage.popitem()
+        self.storage.set("new", 5)
+        self.storage.remove_in("list", 1)
+        self.storage.append_in("added", 1)
+        self.assertEqual(list(keys), ["list", "c"])
+        self.assertEqual(list(view.items()), list(self.before.items()))
+        self.assertNotIn("new", view)
+        self.assertNotIn("added", view)
+        self.storage.load({"other": 1})
+        self.assertEqual(list(view.items()), list(self.before.items()))
+        self.assertEqual(dict(self.storage.snapshot()), {"other": 1})
+
+    def test_nested_values_are_only_copied_while_in_use(self):
+        view = self.storage.snapshot()
+        nested = self.storage["a"]
+        self.storage.find("a").set("b", 2)
+        self.assertIsNot(self.storage["a"], nested)
+        copied = self.storage["a"]
+        self.storage.find("a").set("b", 3)
+        self.assertIs(self.storage["a"], copied)
+        self.assertEqual(view["a"], {"b": 1})
+        del view
+        self.storage.set("other", 1)
+        self.storage.find("a").set("b", 4)
+        self.assertIs(self.storage["a"], copied)
+
+    def test_reload(self):
+        view = self.storage.snapshot()
+        Arkivist(self.path("snapshot.json")).set("c", 4)
+        self.storage.reload()
+        self.assertEqual(self.storage.snapshot()["c"], 4)
+        self.assertEqual(view["c"], 3)
+
+    def test_iterating_while_changing(self):
+        view = self.storage.snapshot()
+        keys = []
+        for key in view:
+            keys.append(key)
+            self.storage.set(f"new-{key}", key)
+        self.assertEqual(keys, ["a", "list", "c"])
+        self.assertEqual(len(view), 3)
+
+    def test_lazy(self):
+        storage = Arkivist(self.path("snapshot.json"), lazy=True)
+        self.assertEqual(storage.snapshot(), self.before)
+
+
 class TestQueries(ArkivistTestCase):
     def sample(self):
         return Arkivist(
@@ -234,11 +453,303 @@ class TestQueries(ArkivistTestCase):
         self.assertEqual(json.loads(pretty), dict(self.sample()))
 
 
+class CountingKeyword:
+    """Query keyword counting how many records it was compared with."""
+
+    def __init__(self, value):
+        self.value = value
+        self.comparisons = 0
+
+    def __eq__(self, other):
+        self.comparisons += 1
+        return self.value == other
+
+    __hash__ = None
+
+
+class TestQueryPipeline(ArkivistTestCase):
+    def sample(self, size=1000):
+        return Arkivist({str(i): {"n": i, "even": i % 2 == 0} for i in range(size)})
+
+    def test_limit_stops_scanning(self):
+        data = self.sample()
+        keyword = CountingKeyword(True)
+        result = data.where("even", keyword, exact=True).limit(10).show()
+        self.assertEqual(list(result), [str(i) for i in range(0, 20, 2)])
+        self.assertEqual(keyword.comparisons, 19)
+
+    def test_offset_and_limit(self):
+        data = self.sample(20)
+        result = data.where("even", True, exact=True).offset(3).limit(2).show()
+        self.assertEqual(list(result), ["6", "8"])
+        self.assertEqual(len(data.offset(15).show()), 5)
+        self.assertEqual(data.limit(0).show(), {})
+
+    def test_offset_and_limit_apply_after_sorting(self):
+        data = self.sample(12)
+        result = data.where("even", True, exact=True).offset(1).limit(2).show(sort=True, reverse=True)
+        self.assertEqual(list(result), ["6", "4"])
+
+    def test_first(self):
+        data = self.sample()
+        self.assertEqual(data.where("n", 7, exact=True).first(), ("7", {"n": 7, "even": False}))
+        self.assertIsNone(data.where("n", -1, exact=True).first())
+        self.assertEqual(data.first(sort=True, reverse=True)[0], "999")
+
+    def test_chained_clauses_in_one_pass(self):
+        data = self.sample(30)
+        keyword = CountingKeyword(True)
+        result = (
+            data.where("even", keyword, exact=True)
+            .where("n")
+            .exclude(10, exact=True)
+            .show()
+        )
+        self.assertEqual(list(result), [str(i) for i in range(0, 30, 2) if i != 10])
+        self.assertEqual(keyword.comparisons, 30)
+
+    def test_limit_with_index(self):
+        data = self.sample().create_index("even")
+        result = data.where("even", False, exact=True).where("n", 5, exact=True).limit(5).show()
+        self.assertEqual(list(result), ["5"])
+        # query state is reset after every terminal call
+        self.assertEqual(len(data.show()), 1000)
+
+
+class TestIndexes(ArkivistTestCase):
+    def sample(self):
+        records = Arkivist(self.path("records.json"))
+        records.update(
+            {
+                "a": {"status": "open", "n": 1},
+                "b": {"status": "closed", "n": 2},
+                "c": {"status": "open", "n": 3},
+                "d": "not a record",
+            }
+        )
+        return records.create_index("status")
+
+    def test_index_matches_scan(self):
+        records = self.sample()
+        indexed = records.where("status", "open", exact=True).show()
+        records.drop_index("status")
+        scanned = records.where("status", "open", exact=True).show()
+        self.assertEqual(indexed, scanned)
+        self.assertEqual(sorted(indexed), ["a", "c"])
+
+    def test_index_is_used(self):
+        records = self.sample()
+        with mock.patch("arkivist.arkivist._predicate") as scan:
+            result = records.where("status", "closed", exact=True).show()
+            excluded = records.where("status").exclude("open", exact=True).show()
+        scan.assert_not_called()
+        self.assertEqual(list(result), ["b"])
+        self.assertEqual(sorted(excluded), ["b", "d"])
+
+    def test_index_follows_mutations(self):
+        records = self.sample()
+        records.set("e", {"status": "open"})
+        records["a"] = {"status": "closed"}
+        records.find("b").set("status", "open")
+        records.pop("c")
+        records.update({"f": {"status": "open"}})
+        del records["e"]
+        self.assertEqual(sorted(records.where("status", "open", exact=True).show()), ["b", "f"])
+        records.load({"x": {"status": "open"}})
+        self.assertEqual(list(records.where("status", "open", exact=True).show()), ["x"])
+
+    def test_index_keeps_store_order(self):
+        records = Arkivist(self.path("records.json"))
+        records.update({f"k{i:02}": {"status": "open" if i % 10 else "closed"} for i in range(40)})
+        records.create_index("status")
+        records.find("k00").set("status", "open")
+        records["k10"] = {"status": "open"}
+        records.set("k05", {"status": "closed"})
+        for status in ("open", "closed"):
+            with self.subTest(status=status):
+                indexed = [
+                    records.where("status", status, exact=True).first(),
+                    list(records.where("status", status, exact=True).limit(3).show()),
+                    list(records.where("status", status, exact=True).offset(2).limit(2).show()),
+                ]
+                records.drop_index("status")
+                scanned = [
+                    records.where("status", status, exact=True).first(),
+                    list(records.where("status", status, exact=True).limit(3).show()),
+                    list(records.where("status", status, exact=True).offset(2).limit(2).show()),
+                ]
+                records.create_index("status")
+                self.assertEqual(indexed, scanned)
+        self.assertEqual(list(records.where("status", "closed", exact=True).show()), ["k05", "k20", "k30"])
+
+    def test_index_order_follows_inserts(self):
+        records = Arkivist(self.path("records.json"))
+        records.update({f"k{i:02}": {"status": "open"} for i in range(40)})
+        records.set("k05", {"status": "closed"})
+        records.create_index("status")
+        self.assertEqual(list(records.where("status", "closed", exact=True).show()), ["k05"])
+        positions = records._positions
+        records.set("new", {"status": "closed"})
+        records.pop("k05")
+        records.set("k05", {"status": "closed"})
+        records.update({"k01": {"status": "closed"}, "last": {"status": "closed"}})
+        self.assertEqual(
+            list(records.where("status", "closed", exact=True).show()),
+            ["k01", "new", "k05", "last"],
+        )
+        # kept up to date rather than rebuilt
+        self.assertIs(records._positions, positions)
+        self.assertEqual(list(positions), list(records))
+
+    def test_index_rebuilt_on_reload(self):
+        records = self.sample()
+        with open(self.path("records.json"), "w", encoding="utf-8") as f:
+            f.write('{"z": {"status": "open"}}')
+        records.reload()
+        self.assertEqual(list(records.where("status", "open", exact=True).show()), ["z"])
+
+    def test_unindexable_queries_fall_back_to_scanning(self):
+        records = self.sample()
+        self.assertEqual(
+            sorted(records.where("status", "OPEN", exact=True, sensitivity=False).show()),
+            ["a", "c"],
+        )
+        self.assertEqual(records.where("status", ["open"], exact=True).show(), {})
+        self.assertEqual(records.indexes, ("status",))
+
+
+class TestTextIndexes(ArkivistTestCase):
+    QUERIES = [
+        ("an", False, True),
+        ("AN", False, False),
+        ("Juan", True, False),
+        ("juan dela", False, False),
+        ("Dela Cruz", False, True),
+        ("x", False, False),
+        ("zzz", False, False),
+    ]
+
+    def sample(self):
+        people = Arkivist(self.path("people.json"))
+        people.update(
+            {
+                "juan": {"name": "Juan Dela Cruz"},
+                "maria": {"name": "Maria Dela Cruz"},
+                "ana": {"name": "ANA"},
+                "tags": {"name": ["an", "x"]},
+                "nameless": {"age": 3},
+                "scalar": 5,
+            }
+        )
+        return people
+
+    def results(self, people, keyword, exact, sensitivity):
+        """Query results, in order, so a difference in order fails too."""
+        return [
+            list(people.where("name", keyword, exact, sensitivity).show().items()),
+            list(people.where("name").exclude(keyword, exact, sensitivity).show().items()),
+            people.where("name", keyword, exact, sensitivity).first(),
+            list(people.where("name", keyword, exact, sensitivity).limit(2).show()),
+        ]
+
+    def assertSameAsScan(self, people):
+        for keyword, exact, sensitivity in self.QUERIES:
+            people.create_index("name", text=True)
+            indexed = self.results(people, keyword, exact, sensitivity)
+            people.drop_index("name")
+            self.assertEqual(indexed, self.results(people, keyword, exact, sensitivity))
+
+    def test_matches_scan(self):
+        self.assertSameAsScan(self.sample())
+
+    def test_index_is_used(self):
+        people = self.sample().create_index("name", text=True)
+        with mock.patch("arkivist.arkivist._query", return_value={}) as scan:
+            result = people.where("name", "dela", exact=False, sensitivity=False).show()
+        # only the non-string values are scanned
+        self.assertEqual(list(scan.call_args[0][0]), ["tags", "nameless", "scalar"])
+        self.assertEqual(list(result), ["juan", "maria"])
+
+    def test_lazy_values(self):
+        self.sample().save()
+        self.assertSameAsScan(Arkivist(self.path("people.json"), lazy=True))
+        people = Arkivist(self.path("people.json"), lazy=True)
+        people.create_index("name", text=True)
+        result = people.where("name", "Juan", exact=False, sensitivity=True).show()
+        self.assertEqual(list(result), ["juan"])
+        self.assertEqual(people.where("name", "x", exact=False).show(), {"tags": {"name": ["an", "x"]}})
+
+    def test_follows_mutations(self):
+        people = self.sample().create_index("name", text=True)
+        people.find("juan").set("name", "Pedro")
+        people["ana"] = {"name": "Anabelle"}
+        people.pop("maria")
+        people.set("tags", {"name": "Tagalog"})
+        result = people.where("name", "an", exact=False, sensitivity=False).show()
+        self.assertEqual(sorted(result), ["ana"])
+        self.assertSameAsScan(people)
+
+    def test_keeps_store_order(self):
+        people = self.sample().create_index("name", text=True)
+        people.set("juan", {"name": "Juan"})
+        people.find("nameless").set("name", "Juana")
+        result = people.where("name", "an", exact=False, sensitivity=False)
+        self.assertEqual(list(result.show()), ["juan", "ana", "tags", "nameless"])
+        result = people.where("name", "juan", exact=False, sensitivity=False)
+        self.assertEqual(list(result.show()), ["juan", "nameless"])
+        self.assertSameAsScan(people)
+
+    def test_rebuilt_on_reload(self):
+        people = self.sample().create_index("name", text=True)
+        with open(self.path("people.json"), "w", encoding="utf-8") as f:
+            f.write('{"new": {"name": "Dela"}}')
+        people.reload()
+        self.assertEqual(list(people.where("name", "dela", sensitivity=False).show()), ["new"])
+
+
 class TestTransformations(ArkivistTestCase):
     def test_flatten(self):
         data = Arkivist({"a": {"b": [1, 2]}, "c": 3})
         self.assertEqual(data.flatten(), {"a.b.0": 1, "a.b.1": 2, "c": 3})
 
+    def test_iter_flatten(self):
+        data = Arkivist({"a": {"b": [1, {"c": 2}], "e": {}}, "d": 3})
+        self.assertEqual(list(data.iter_flatten()), [("a.b.0", 1), ("a.b.1.c", 2), ("d", 3)])
+        self.assertEqual(dict(data.iter_flatten("/")), {"a/b/0": 1, "a/b/1/c": 2, "d": 3})
+        self.assertEqual(
+            dict(data.iter_flatten(None)), {("a", "b", "0"): 1, ("a", "b", "1", "c"): 2, ("d",): 3}
+        )
+        self.assertEqual(
+            data.flatten(max_depth=2), {"a.b": [1, {"c": 2}], "a.e": {}, "d": 3}
+        )
+        with self.assertRaises(ArkivistException):
+            data.flatten(max_depth=0)
+        with self.assertRaises(ArkivistException):
+            list(data.iter_flatten(separator=1))
+
+    def test_flatten_deep_documents(self):
+        deep = value = {}
+        for _ in range(5000):
+            value["x"] = value = {}
+        value["leaf"] = True
+        data = Arkivist({"deep": deep})
+        (key, leaf), = data.iter_flatten()
+        self.assertEqual((key.count("."), leaf), (5001, True))
+        self.assertEqual(data.flatten(), {key: True})
+
+    def test_cached_flatten(self):
+        data = Arkivist({"a": {"b": 1}, "c": [1, 2], "d": 4})
+        self.assertEqual(data.flatten(cached=True), data.flatten())
+        with mock.patch.object(arkivist_module, "_iter_flat", wraps=arkivist_module._iter_flat) as flat:
+            data.find("a").set("b", 2)
+            data.set("e", 5)
+            del data["d"]
+            self.assertEqual(data.flatten(cached=True), {"a.b": 2, "c.0": 1, "c.1": 2, "e": 5})
+            self.assertEqual(flat.call_count, 2)
+            self.assertEqual(data.flatten("/", cached=True), {"a/b": 2, "c/0": 1, "c/1": 2, "e": 5})
+            data.load({"x": {"y": 1}})
+            self.assertEqual(data.flatten("/", cached=True), {"x/y": 1})
+
     def test_invert(self):
         data = Arkivist({"a": 1, "b": 2})
         data.invert()
@@ -335,6 +846,479 @@ class TestSaving(ArkivistTestCase):
         self.assertEqual(leftovers, [])
 
 
+class TestJournal(ArkivistTestCase):
+    def journal_lines(self, name):
+        return self.read_raw(name + ".journal").splitlines()
+
+    def test_mutations_append_instead_of_rewriting(self):
+        storage = Arkivist(self.path("j.json"), journal=True)
+        base = self.read_raw("j.json")
+        storage.set("a", 1)
+        storage["b"] = {"c": 2}
+        storage.find("b").set("d", 3)
+        del storage["a"]
+        self.assertEqual(self.read_raw("j.json"), base)
+        records = [json.loads(line) for line in self.journal_lines("j.json")]
+        self.assertEqual([r["op"] for r in records], ["set", "set", "set", "del"])
+        self.assertEqual(records[2]["path"], ["b", "d"])
+
+    def test_reopen_replays_journal(self):
+        storage = Arkivist(self.path("replay.json"), journal=True)
+        storage.update({"a": 1, "b": 2})
+        storage.set("list", [])
+        storage.append_in("list", "x")
+        storage.pop("b")
+        storage[3] = "three"
+        again = Arkivist(self.path("replay.json"), journal=True)
+        self.assertEqual(dict(again), {"a": 1, "list": ["x"], "3": "three"})
+        # plain instances replay too, then fold the journal into the file
+        plain = Arkivist(self.path("replay.json"))
+        self.assertEqual(dict(plain), dict(again))
+        self.assertFalse(os.path.exists(self.path("replay.json.journal")))
+
+    def test_save_keeps_changes_made_in_place(self):
+        storage = Arkivist(self.path("inplace-j.json"), journal=True)
+        storage.set("lst", [])
+        storage["lst"].append(1)
+        storage.save()
+        self.assertEqual(dict(Arkivist(self.path("inplace-j.json"), journal=True)), {"lst": [1]})
+        self.assertFalse(os.path.exists(self.path("inplace-j.json.journal")))
+
+    def test_compact(self):
+        storage = Arkivist(self.path("compact.json"), journal=True)
+        storage.set("a", 1)
+        storage.compact()
+        self.assertEqual(json.loads(self.read_raw("compact.json")), {"a": 1})
+        self.assertFalse(os.path.exists(self.path("compact.json.journal")))
+
+    def test_full_replacements_rewrite_the_file(self):
+        storage = Arkivist(self.path("load.json"), journal=True)
+        storage.set("a", 1)
+        storage.load({"b": 2})
+        self.assertEqual(json.loads(self.read_raw("load.json")), {"b": 2})
+        self.assertFalse(os.path.exists(self.path("load.json.journal")))
+
+    def test_truncated_last_record_is_ignored(self):
+        storage = Arkivist(self.path("cut.json"), journal=True)
+        storage.set("a", 1)
+        with open(self.path("cut.json.journal"), "a", encoding="utf-8") as f:
+            f.write('{"op": "set", "path": ["b"')
+        self.assertEqual(dict(Arkivist(self.path("cut.json"), journal=True)), {"a": 1})
+
+    def test_batch_appends_once(self):
+        storage = Arkivist(self.path("jb.json"), journal=True)
+        with storage.batch():
+            for i in range(5):
+                storage.set("counter", i)
+        self.assertEqual(len(self.journal_lines("jb.json")), 1)
+        self.assertEqual(Arkivist(self.path("jb.json"))["counter"], 4)
+
+
+class TestLazyMode(ArkivistTestCase):
+    def setUp(self):
+        super().setUp()
+        self.data = {
+            str(i): {"n": i, "text": 'quote " and } brace', "list": [i, {"x": [i]}]}
+            for i in range(20)
+        }
+        Arkivist(self.path("lazy.json"), indent=2).update(self.data)
+
+    def test_values_are_decoded_on_access(self):
+        storage = Arkivist(self.path("lazy.json"), lazy=True)
+        self.assertIsInstance(storage, Arkivist)
+        self.assertEqual(len(storage), 20)
+        self.assertEqual(len(storage._unloaded), 20)
+        self.assertEqual(storage["3"], self.data["3"])
+        self.assertEqual(storage.get("4"), self.data["4"])
+        self.assertIn("5", storage)
+        self.assertEqual(len(storage._unloaded), 17)
+        self.assertEqual(sorted(storage), sorted(self.data))
+        self.assertEqual(len(storage._unloaded), 17)
+        self.assertEqual(dict(storage), self.data)
+        self.assertFalse(storage._unloaded)
+
+    def test_opening_does_not_rewrite(self):
+        before = self.read_raw("lazy.json")
+        with mock.patch("arkivist.arkivist._atomic_write") as write:
+            Arkivist(self.path("lazy.json"), lazy=True)
+        write.assert_not_called()
+        self.assertEqual(self.read_raw("lazy.json"), before)
+
+    def test_saves_copy_undecoded_values(self):
+        storage = Arkivist(self.path("lazy.json"), lazy=True)
+        storage["new"] = {"nested": [1, 2]}
+        storage.find("2").set("n", "two")
+        del storage["7"]
+        self.assertEqual(len(storage._unloaded), 18)
+        expected = dict(self.data, new={"nested": [1, 2]})
+        expected["2"] = dict(expected["2"], n="two")
+        del expected["7"]
+        self.assertEqual(json.loads(self.read_raw("lazy.json")), expected)
+        self.assertEqual(dict(Arkivist(self.path("lazy.json"))), expected)
+
+    def test_whole_contents_operations(self):
+        storage = Arkivist(self.path("lazy.json"), lazy=True)
+        self.assertEqual(storage.where("n", 3, exact=True).show(), {"3": self.data["3"]})
+        self.assertEqual(storage.show(), self.data)
+        lazy = Arkivist(self.path("lazy.json"), lazy=True)
+        self.assertEqual(len(lazy.random()), 1)
+        lazy.clear()
+        self.assertEqual(json.loads(self.read_raw("lazy.json")), {})
+
+    def test_journal_replay(self):
+        storage = Arkivist(self.path("lazy.json"), lazy=True, journal=True)
+        storage.find("1").set("n", "one")
+        storage.pop("2")
+        again = Arkivist(self.path("lazy.json"), lazy=True, journal=True)
+        self.assertEqual(again["1"]["n"], "one")
+        self.assertNotIn("2", again)
+        again.compact()
+        self.assertEqual(json.loads(self.read_raw("lazy.json"))["1"]["n"], "one")
+
+    def test_reload_and_autosort(self):
+        storage = Arkivist(self.path("lazy.json"), lazy=True, autosort=True, reverse=True)
+        Arkivist(self.path("lazy.json")).set("0", "changed")
+        self.assertEqual(storage.reload()["0"], "changed")
+        storage.set("a", 1)
+        self.assertEqual(list(json.loads(self.read_raw("lazy.json")))[0], "a")
+
+    def test_invalid_files(self):
+        with open(self.path("bad.json"), "w", encoding="utf-8") as f:
+            f.write('{"a": 1, "b": [1, 2}')
+        with self.assertRaises(ArkivistException):
+            Arkivist(self.path("bad.json"), lazy=True)
+        with open(self.path("bad.json"), "w", encoding="utf-8") as f:
+            f.write('{"a": 1, "b": tru}')
+        storage = Arkivist(self.path("bad.json"), lazy=True)
+        self.assertEqual(storage["a"], 1)
+        with self.assertRaises(ArkivistException):
+            storage.get("b")
+
+
+class TestMappedMode(ArkivistTestCase):
+    def setUp(self):
+        super().setUp()
+        self.data = {str(i): {"n": i, "name": f"record {i}", "tags": ["ñ", i]} for i in range(30)}
+        Arkivist(self.path("mapped.json")).update(self.data)
+
+    def test_reads_from_the_mapping(self):
+        storage = Arkivist(self.path("mapped.json"), mode="r", mmap=True)
+        self.assertEqual(len(storage), 30)
+        self.assertEqual(sorted(storage), sorted(self.data))
+        self.assertEqual(len(storage._unloaded), 30)
+        self.assertEqual(storage["4"], self.data["4"])
+        self.assertEqual(storage.get("5"), self.data["5"])
+        self.assertIn("6", storage)
+        self.assertNotIn("missing", storage)
+        self.assertEqual(storage.where("n", 7, exact=True).show(), {"7": self.data["7"]})
+        self.assertEqual(storage.find("8").get("name"), "record 8")
+        # queries decode records for the caller only
+        self.assertEqual(len(storage._unloaded), 26)
+        self.assertEqual(dict(storage), self.data)
+
+    def test_offsets_sidecar(self):
+        Arkivist(self.path("mapped.json"), mode="r", mmap=True)
+        self.assertTrue(os.path.exists(self.path("mapped.json.idx")))
+        with mock.patch("arkivist.arkivist.scan_object") as scan:
+            storage = Arkivist(self.path("mapped.json"), mode="r", mmap=True)
+            self.assertEqual(storage["9"], self.data["9"])
+        scan.assert_not_called()
+
+    def test_stale_sidecar_is_rebuilt(self):
+        Arkivist(self.path("mapped.json"), mode="r", mmap=True)
+        Arkivist(self.path("mapped.json")).set("new", "value")
+        storage = Arkivist(self.path("mapped.json"), mode="r", mmap=True)
+        self.assertEqual(storage["new"], "value")
+        self.assertEqual(storage["0"], self.data["0"])
+
+    def test_read_only(self):
+        storage = Arkivist(self.path("mapped.json"), mode="r", mmap=True)
+        with self.assertRaises(ArkivistException):
+            storage.set("a", 1)
+        with self.assertRaises(ArkivistException):
+            storage["a"] = 1
+        with self.assertRaises(ArkivistException):
+            del storage["0"]
+        with self.assertRaises(ArkivistException):
+            storage.save()
+        with self.assertRaises(ArkivistException):
+            Arkivist(self.path("mapped.json"), mmap=True)
+        self.assertNotIn("a", storage)
+        storage.save(save_as=self.path("copy.json"))
+        self.assertEqual(json.loads(self.read_raw("copy.json")), self.data)
+
+    def test_reload_and_empty_files(self):
+        storage = Arkivist(self.path("mapped.json"), mode="r", mmap=True)
+        Arkivist(self.path("mapped.json")).set("0", "changed")
+        self.assertEqual(storage.reload()["0"], "changed")
+        with open(self.path("empty.json"), "w", encoding="utf-8") as f:
+            f.write("  \n")
+        self.assertEqual(dict(Arkivist(self.path("empty.json"), mode="r", mmap=True)), {})
+        with self.assertRaises(ArkivistException):
+            Arkivist(self.path("missing.json"), mode="r", mmap=True)
+
+
+def _increment(filepath, times, options):
+    storage = Arkivist(filepath, **options)
+    for _ in range(times):
+        # the read and the write must happen under the same lock
+        with storage.batch():
+            storage["counter"] = storage.get("counter", 0) + 1
+
+
+class TestFileSync(ArkivistTestCase):
+    def test_is_stale(self):
+        first = Arkivist(self.path("shared.json"))
+        second = Arkivist(self.path("shared.json"), mode="r")
+        self.assertFalse(first.is_stale())
+        # opening a file in `r+` mode saves it
+        second = Arkivist(self.path("shared.json"))
+        self.assertTrue(first.is_stale())
+        first.reload()
+        second["a"] = 1
+        self.assertTrue(first.is_stale())
+        self.assertFalse(second.is_stale())
+        first.reload()
+        self.assertFalse(first.is_stale())
+        self.assertFalse(Arkivist().is_stale())
+
+    def test_is_stale_sees_journal_appends(self):
+        first = Arkivist(self.path("journaled.json"), journal=True)
+        second = Arkivist(self.path("journaled.json"), journal=True)
+        second["a"] = 1
+        self.assertTrue(first.is_stale())
+
+    def test_auto_reload(self):
+        reader = Arkivist(self.path("shared.json"), auto_reload=True)
+        writer = Arkivist(self.path("shared.json"))
+        writer["a"] = 1
+        self.assertEqual(reader.get("a"), 1)
+        writer["a"] = 2
+        self.assertEqual(reader["a"], 2)
+        self.assertEqual(reader.show(), {"a": 2})
+
+    def test_auto_reload_keeps_unsaved_changes(self):
+        reader = Arkivist(self.path("shared.json"), auto_reload=True, autosave=False)
+        reader["mine"] = 1
+        Arkivist(self.path("shared.json"))["theirs"] = 2
+        self.assertEqual(reader.get("mine"), 1)
+        reader.save()
+        self.assertFalse(reader.is_stale())
+
+    def test_lock_file(self):
+        storage = Arkivist(self.path("locked.json"), lock=True)
+        storage["a"] = 1
+        self.assertTrue(os.path.exists(self.path("locked.json.lock")))
+        with self.assertRaises(ArkivistException):
+            Arkivist(lock=True)
+        with self.assertRaises(ArkivistException):
+            Arkivist(self.path("locked.json"), lock=True, autosave="deferred")
+        with self.assertRaises(ArkivistException):
+            storage.autosave = "deferred"
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires fork")
+    def test_concurrent_processes(self):
+        context = multiprocessing.get_context("fork")
+        filepath = self.path("counter.json")
+        Arkivist(filepath, lock=True)["counter"] = 0
+        workers = [
+            context.Process(target=_increment, args=(filepath, 40, {"lock": True}))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(60)
+            self.assertEqual(worker.exitcode, 0)
+        self.assertEqual(Arkivist(filepath)["counter"], 160)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires fork")
+    def test_batch_holds_the_lock(self):
+        context = multiprocessing.get_context("fork")
+        filepath = self.path("batch.json")
+        storage = Arkivist(filepath, lock=True)
+        with storage.batch():
+            storage["a"] = 1
+            worker = context.Process(target=_increment, args=(filepath, 1, {"lock": True}))
+            worker.start()
+            time.sleep(0.2)
+            self.assertTrue(worker.is_alive())
+            storage["b"] = 2
+        worker.join(60)
+        self.assertEqual(Arkivist(filepath).show(), {"a": 1, "b": 2, "counter": 1})
+
+
+class TestDeferredAutosave(ArkivistTestCase):
+    def test_mutations_only_mark_dirty(self):
+        storage = Arkivist(self.path("def.json"), autosave="deferred", flush_interval=60000)
+        storage.set("a", 1)
+        self.assertEqual(storage.autosave, "deferred")
+        self.assertEqual(json.loads(self.read_raw("def.json")), {})
+        storage.flush()
+        self.assertEqual(json.loads(self.read_raw("def.json")), {"a": 1})
+
+    def test_background_flush_coalesces_writes(self):
+        with mock.patch(
+            "arkivist.arkivist._atomic_write", wraps=arkivist_module._atomic_write
+        ) as write:
+            storage = Arkivist(self.path("bg.json"), autosave="deferred", flush_interval=50)
+            opened = write.call_count
+            for i in range(200):
+                storage.set(str(i), i)
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                if len(json.loads(self.read_raw("bg.json"))) == 200:
+                    break
+                time.sleep(0.02)
+            self.assertEqual(len(json.loads(self.read_raw("bg.json"))), 200)
+            self.assertLess(write.call_count - opened, 10)
+
+    def test_context_exit_flushes(self):
+        with Arkivist(self.path("defctx.json"), autosave="deferred", flush_interval=60000) as storage:
+            storage.set("a", 1)
+        self.assertEqual(json.loads(self.read_raw("defctx.json")), {"a": 1})
+
+    def test_invalid_autosave_raises(self):
+        with self.assertRaises(ArkivistException):
+            Arkivist(self.path("x.json"), autosave="sometimes")
+
+    def blocked_writes(self):
+        """Patch `_atomic_write` so each write waits for `release`, and
+        record the contents written."""
+        saving, release, written = threading.Event(), threading.Event(), []
+        atomic_write = arkivist_module._atomic_write
+
+        def write(filepath, content, metrics=None):
+            saving.set()
+            release.wait(5)
+            written.append(json.loads(b"".join(content) if isinstance(content, list) else content))
+            atomic_write(filepath, content, metrics)
+
+        return mock.patch.object(arkivist_module, "_atomic_write", write), saving, release, written
+
+    def test_wait_for_save(self):
+        storage = Arkivist(self.path("wait.json"), autosave="deferred", flush_interval=60000)
+        storage.set("a", 1)
+        # the flush interval is skipped
+        self.assertTrue(storage.wait_for_save(timeout=5))
+        self.assertEqual(json.loads(self.read_raw("wait.json")), {"a": 1})
+        self.assertTrue(storage.wait_for_save(timeout=0))
+
+    def test_unencodable_values_are_reported(self):
+        storage = Arkivist(self.path("bad.json"), autosave="deferred", flush_interval=0)
+        storage.set("bad", {1, 2})
+        with self.assertRaises(TypeError):
+            storage.wait_for_save(timeout=5)
+        # the writer is still there for the next change
+        storage.set("bad", [1, 2])
+        self.assertTrue(storage.wait_for_save(timeout=5))
+        self.assertEqual(json.loads(self.read_raw("bad.json")), {"bad": [1, 2]})
+
+    def test_wait_for_save_without_autosave(self):
+        storage = Arkivist(self.path("manual.json"), autosave=False)
+        self.assertTrue(storage.wait_for_save())
+        storage.set("a", 1)
+        self.assertFalse(storage.wait_for_save())
+
+    def test_changes_go_on_during_saves(self):
+        storage = Arkivist(self.path("bg.json"), autosave="deferred", flush_interval=0)
+        storage.set("list", [1]).set("nested", {"x": 1})
+        self.assertTrue(storage.wait_for_save(timeout=5))
+        patch, saving, release, written = self.blocked_writes()
+        with patch:
+            storage.set("a", 1)
+            self.assertTrue(saving.wait(5))
+            try:
+                # neither waits for the write, nor changes what it writes
+                storage.set("b", 2)
+                storage.append_in("list", 2)
+                storage.find("nested").set("y", 2)
+            finally:
+                release.set()
+            self.assertTrue(storage.wait_for_save(timeout=5))
+        self.assertEqual(written[0], {"list": [1], "nested": {"x": 1}, "a": 1})
+        expected = {"list": [1, 2], "nested": {"x": 1, "y": 2}, "a": 1, "b": 2}
+        self.assertEqual(written[-1], expected)
+        self.assertEqual(json.loads(self.read_raw("bg.json")), expected)
+
+    def test_journaled_saves_in_background(self):
+        storage = Arkivist(
+            self.path("bgj.json"), autosave="deferred", flush_interval=0, journal=True
+        )
+        for i in range(50):
+            storage.set(str(i % 7), i)
+            storage.append_in("seen", i)
+        self.assertTrue(storage.wait_for_save(timeout=5))
+        self.assertEqual(dict(Arkivist(self.path("bgj.json"), mode="r")), dict(storage))
+
+    def test_background_errors_are_raised(self):
+        storage = Arkivist(self.path("err.json"), autosave="deferred", flush_interval=0)
+
+        def fail(filepath, content, metrics=None):
+            raise ArkivistException("disk full")
+
+        with mock.patch.object(arkivist_module, "_atomic_write", fail):
+            storage.set("a", 1)
+            with self.assertRaises(ArkivistException):
+                storage.wait_for_save(timeout=5)
+        storage.set("b", 2)
+        self.assertTrue(storage.wait_for_save(timeout=5))
+        self.assertEqual(json.loads(self.read_raw("err.json")), {"a": 1, "b": 2})
+
+
+class TestNoOpWrites(ArkivistTestCase):
+    def assertNotWritten(self, storage, action):
+        skipped, saved = storage.skipped_writes, storage.saved_version
+        with mock.patch("arkivist.arkivist._atomic_write") as write:
+            action()
+        write.assert_not_called()
+        self.assertEqual(storage.saved_version, saved)
+        self.assertGreater(storage.skipped_writes, skipped)
+
+    def test_equal_overwrites_are_skipped(self):
+        storage = Arkivist(self.path("noop.json"))
+        storage.update({"a": 1, "nested": {"b": [1, 2]}, "group": {"x": 1}})
+        self.assertNotWritten(storage, lambda: storage.set("a", 1))
+        self.assertNotWritten(storage, lambda: storage.__setitem__("nested", {"b": [1, 2]}))
+        self.assertNotWritten(storage, lambda: storage.update({"a": 1}))
+        self.assertNotWritten(storage, lambda: storage.find("group").set("x", 1))
+        self.assertNotWritten(storage, lambda: storage.pop("missing", None))
+
+    def test_list_helpers_without_changes_are_skipped(self):
+        storage = Arkivist(self.path("noop-list.json"))
+        storage.append_in("colors", ("red", "blue"))
+        self.assertNotWritten(storage, lambda: storage.append_in("colors", "red", unique=True))
+        self.assertNotWritten(storage, lambda: storage.remove_in("colors", "green"))
+
+    def test_batch_without_changes_is_skipped(self):
+        storage = Arkivist(self.path("noop-batch.json"))
+        storage.set("a", 1)
+
+        def unchanged_batch():
+            with storage.batch():
+                storage.set("a", 1)
+
+        self.assertNotWritten(storage, unchanged_batch)
+
+    def test_type_changes_are_written(self):
+        storage = Arkivist(self.path("types.json"))
+        storage.set("flag", 1)
+        storage.set("flag", True)
+        storage.set("order", {"a": 1, "b": 2})
+        storage.set("order", {"b": 2, "a": 1})
+        self.assertEqual(self.read_raw("types.json").count("true"), 1)
+        self.assertEqual(list(json.loads(self.read_raw("types.json"))["order"]), ["b", "a"])
+
+    def test_in_place_changes_are_written(self):
+        storage = Arkivist(self.path("inplace.json"))
+        storage.set("group", {})
+        group = storage["group"]
+        group["x"] = 1
+        storage["group"] = group
+        self.assertEqual(json.loads(self.read_raw("inplace.json")), {"group": {"x": 1}})
+        self.assertEqual(storage.version, storage.saved_version)
+
+
 class TestDeprecations(ArkivistTestCase):
     def test_count_warns_but_works(self):
         data = Arkivist({"a": 1, "b": 2})
@@ -402,6 +1386,15 @@ class TestEncryption(ArkivistTestCase):
         with self.assertRaises(ArkivistException):
             Arkivist(self.path("enc4.json"))
 
+    def test_encrypted_journal(self):
+        authfile = self.path("jkey.txt")
+        storage = Arkivist(self.path("encj.json"), authfile=authfile, journal=True)
+        storage.encrypt()
+        storage.set("secret", "Cloudy")
+        self.assertNotIn("Cloudy", self.read_raw("encj.json.journal"))
+        again = Arkivist(self.path("encj.json"), authfile=authfile, journal=True)
+        self.assertEqual(again["secret"], "Cloudy")
+
     def test_wrong_key_raises(self):
         storage = Arkivist(self.path("enc5.json"), authfile=self.path("key5.txt"))
         storage.encrypt()
@@ -411,6 +1404,646 @@ class TestEncryption(ArkivistTestCase):
         with self.assertRaises(ArkivistException):
             Arkivist(self.path("enc5.json"), authfile=self.path("key6.txt"))
 
+    def encrypted_store(self, name, size=1000, **options):
+        authfile = self.path("chunk-key.txt")
+        storage = Arkivist(self.path(name), authfile=authfile, **options)
+        storage.encrypt()
+        storage.update({f"key-{i}": {"n": i} for i in range(size)})
+        return storage, authfile
+
+    def tokens(self, name):
+        return json.loads(self.read_raw(name))["content"]
+
+    def test_chunks_keep_their_tokens(self):
+        storage, authfile = self.encrypted_store("chunks.json")
+        before = self.tokens("chunks.json")
+        self.assertGreater(len(before), 5)
+        storage["key-500"] = "changed"
+        after = self.tokens("chunks.json")
+        self.assertEqual(len(after), len(before))
+        self.assertEqual(sum(a != b for a, b in zip(before, after)), 1)
+        storage["key-new"] = 1
+        self.assertEqual(self.tokens("chunks.json")[:-1], after[:-1])
+
+        again = Arkivist(self.path("chunks.json"), authfile=authfile)
+        self.assertEqual(list(again), list(storage))
+        self.assertEqual(again["key-500"], "changed")
+        # the tokens read from the file are reused too
+        before = self.tokens("chunks.json")
+        again["key-1"] = "changed"
+        after = self.tokens("chunks.json")
+        self.assertEqual(sum(a != b for a, b in zip(before, after)), 1)
+
+    def test_changes_in_place_are_saved(self):
+        storage, authfile = self.encrypted_store("inplace.json")
+        dict.__getitem__(storage, "key-7")["n"] = "changed"
+        storage.save()
+        self.assertEqual(Arkivist(self.path("inplace.json"), authfile=authfile)["key-7"], {"n": "changed"})
+
+    def test_reads_single_token_envelopes(self):
+        storage, authfile = self.encrypted_store("legacy.json", size=3)
+        payload = json.dumps({"a": 1, "b": [2]}).encode("utf-8")
+        envelope = {
+            "arkivist": 1.3,
+            "encryption": "fernet",
+            "content": storage._cypher.encrypt(payload).decode("utf-8"),
+        }
+        with open(self.path("legacy.json"), "w", encoding="utf-8") as f:
+            json.dump(envelope, f)
+        before = self.read_raw("legacy.json")
+        again = Arkivist(self.path("legacy.json"), authfile=authfile)
+        self.assertEqual(dict(again), {"a": 1, "b": [2]})
+        # opening does not rewrite the file, the first change does
+        self.assertEqual(self.read_raw("legacy.json"), before)
+        again.set("c", 3)
+        self.assertEqual(json.loads(self.read_raw("legacy.json"))["arkivist"], 1.4)
+        again = Arkivist(self.path("legacy.json"), authfile=authfile)
+        self.assertEqual(dict(again), {"a": 1, "b": [2], "c": 3})
+
+    def test_lazy_decoding(self):
+        storage, authfile = self.encrypted_store("lazy.json")
+        before = self.tokens("lazy.json")
+        lazy = Arkivist(self.path("lazy.json"), authfile=authfile, lazy=True)
+        self.assertEqual(len(lazy._unloaded), 1000)
+        self.assertEqual(lazy["key-3"], {"n": 3})
+        lazy["key-600"] = "changed"
+        self.assertEqual(len(lazy._unloaded), 998)
+        after = self.tokens("lazy.json")
+        self.assertEqual(sum(a != b for a, b in zip(before, after)), 1)
+        self.assertEqual(Arkivist(self.path("lazy.json"), authfile=authfile)["key-600"], "changed")
+
+
+class TestReadersWriterLock(ArkivistTestCase):
+    def hold_shared(self, lock, entered, release):
+        with lock.shared():
+            entered.set()
+            release.wait(5)
+
+    def test_readers_share_the_lock(self):
+        storage = Arkivist(self.path("rw.json"), rwlock=True)
+        storage.set("key", "value")
+        entered, release = threading.Event(), threading.Event()
+        reader = threading.Thread(target=self.hold_shared, args=(storage._lock, entered, release))
+        reader.start()
+        self.assertTrue(entered.wait(5))
+        try:
+            # would wait for the other thread with the default lock
+            self.assertEqual(storage.get("key"), "value")
+            self.assertTrue(storage.matches("key", "value"))
+            self.assertEqual(storage.show(), {"key": "value"})
+        finally:
+            release.set()
+            reader.join()
+
+    def test_writers_go_before_new_readers(self):
+        lock = arkivist_module._RWLock()
+        entered, release = threading.Event(), threading.Event()
+        order = []
+        reader = threading.Thread(target=self.hold_shared, args=(lock, entered, release))
+        reader.start()
+        self.assertTrue(entered.wait(5))
+
+        def write():
+            with lock:
+                order.append("writer")
+
+        def read():
+            with lock.shared():
+                order.append("reader")
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        while not lock._waiting:
+            time.sleep(0.001)
+        late = threading.Thread(target=read)
+        late.start()
+        time.sleep(0.05)
+        self.assertEqual(order, [])
+        release.set()
+        for thread in (reader, writer, late):
+            thread.join()
+        self.assertEqual(order, ["writer", "reader"])
+
+    def test_reentrancy(self):
+        lock = arkivist_module._RWLock()
+        with lock:
+            with lock.shared():
+                with lock:
+                    pass
+        me = threading.get_ident()
+        with lock.shared():
+            with lock.shared():
+                # the shared holds are given up while holding the lock
+                with lock:
+                    self.assertEqual(lock._readers, {})
+                self.assertEqual(lock._readers, {me: 2})
+            self.assertEqual(lock._readers, {me: 1})
+        self.assertEqual(lock._readers, {})
+        self.assertIsNone(lock._writer)
+        with self.assertRaises(RuntimeError):
+            lock.release()
+
+    def test_readers_go_on_during_saves(self):
+        storage = Arkivist(self.path("rw.json"), rwlock=True)
+        storage.set("key", "value")
+        saving, release = threading.Event(), threading.Event()
+        atomic_write = arkivist_module._atomic_write
+
+        def slow_write(filepath, content, metrics=None):
+            saving.set()
+            release.wait(5)
+            atomic_write(filepath, content, metrics)
+
+        with mock.patch.object(arkivist_module, "_atomic_write", slow_write):
+            writer = threading.Thread(target=storage.set, args=("other", 1))
+            writer.start()
+            self.assertTrue(saving.wait(5))
+            try:
+                self.assertEqual(storage.get("other"), 1)
+                self.assertEqual(storage.show(), {"key": "value", "other": 1})
+            finally:
+                release.set()
+                writer.join()
+        self.assertEqual(Arkivist(self.path("rw.json"), mode="r")["other"], 1)
+
+    def test_lazy_reads_load_values(self):
+        Arkivist(self.path("lazy.json")).update({str(i): {"value": i} for i in range(20)})
+        storage = Arkivist(self.path("lazy.json"), lazy=True, rwlock=True)
+        results = {}
+
+        def read(i):
+            results[i] = storage.get(str(i))
+
+        threads = [threading.Thread(target=read, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, {i: {"value": i} for i in range(20)})
+
+    def test_with_file_lock(self):
+        storage = Arkivist(self.path("locked.json"), lock=True, rwlock=True)
+        storage.set("count", 1)
+        with storage._lock.shared():
+            self.assertEqual(storage.get("count"), 1)
+            # taking the lock converts the shared file lock
+            storage.set("count", 2)
+        self.assertEqual(Arkivist(self.path("locked.json"), mode="r")["count"], 2)
+
+    def test_concurrent_mixed_operations(self):
+        storage = Arkivist(self.path("mixed.json"), rwlock=True)
+        errors = []
+
+        def writer(worker):
+            try:
+                for i in range(50):
+                    storage.set(f"{worker}-{i}", i)
+                    storage.append_in("shared", i)
+            except Exception as e:  # pragma: no cover
+                errors.append(e)
+
+        def reader():
+            try:
+                for _ in range(50):
+                    storage.show()
+                    storage.first()
+                    dict(storage.where("missing", "x").query())
+            except Exception as e:  # pragma: no cover
+                errors.append(e)
+
+        threads = [threading.Thread(target=writer, args=(w,)) for w in range(4)]
+        threads += [threading.Thread(target=reader) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(storage["shared"]), 200)
+        self.assertEqual(len(json.loads(self.read_raw("mixed.json"))), 201)
+
+
+class TestMetrics(ArkivistTestCase):
+    def test_counters_and_timings(self):
+        storage = Arkivist(self.path("metrics.json"), metrics=True)
+        storage.set("a", 1)
+        storage.set("a", 1)
+        storage.update({"b": 2, "c": 3})
+        stats = storage.stats()
+        # creating the file, `set` and `update`
+        self.assertEqual(stats["counters"]["writes"], 3)
+        self.assertEqual(stats["counters"]["writes_skipped"], 1)
+        self.assertGreater(
+            stats["counters"]["bytes_written"], os.path.getsize(self.path("metrics.json"))
+        )
+        for name in ("read", "save", "encode", "write", "rename", "lock_wait", "lock_hold"):
+            with self.subTest(name=name):
+                timing = stats["timings"][name]
+                self.assertGreater(timing["count"], 0)
+                self.assertLessEqual(timing["min"], timing["p50"])
+                self.assertLessEqual(timing["p50"], timing["p99"])
+                self.assertLessEqual(timing["p99"], timing["max"])
+                self.assertEqual(sum(timing["buckets"].values()), timing["count"])
+
+    def test_lock_timings_count_outermost_acquisitions(self):
+        # with `lock`, a batch holds the lock throughout
+        storage = Arkivist(self.path("locks.json"), lock=True, metrics=True)
+        storage.stats(reset=True)
+        with storage.batch():
+            storage.set("a", 1)
+            storage.set("b", 2)
+        self.assertEqual(storage.stats()["timings"]["lock_hold"]["count"], 1)
+
+    def test_queries(self):
+        storage = Arkivist(self.path("queries.json"), autosave=False, metrics=True)
+        storage.update({str(i): {"n": i % 3} for i in range(30)})
+        storage.where("n", 1, exact=True).limit(2).show()
+        storage.create_index("n")
+        storage.where("n", 1, exact=True).show()
+        stats = storage.stats()
+        self.assertEqual(stats["counters"]["queries"], 2)
+        self.assertEqual(stats["timings"]["query"]["count"], 2)
+        scanned = stats["sizes"]["query_scanned"]
+        self.assertEqual((scanned["min"], scanned["max"]), (5, 10))
+
+    def test_reset(self):
+        storage = Arkivist(self.path("reset.json"), metrics=True)
+        storage.set("a", 1)
+        self.assertIn("writes", storage.stats(reset=True)["counters"])
+        self.assertEqual(storage.stats(), {"counters": {}, "timings": {}, "sizes": {}})
+
+    def test_hook(self):
+        calls = []
+        storage = Arkivist(self.path("hook.json"), metrics=lambda name, value: calls.append(name))
+        storage.set("a", 1)
+        self.assertIn("writes", calls)
+        self.assertIn("rename", calls)
+        self.assertIn("writes", storage.stats()["counters"])
+
+    def test_failing_hook_warns(self):
+        def hook(name, value):
+            raise ValueError("exporter down")
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            storage = Arkivist(self.path("broken.json"), metrics=hook)
+            storage.set("a", 1)
+        self.assertTrue(caught)
+        self.assertEqual(json.loads(self.read_raw("broken.json")), {"a": 1})
+
+    def test_lock_options(self):
+        for options in ({"rwlock": True}, {"lock": True}, {"auto_reload": True, "rwlock": True}):
+            with self.subTest(options=options):
+                storage = Arkivist(self.path("options.json"), metrics=True, **options)
+                storage.set("a", len(options))
+                self.assertEqual(storage.where("a", len(options), exact=True).show(), {})
+                self.assertEqual(storage.get("a"), len(options))
+                stats = storage.stats()
+                self.assertGreater(stats["counters"]["writes"], 0)
+                self.assertGreater(stats["timings"]["lock_wait"]["count"], 0)
+                self.assertFalse(storage.is_stale())
+
+    def test_disabled(self):
+        storage = Arkivist(self.path("disabled.json"))
+        with self.assertRaises(ArkivistException):
+            storage.stats()
+        with self.assertRaises(ArkivistException):
+            Arkivist(self.path("invalid.json"), metrics="yes")
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    """Serves `/<name>` from the server's `documents`, 404 otherwise, with
+    an `ETag` honoured by `If-None-Match`."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        document = self.server.documents.get(self.path.lstrip("/"))
+        body = json.dumps(document).encode("utf-8")
+        etag = f'"{zlib.crc32(body):x}"'
+        if document is not None and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            body = b""
+        else:
+            self.send_response(404 if document is None else 200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        link = getattr(self.server, "links", {}).get(self.path.lstrip("/"))
+        if link:
+            self.send_header("Link", f'<{link}>; rel="next"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _fake_requests(documents):
+    """A `requests` stand-in whose sessions answer from `documents`."""
+
+    def get(url, **options):
+        document = documents[url]
+        if isinstance(document, Exception):
+            raise document
+        response = mock.MagicMock()
+        response.__enter__.return_value = response
+        response.json.return_value = document
+        return response
+
+    session = mock.MagicMock()
+    session.__enter__.return_value = session
+    session.get.side_effect = get
+    requests = mock.Mock()
+    requests.Session.return_value = session
+    return requests
+
+
+class _Responses:
+    """A `requests` stand-in answering `get()` with the queued responses
+    and recording the request headers."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.headers = []
+
+    def get(self, url, headers=None, **options):
+        self.headers.append(headers or {})
+        status, document, validators = self.responses.pop(0)
+        response = mock.MagicMock()
+        response.__enter__.return_value = response
+        response.status_code = status
+        response.headers = validators
+        response.json.side_effect = lambda: dict(document)
+        return response
+
+
+class TestConditionalFetch(ArkivistTestCase):
+    URL = "https://a.test/data.json"
+
+    def test_not_modified_skips_the_save(self):
+        requests = _Responses(
+            (200, {"a": 1}, {"ETag": '"v1"', "Last-Modified": "Mon, 05 Oct 2026 10:00:00 GMT"}),
+            (304, None, {}),
+        )
+        storage = Arkivist(self.path("cond.json"))
+        with mock.patch.object(arkivist_module, "_requests", return_value=requests):
+            storage.fetch(self.URL, conditional=True)
+            with mock.patch.object(arkivist_module, "_write_json") as write:
+                storage.fetch(self.URL, conditional=True)
+        write.assert_not_called()
+        self.assertEqual(requests.headers[0], {})
+        self.assertEqual(requests.headers[1], {
+            "If-None-Match": '"v1"', "If-Modified-Since": "Mon, 05 Oct 2026 10:00:00 GMT",
+        })
+        self.assertEqual((storage.fetch_misses, storage.fetch_hits), (1, 1))
+        self.assertEqual(storage.show(), {"a": 1})
+
+    def test_validators_are_saved_with_the_contents(self):
+        requests = _Responses((200, {"a": 1}, {"ETag": '"v1"'}), (200, {"a": 2}, {"ETag": '"v2"'}))
+        storage = Arkivist(self.path("sidecar.json"), autosave=False)
+        with mock.patch.object(arkivist_module, "_requests", return_value=requests):
+            storage.fetch(self.URL, conditional=True)
+            self.assertFalse(os.path.exists(self.path("sidecar.json.http")))
+            storage.save()
+            reopened = Arkivist(self.path("sidecar.json"))
+            reopened.fetch(self.URL, conditional=True)
+        self.assertEqual(requests.headers[1], {"If-None-Match": '"v1"'})
+        self.assertEqual(reopened["a"], 2)
+        with open(self.path("sidecar.json.http"), encoding="utf-8") as f:
+            self.assertEqual(json.load(f), {self.URL: {"ETag": '"v2"'}})
+
+    def test_replacing_the_contents_forgets_validators(self):
+        replacements = {
+            "clear": lambda storage: storage.clear(),
+            "load": lambda storage: storage.load({"b": 1}),
+            "reset": lambda storage: storage.reset(),
+            "fetch": lambda storage: storage.fetch("https://a.test/other"),
+        }
+        for name, replace in replacements.items():
+            with self.subTest(name=name):
+                fetched = [(200, {"b": 1}, {})] if name == "fetch" else []
+                requests = _Responses(
+                    (200, {"a": 1}, {"ETag": '"v1"'}), *fetched, (200, {"a": 1}, {"ETag": '"v1"'}),
+                )
+                storage = Arkivist(self.path(f"forget-{name}.json"))
+                with mock.patch.object(arkivist_module, "_requests", return_value=requests):
+                    storage.fetch(self.URL, conditional=True)
+                    replace(storage)
+                    again = Arkivist(self.path(f"forget-{name}.json"))
+                    again.fetch(self.URL, conditional=True)
+                self.assertNotIn("If-None-Match", requests.headers[-1])
+                self.assertEqual(again.show(), {"a": 1})
+
+    def test_replacing_forgets_other_urls(self):
+        requests = _Responses(
+            (200, {"a": 1}, {"ETag": '"a"'}), (200, {"b": 1}, {"ETag": '"b"'}), (200, {"a": 1}, {}),
+        )
+        storage = Arkivist(self.path("replace.json"))
+        with mock.patch.object(arkivist_module, "_requests", return_value=requests):
+            storage.fetch("https://a.test/a", conditional=True)
+            storage.fetch("https://a.test/b", conditional=True)
+            storage.fetch("https://a.test/a", conditional=True)
+        self.assertEqual(requests.headers[2], {})
+        self.assertEqual(storage.show(), {"a": 1})
+
+    @unittest.skipUnless(HAS_REQUESTS, "requests is not installed")
+    def test_local_server(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _JSONHandler)
+        server.documents = {"data.json": {"a": 1}}
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            url = f"http://127.0.0.1:{server.server_port}/data.json"
+            storage = Arkivist(self.path("server.json"))
+            storage.fetch(url, conditional=True, noerror=False)
+            storage.fetch(url, conditional=True, noerror=False)
+            server.documents["data.json"] = {"a": 2}
+            storage.fetch(url, conditional=True, noerror=False)
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual((storage.fetch_misses, storage.fetch_hits), (2, 1))
+        self.assertEqual(storage.show(), {"a": 2})
+
+
+class _Pages:
+    """A `requests` stand-in whose sessions stream `pages`, a dictionary of
+    URLs to their document and next link."""
+
+    def __init__(self, pages, chunk=5):
+        self.pages = pages
+        self.chunk = chunk
+        self.requested = []
+
+    def Session(self):
+        session = mock.MagicMock()
+        session.__enter__.return_value = session
+        session.get.side_effect = self.get
+        return session
+
+    def get(self, url, stream=False, **options):
+        self.requested.append(url)
+        document, link = self.pages[url]
+        body = json.dumps(document).encode("utf-8")
+        response = mock.MagicMock()
+        response.__enter__.return_value = response
+        response.url = url
+        response.links = {"next": {"url": link, "rel": "next"}} if link else {}
+        response.headers = {}
+        response.json.side_effect = lambda: json.loads(body)
+        response.iter_content.side_effect = lambda size: (
+            body[i : i + self.chunk] for i in range(0, len(body), self.chunk)
+        )
+        return response
+
+
+class TestStreamedFetch(ArkivistTestCase):
+    PAGES = {
+        "https://a.test/items": ({"1": {"n": 1}, "2": {"n": 2}}, "/items?page=2"),
+        "https://a.test/items?page=2": ({"3": {"n": 3}, "2": {"n": 22}}, "https://a.test/items?page=3"),
+        "https://a.test/items?page=3": ({"4": {"n": 4}}, None),
+    }
+
+    def test_stream(self):
+        pages = _Pages(self.PAGES)
+        storage = Arkivist(self.path("stream.json"))
+        with mock.patch.object(arkivist_module, "_requests", return_value=pages):
+            storage.fetch("https://a.test/items", stream=True, noerror=False)
+        self.assertEqual(storage.show(), {"1": {"n": 1}, "2": {"n": 2}})
+
+    def test_stream_rejects_other_documents(self):
+        pages = _Pages({"https://a.test/list": ([1, 2], None), "https://a.test/ok": ({"a": 1}, None)})
+        storage = Arkivist(self.path("reject.json"))
+        storage.set("local", True)
+        with mock.patch.object(arkivist_module, "_requests", return_value=pages):
+            with self.assertRaises(ArkivistException):
+                storage.fetch("https://a.test/list", stream=True, noerror=False)
+        self.assertEqual(storage.show(), {"local": True})
+
+    def test_paginate_follows_links_and_saves_once(self):
+        pages = _Pages(self.PAGES)
+        storage = Arkivist(self.path("pages.json"))
+        with mock.patch.object(arkivist_module, "_requests", return_value=pages), \
+                mock.patch.object(arkivist_module, "_write_json", wraps=arkivist_module._write_json) as write:
+            storage.fetch("https://a.test/items", paginate=True, stream=True, noerror=False)
+        self.assertEqual(write.call_count, 1)
+        self.assertEqual(pages.requested, list(self.PAGES))
+        expected = {"1": {"n": 1}, "2": {"n": 22}, "3": {"n": 3}, "4": {"n": 4}}
+        self.assertEqual(storage.show(), expected)
+        self.assertEqual(json.loads(self.read_raw("pages.json")), expected)
+
+    def test_paginate_limits(self):
+        pages = _Pages(dict(self.PAGES, **{"https://a.test/items?page=3": ({"4": 4}, "/items")}))
+        storage = Arkivist(self.path("limits.json"))
+        with mock.patch.object(arkivist_module, "_requests", return_value=pages):
+            storage.fetch("https://a.test/items", paginate=True, noerror=False)
+            self.assertEqual(len(pages.requested), 3)
+            storage.fetch("https://a.test/items", paginate=True, max_pages=2, noerror=False)
+        self.assertEqual(len(pages.requested), 5)
+        self.assertEqual(sorted(storage.keys()), ["1", "2", "3"])
+
+    def test_paginate_with_a_function(self):
+        pages = _Pages({
+            "https://a.test/p": ({"a": 1, "next": "/q"}, None),
+            "https://a.test/q": ({"b": 2, "next": None}, None),
+        })
+        storage = Arkivist(self.path("function.json"))
+        with mock.patch.object(arkivist_module, "_requests", return_value=pages):
+            storage.fetch(
+                "https://a.test/p", paginate=lambda response, page: page.pop("next"), noerror=False
+            )
+        self.assertEqual(storage.show(), {"a": 1, "b": 2})
+
+    def test_failed_page_keeps_the_data(self):
+        pages = _Pages({"https://a.test/p": ({"a": 1}, "ftp://a.test/q")})
+        storage = Arkivist(self.path("failed.json"))
+        storage.set("local", True)
+        with mock.patch.object(arkivist_module, "_requests", return_value=pages):
+            storage.fetch("https://a.test/p", paginate=True)
+            with self.assertRaises(ArkivistException):
+                storage.fetch("https://a.test/p", paginate=True, noerror=False)
+        self.assertEqual(storage.show(), {"local": True})
+
+    def test_invalid_arguments(self):
+        storage = Arkivist(self.path("invalid.json"))
+        for options in ({"paginate": True, "conditional": True}, {"paginate": "next"}, {"max_pages": 0}):
+            with self.subTest(options=options):
+                with self.assertRaises(ArkivistException):
+                    storage.fetch("https://a.test/p", **options)
+
+    @unittest.skipUnless(HAS_REQUESTS, "requests is not installed")
+    def test_local_server(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _JSONHandler)
+        server.documents = {f"page-{i}": {str(j): j for j in range(i * 100, i * 100 + 100)} for i in range(5)}
+        server.links = {f"page-{i}": f"page-{i + 1}" for i in range(4)}
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            url = f"http://127.0.0.1:{server.server_port}/page-0"
+            storage = Arkivist(self.path("server.json"))
+            storage.fetch(url, paginate=True, stream=True, noerror=False)
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(storage.show(), {str(j): j for j in range(500)})
+
+
+class TestFetchMany(ArkivistTestCase):
+    def test_merges_in_order(self):
+        requests = _fake_requests({
+            "https://a.test/1": {"a": 1, "shared": 1},
+            "https://a.test/2": {"b": 2, "shared": 2},
+            "https://a.test/3": ConnectionError("refused"),
+            "https://a.test/4": [1, 2],
+        })
+        storage = Arkivist(self.path("many.json"))
+        storage.set("local", True)
+        urls = [f"https://a.test/{i}" for i in range(1, 5)] + ["ftp://a.test/5"]
+        with mock.patch.object(arkivist_module, "_requests", return_value=requests), \
+                mock.patch.object(arkivist_module, "_write_json", wraps=arkivist_module._write_json) as write:
+            errors = storage.fetch_many(urls, max_workers=3)
+        self.assertEqual(write.call_count, 1)
+        self.assertEqual(sorted(errors), ["ftp://a.test/5", "https://a.test/3", "https://a.test/4"])
+        self.assertTrue(all(isinstance(e, ArkivistException) for e in errors.values()))
+        expected = {"local": True, "a": 1, "shared": 2, "b": 2}
+        self.assertEqual(storage.show(), expected)
+        self.assertEqual(json.loads(self.read_raw("many.json")), expected)
+
+    def test_replace_keeps_data_when_everything_failed(self):
+        requests = _fake_requests({"https://a.test/1": {"a": 1}, "https://a.test/2": OSError("down")})
+        storage = Arkivist(self.path("replace.json"))
+        storage.set("local", True)
+        with mock.patch.object(arkivist_module, "_requests", return_value=requests):
+            self.assertEqual(list(storage.fetch_many(["https://a.test/2"], extend=False)), ["https://a.test/2"])
+            self.assertEqual(storage.show(), {"local": True})
+            self.assertEqual(storage.fetch_many(["https://a.test/1"], extend=False), {})
+        self.assertEqual(storage.show(), {"a": 1})
+
+    def test_invalid_arguments(self):
+        storage = Arkivist(self.path("invalid.json"))
+        with self.assertRaises(ArkivistException):
+            storage.fetch_many("https://a.test/1")
+        with self.assertRaises(ArkivistException):
+            storage.fetch_many(["https://a.test/1"], max_workers=0)
+
+    @unittest.skipUnless(HAS_REQUESTS, "requests is not installed")
+    def test_local_server(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _JSONHandler)
+        server.documents = {f"{i}.json": {str(i): i} for i in range(20)}
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            base = f"http://127.0.0.1:{server.server_port}/"
+            urls = [f"{base}{i}.json" for i in range(20)] + [base + "missing.json"]
+            storage = Arkivist(self.path("server.json"))
+            errors = storage.fetch_many(urls, max_workers=4)
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(list(errors), [base + "missing.json"])
+        self.assertEqual(storage.show(), {str(i): i for i in range(20)})
+
 
 class TestThreadStress(ArkivistTestCase):
     def test_concurrent_writes(self):
@@ -0,0 +1,185 @@
+"""Tests for the MessagePack storage format."""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from arkivist import Arkivist, ArkivistException, ShardedArkivist, binary, convert
+
+try:
+    import cryptography  # noqa: F401
+
+    HAS_CRYPTOGRAPHY = True
+except ImportError:
+    HAS_CRYPTOGRAPHY = False
+
+try:
+    import msgpack  # noqa: F401
+
+    HAS_MSGPACK = True
+except ImportError:
+    HAS_MSGPACK = False
+
+SAMPLES = [
+    {},
+    {"hello": "world", "unicode": "ñandú — 日本語 ✓", "long": "x" * 300},
+    {"int": 1, "neg": -33, "wide": 2**40, "big": 2**70, "small": -(2**70)},
+    {"float": 1.5, "bool": True, "false": False, "none": None},
+    {1: "int key", 2.5: "float key", None: "none key"},
+    {"nested": {"list": [1, [2, [3, {4: "deep"}]]], "tuple": (1, 2)}},
+    {"records": {str(i): {"n": i, "name": f"record {i}"} for i in range(300)}},
+    {"sizes": [0] * 70000, "text": "y" * 70000},
+]
+
+
+class PackingConformance:
+    """Mixed into one test case per backend."""
+
+    backend = None
+
+    def setUp(self):
+        if self.backend is None and not HAS_MSGPACK:
+            self.skipTest("msgpack is not installed")
+        self.previous = binary._msgpack
+        binary._msgpack = self.backend
+
+    def tearDown(self):
+        binary._msgpack = self.previous
+
+    def test_matches_json(self):
+        for sample in SAMPLES:
+            with self.subTest(sample=str(sample)[:60]):
+                expected = json.loads(json.dumps(sample))
+                self.assertEqual(binary.unpackb(binary.packb(sample)), expected)
+
+    def test_map_header(self):
+        self.assertEqual(binary.packb({}), b"\x80")
+        self.assertEqual(binary.packb({"a": 1}), b"\x81\xa1a\x01")
+
+    def test_malformed_documents(self):
+        for buffer in (b"", b"\x81", b"\x81\xa1a", b"\xc1", b"\x80\x00", b"\xa2\xff\xfe"):
+            with self.subTest(buffer=buffer):
+                with self.assertRaises(ValueError):
+                    binary.unpackb(buffer)
+
+    def test_unsupported_values(self):
+        with self.assertRaises(TypeError):
+            binary.packb({"a": object()})
+        with self.assertRaises(TypeError):
+            binary.packb({(1, 2): "tuple key"})
+
+
+class TestPurePython(PackingConformance, unittest.TestCase):
+    backend = False
+
+    def test_interoperates_with_msgpack(self):
+        if not HAS_MSGPACK:
+            self.skipTest("msgpack is not installed")
+        import msgpack
+
+        for sample in SAMPLES[:4]:
+            expected = json.loads(json.dumps(sample))
+            ext = lambda code, data: int(data)  # noqa: E731
+            self.assertEqual(
+                msgpack.unpackb(binary.packb(sample), ext_hook=ext), expected
+            )
+
+
+class TestMsgpackBackend(PackingConformance, unittest.TestCase):
+    backend = None
+
+
+class TestBinaryStorage(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix="arkivist-binary-")
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.tempdir, name)
+
+    def test_format_from_extension(self):
+        storage = Arkivist(self.path("store.msgpack"))
+        storage.update({"a": 1, "b": [1.5, None]})
+        storage[3] = {"x": True}
+        self.assertEqual(storage.format, "msgpack")
+        with open(self.path("store.msgpack"), "rb") as f:
+            self.assertEqual(binary.unpackb(f.read()), {"a": 1, "b": [1.5, None], "3": {"x": True}})
+        self.assertEqual(dict(Arkivist(self.path("store.msgpack"))), json.loads(storage.string()))
+
+    def test_format_argument(self):
+        storage = Arkivist(self.path("store.json"), format="msgpack")
+        storage.set("a", 1)
+        with open(self.path("store.json"), "rb") as f:
+            self.assertEqual(f.read(), b"\x81\xa1a\x01")
+        # reading detects the format from the contents, and keeps it
+        again = Arkivist(self.path("store.json"))
+        self.assertEqual(again.format, "msgpack")
+        self.assertEqual(dict(again), {"a": 1})
+        again.set("b", 2)
+        with open(self.path("store.json"), "rb") as f:
+            self.assertEqual(f.read(), b"\x82\xa1a\x01\xa1b\x02")
+        self.assertEqual(Arkivist(self.path("store.json"), format="json").format, "json")
+        with self.assertRaises(ArkivistException):
+            Arkivist(self.path("store.json"), format="yaml")
+        with self.assertRaises(ArkivistException):
+            Arkivist(self.path("store.yaml"))
+
+    def test_save_as_and_convert(self):
+        storage = Arkivist(self.path("source.json"))
+        storage.update({"n": list(range(10)), "text": "ñ"})
+        storage.save(save_as=self.path("copy.msgpack"))
+        self.assertEqual(dict(Arkivist(self.path("copy.msgpack"))), dict(storage))
+        self.assertEqual(convert(self.path("copy.msgpack"), self.path("back.json")), self.path("back.json"))
+        with open(self.path("back.json"), encoding="utf-8") as f:
+            self.assertEqual(json.load(f), dict(storage))
+        with self.assertRaises(ArkivistException):
+            convert(self.path("missing.json"), self.path("out.msgpack"))
+
+    def test_corrupted_file(self):
+        with open(self.path("bad.msgpack"), "wb") as f:
+            f.write(b"\x82\xa1a\x01")
+        with self.assertRaises(ArkivistException):
+            Arkivist(self.path("bad.msgpack"))
+
+    def test_lazy_and_journal(self):
+        Arkivist(self.path("lazy.msgpack")).update({"a": 1, "b": {"c": 2}})
+        lazy = Arkivist(self.path("lazy.msgpack"), lazy=True, journal=True)
+        self.assertEqual(lazy["b"], {"c": 2})
+        lazy.find("b").set("d", 3)
+        again = Arkivist(self.path("lazy.msgpack"), journal=True)
+        self.assertEqual(again["b"], {"c": 2, "d": 3})
+        again.compact()
+        with open(self.path("lazy.msgpack"), "rb") as f:
+            self.assertEqual(binary.unpackb(f.read())["b"], {"c": 2, "d": 3})
+
+    def test_sharded(self):
+        directory = self.path("shards")
+        storage = ShardedArkivist(directory, shards=2, format="msgpack")
+        storage.update({str(i): i for i in range(10)})
+        self.assertTrue(all(name.endswith(".msgpack") for name in os.listdir(directory) if name.startswith("shard-")))
+        self.assertEqual(dict(ShardedArkivist(directory)), dict(storage))
+        ShardedArkivist(directory, format="json")
+        names = sorted(name for name in os.listdir(directory) if name.startswith("shard-"))
+        self.assertEqual(names, ["shard-0000.json", "shard-0001.json"])
+        self.assertEqual(dict(ShardedArkivist(directory)), dict(storage))
+
+    @unittest.skipUnless(HAS_CRYPTOGRAPHY, "cryptography is not installed")
+    def test_encryption(self):
+        authfile = self.path("key.txt")
+        storage = Arkivist(self.path("enc.msgpack"), authfile=authfile)
+        storage.encrypt()
+        storage.set("weather", "Cloudy")
+        with open(self.path("enc.msgpack"), "rb") as f:
+            envelope = binary.unpackb(f.read())
+        self.assertEqual(envelope["encryption"], "fernet")
+        self.assertEqual(Arkivist(self.path("enc.msgpack"), authfile=authfile)["weather"], "Cloudy")
+        convert(self.path("enc.msgpack"), self.path("enc.json"), authfile=authfile)
+        self.assertEqual(Arkivist(self.path("enc.json"), authfile=authfile)["weather"], "Cloudy")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+"""Conformance tests for the JSON codecs.
+
+Every installed backend must produce documents that parse to the same
+data as the standard library codec; backends that are not installed are
+skipped.
+"""
+
+import json
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+from arkivist import Arkivist, ArkivistException, available_codecs, set_default_codec
+from arkivist.codecs import get_codec
+
+try:
+    import cryptography  # noqa: F401
+
+    HAS_CRYPTOGRAPHY = True
+except ImportError:
+    HAS_CRYPTOGRAPHY = False
+
+SAMPLES = [
+    {},
+    {"hello": "world", "unicode": "ñandú — 日本語 ✓", "slash": "a/b"},
+    {"int": 1, "float": 1.5, "big": 2**70, "neg": -3, "bool": True, "none": None},
+    {1: "int key", 2.5: "float key", None: "none key"},
+    {True: "bool key", False: "other bool key"},
+    {"nested": {"list": [1, [2, [3, {"deep": "value"}]]], "tuple": (1, 2)}},
+    {"records": {str(i): {"n": i, "name": f"record {i}"} for i in range(50)}},
+    {"nan": math.nan, "inf": [math.inf, -math.inf], "none": None, math.inf: "inf key"},
+]
+
+
+def canonical(data):
+    """`data` with NaN, which never equals itself, replaced by a string."""
+    if isinstance(data, dict):
+        return {key: canonical(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [canonical(value) for value in data]
+    if isinstance(data, float) and math.isnan(data):
+        return "NaN"
+    return data
+
+
+class CodecConformance:
+    """Mixed into one test case per backend."""
+
+    name = None
+
+    def setUp(self):
+        if self.name not in available_codecs():
+            self.skipTest(f"{self.name} is not installed")
+        self.codec = get_codec(self.name)
+        self.tempdir = tempfile.mkdtemp(prefix="arkivist-codecs-")
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.tempdir, name)
+
+    def test_matches_standard_library(self):
+        for sample in SAMPLES:
+            for indent in (None, 0, 1, 2, 4):
+                with self.subTest(sample=sample, indent=indent):
+                    expected = canonical(json.loads(json.dumps(sample, ensure_ascii=False)))
+                    text = self.codec.dumps(sample, indent)
+                    self.assertIsInstance(text, str)
+                    self.assertEqual(canonical(json.loads(text)), expected)
+                    self.assertEqual(canonical(self.codec.loads(text)), expected)
+                    encoded = self.codec.encode(sample, indent)
+                    self.assertEqual(canonical(self.codec.loads(encoded)), expected)
+
+    def test_no_ascii_escapes(self):
+        self.assertIn("日本語", self.codec.dumps({"a": "日本語"}))
+
+    def test_indented_output(self):
+        self.assertIn('\n  "a": 1', self.codec.dumps({"a": 1}, 2))
+        self.assertNotIn("\n", self.codec.dumps({"a": {"b": 1}}))
+
+    def test_invalid_documents_raise_value_error(self):
+        with self.assertRaises(ValueError):
+            self.codec.loads("{not valid")
+
+    def test_arkivist_roundtrip(self):
+        storage = Arkivist(self.path("store.json"), codec=self.name, indent=2)
+        storage.update(SAMPLES[1])
+        storage.set(7, {"nested": [1, 2]})
+        self.assertEqual(storage.codec, self.name)
+        again = Arkivist(self.path("store.json"))
+        self.assertEqual(dict(again), json.loads(json.dumps(dict(storage))))
+        self.assertEqual(json.loads(storage.string()), json.loads(again.string()))
+
+    def test_arkivist_load_errors(self):
+        storage = Arkivist({"keep": True}, codec=self.name)
+        with self.assertRaises(ArkivistException):
+            storage.load("{invalid json")
+        self.assertEqual(dict(storage), {"keep": True})
+
+    @unittest.skipUnless(HAS_CRYPTOGRAPHY, "cryptography is not installed")
+    def test_arkivist_encryption(self):
+        authfile = self.path("key.txt")
+        storage = Arkivist(self.path("enc.json"), authfile=authfile, codec=self.name)
+        storage.encrypt()
+        storage.set("weather", {"2022-04-14": "Cloudy"})
+        again = Arkivist(self.path("enc.json"), authfile=authfile)
+        self.assertEqual(again["weather"], {"2022-04-14": "Cloudy"})
+
+
+class TestJSONCodec(CodecConformance, unittest.TestCase):
+    name = "json"
+
+    def test_output_is_unchanged(self):
+        for sample in SAMPLES:
+            for indent in (None, 0, 2):
+                self.assertEqual(
+                    self.codec.dumps(sample, indent),
+                    json.dumps(sample, indent=indent, ensure_ascii=False),
+                )
+
+
+class TestOrjsonCodec(CodecConformance, unittest.TestCase):
+    name = "orjson"
+
+
+class TestMsgspecCodec(CodecConformance, unittest.TestCase):
+    name = "msgspec"
+
+
+class TestUjsonCodec(CodecConformance, unittest.TestCase):
+    name = "ujson"
+
+
+class TestCodecSelection(unittest.TestCase):
+    def tearDown(self):
+        set_default_codec("json")
+
+    def test_available_codecs(self):
+        self.assertIn("json", available_codecs())
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ArkivistException):
+            Arkivist({}, codec="yaml")
+        with self.assertRaises(ArkivistException):
+            set_default_codec("yaml")
+        with self.assertRaises(ArkivistException):
+            get_codec("yaml")
+
+    def test_default_codec(self):
+        name = available_codecs()[-1]
+        set_default_codec(name)
+        self.assertEqual(Arkivist({}).codec, name)
+        self.assertEqual(Arkivist({}, codec="json").codec, "json")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,202 @@
+"""Tests for transparent compression of stored files."""
+
+import gzip
+import json
+import lzma
+import os
+import shutil
+import tempfile
+import unittest
+import zlib
+from unittest import mock
+
+from arkivist import Arkivist, ArkivistException, ShardedArkivist, compression, convert
+
+try:
+    import cryptography  # noqa: F401
+
+    HAS_CRYPTOGRAPHY = True
+except ImportError:
+    HAS_CRYPTOGRAPHY = False
+
+DATA = {str(i): {"name": f"record {i}", "tags": ["alpha", "beta"]} for i in range(200)}
+
+
+class TestCompressionModule(unittest.TestCase):
+    def test_roundtrip(self):
+        payload = json.dumps(DATA).encode("utf-8")
+        for method in compression.METHODS:
+            for level in (0, 1, 9):
+                with self.subTest(method=method, level=level):
+                    packed = b"".join(compression.compress(payload, method, level))
+                    self.assertEqual(compression.detect(packed), method)
+                    self.assertEqual(compression.decompress(packed), payload)
+                    if level:
+                        self.assertLess(len(packed), len(payload) // 4)
+
+    def test_standard_containers(self):
+        payload = b'{"a": 1}'
+        self.assertEqual(gzip.decompress(b"".join(compression.compress(payload, "gzip"))), payload)
+        self.assertEqual(lzma.decompress(b"".join(compression.compress(payload, "lzma"))), payload)
+        self.assertEqual(zlib.decompress(b"".join(compression.compress(payload, "zlib"))), payload)
+        self.assertEqual(compression.decompress(gzip.compress(payload) * 2), payload * 2)
+        self.assertEqual(compression.decompress(lzma.compress(payload)), payload)
+
+    def test_chunks(self):
+        chunks = [b"{", b'"a": ', b"[1, 2]", b"}"]
+        packed = b"".join(compression.compress(chunks, "gzip"))
+        self.assertEqual(compression.decompress(packed), b"".join(chunks))
+
+    def test_uncompressed_documents(self):
+        for document in (b'{"a": 1}', b"  \n{}", b"\x81\xa1a\x01", b"", b"x"):
+            self.assertIsNone(compression.detect(document))
+            self.assertIs(compression.decompress(document), document)
+
+    def test_corrupted(self):
+        packed = b"".join(compression.compress(b'{"a": 1}' * 100, "gzip"))
+        for broken in (packed[:-12], packed[:10] + b"\x00" * 20):
+            with self.assertRaises(ValueError):
+                compression.decompress(broken)
+
+
+class CompressedTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix="arkivist-compression-")
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.tempdir, name)
+
+    def raw(self, name):
+        with open(self.path(name), "rb") as f:
+            return f.read()
+
+
+class TestCompressedFiles(CompressedTestCase):
+    def test_compression_from_extension(self):
+        for name, method in (("a.json.gz", "gzip"), ("a.json.xz", "lzma"), ("a.json.zz", "zlib"), ("a.msgpack.gz", "gzip")):
+            with self.subTest(name=name):
+                storage = Arkivist(self.path(name))
+                storage.update(DATA)
+                self.assertEqual(storage.compression, method)
+                self.assertEqual(compression.detect(self.raw(name)), method)
+                self.assertEqual(dict(Arkivist(self.path(name))), DATA)
+
+    def test_compression_argument(self):
+        storage = Arkivist(self.path("data.json"), compression="lzma", level=1)
+        storage.update(DATA)
+        self.assertEqual(lzma.decompress(self.raw("data.json")), json.dumps(DATA, indent=0).encode())
+        # reading recognizes compressed contents whatever the file name
+        again = Arkivist(self.path("data.json"), mode="r")
+        self.assertEqual(again.compression, "lzma")
+        self.assertEqual(dict(again), DATA)
+        self.assertIsNone(Arkivist(self.path("plain.json")).compression)
+
+    def test_detected_compression_is_kept(self):
+        with open(self.path("c.json"), "wb") as f:
+            f.write(zlib.compress(json.dumps(DATA).encode()))
+        # rewritten on opening, and on every save
+        storage = Arkivist(self.path("c.json"))
+        self.assertEqual(storage.compression, "zlib")
+        self.assertEqual(json.loads(zlib.decompress(self.raw("c.json"))), DATA)
+        storage.set("more", 1)
+        self.assertEqual(json.loads(zlib.decompress(self.raw("c.json"))), dict(DATA, more=1))
+        storage.reload()
+        self.assertEqual(storage.compression, "zlib")
+        # unless another compression is given
+        Arkivist(self.path("c.json"), compression="gzip").set("more", 2)
+        self.assertEqual(Arkivist(self.path("c.json")).compression, "gzip")
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ArkivistException):
+            Arkivist(self.path("data.json"), compression="bz2")
+        for level in (-1, 10, "9", True):
+            with self.assertRaises(ArkivistException):
+                Arkivist(self.path("data.json"), compression="gzip", level=level)
+        with self.assertRaises(ArkivistException):
+            Arkivist(self.path("data.txt.gz"))
+
+    def test_corrupted_file(self):
+        Arkivist(self.path("data.json.gz")).update(DATA)
+        with open(self.path("data.json.gz"), "r+b") as f:
+            f.truncate(os.path.getsize(self.path("data.json.gz")) // 2)
+        with self.assertRaises(ArkivistException):
+            Arkivist(self.path("data.json.gz"))
+
+    def test_compression_errors(self):
+        storage = Arkivist(self.path("data.json.xz"))
+        failures = [
+            mock.patch.object(lzma, "LZMACompressor", side_effect=lzma.LZMAError("no memory")),
+            mock.patch.object(compression, "_lzma", side_effect=ValueError("no lzma")),
+        ]
+        for failure in failures:
+            with self.subTest(failure=failure), failure:
+                with self.assertRaises(ArkivistException):
+                    storage.set("a", 1)
+
+    def test_save_as_and_convert(self):
+        storage = Arkivist(self.path("data.json"))
+        storage.update(DATA)
+        storage.save(save_as=self.path("copy.json.gz"))
+        self.assertEqual(json.loads(gzip.decompress(self.raw("copy.json.gz"))), DATA)
+        convert(self.path("copy.json.gz"), self.path("copy.msgpack.xz"))
+        self.assertEqual(compression.detect(self.raw("copy.msgpack.xz")), "lzma")
+        convert(self.path("copy.msgpack.xz"), self.path("back.json"))
+        self.assertEqual(json.loads(self.raw("back.json")), DATA)
+
+    def test_lazy_and_mapped(self):
+        Arkivist(self.path("data.json.gz")).update(DATA)
+        lazy = Arkivist(self.path("data.json.gz"), lazy=True)
+        self.assertEqual(len(lazy._unloaded), len(DATA))
+        self.assertEqual(lazy["3"], DATA["3"])
+        lazy["new"] = 1
+        self.assertEqual(json.loads(gzip.decompress(self.raw("data.json.gz")))["new"], 1)
+        mapped = Arkivist(self.path("data.json.gz"), mode="r", mmap=True)
+        self.assertEqual(mapped["4"], DATA["4"])
+        self.assertFalse(os.path.exists(self.path("data.json.gz.idx")))
+
+    def test_journal(self):
+        storage = Arkivist(self.path("data.json.gz"), journal=True)
+        storage.update({"a": 1})
+        storage["b"] = 2
+        self.assertEqual(dict(Arkivist(self.path("data.json.gz"), journal=True)), {"a": 1, "b": 2})
+        storage.compact()
+        self.assertEqual(json.loads(gzip.decompress(self.raw("data.json.gz"))), {"a": 1, "b": 2})
+
+    def test_sharded(self):
+        directory = self.path("shards")
+        storage = ShardedArkivist(directory, shards=2, compression="zlib")
+        storage.update(DATA)
+        names = sorted(name for name in os.listdir(directory) if name.startswith("shard-"))
+        self.assertEqual(names, ["shard-0000.json.zz", "shard-0001.json.zz"])
+        self.assertEqual(dict(ShardedArkivist(directory, lazy=True)), DATA)
+        ShardedArkivist(directory, compression="gzip")
+        names = sorted(name for name in os.listdir(directory) if name.startswith("shard-"))
+        self.assertEqual(names, ["shard-0000.json.gz", "shard-0001.json.gz"])
+        self.assertEqual(dict(ShardedArkivist(directory)), DATA)
+        # compression can be switched off again
+        self.assertIsNone(ShardedArkivist(directory, compression=None).compression)
+        names = sorted(name for name in os.listdir(directory) if name.startswith("shard-"))
+        self.assertEqual(names, ["shard-0000.json", "shard-0001.json"])
+        self.assertEqual(dict(ShardedArkivist(directory)), DATA)
+
+
+@unittest.skipUnless(HAS_CRYPTOGRAPHY, "cryptography is not installed")
+class TestCompressedEncryption(CompressedTestCase):
+    def test_compressed_before_encryption(self):
+        authfile = self.path("key.txt")
+        storage = Arkivist(self.path("data.json.gz"), authfile=authfile)
+        storage.update(DATA)
+        storage.encrypt()
+        envelope = json.loads(self.raw("data.json.gz"))
+        for token in envelope["content"]:
+            payload = storage._cypher.decrypt(token.encode("utf-8"))
+            self.assertEqual(compression.detect(payload), "gzip")
+        self.assertLess(len("".join(envelope["content"])), len(json.dumps(DATA)) // 2)
+        self.assertEqual(dict(Arkivist(self.path("data.json.gz"), authfile=authfile)), DATA)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+"""Tests for the top-level JSON object scanners used by lazy mode and
+streamed fetches."""
+
+import json
+import unittest
+
+from arkivist.scanner import iter_members, scan_object
+
+
+def decode(buffer):
+    return {key: json.loads(buffer[start:end]) for key, start, end in scan_object(buffer)}
+
+
+def decode_chunks(buffer, size):
+    decoded = {}
+    for members in iter_members(buffer[i : i + size] for i in range(0, len(buffer), size)):
+        decoded.update(json.loads(members))
+    return decoded
+
+
+DOCUMENTS = [
+    {},
+    {"a": 1, "b": -2.5e3, "c": True, "d": None, "e": "text"},
+    {"esc": 'quote " backslash \\ brace } bracket ]', "unicode": "ñandú 日本語"},
+    {"nested": {"list": [1, [2, [3, {"deep": "]}"}]]], "empty": {}}, "l": []},
+    {"ключ": {" ": [{"a": "{"}]}},
+]
+
+MALFORMED = (
+    b"",
+    b"[1, 2]",
+    b'{"a": 1',
+    b'{"a": 1,}',
+    b'{"a" 1}',
+    b'{"a": 1} {}',
+    b'{"a": [1, 2}',
+    b'{"a": "unterminated}',
+    b"{a: 1}",
+)
+
+
+class TestScanObject(unittest.TestCase):
+    def test_matches_json_loads(self):
+        for document in DOCUMENTS:
+            for indent in (None, 0, 2):
+                with self.subTest(document=document, indent=indent):
+                    text = json.dumps(document, indent=indent, ensure_ascii=indent is None)
+                    self.assertEqual(decode(text.encode("utf-8")), document)
+
+    def test_offsets(self):
+        buffer = b' {"a" : [1, 2] ,"b":"x"}\n'
+        self.assertEqual(scan_object(buffer), [("a", 8, 14), ("b", 20, 23)])
+
+    def test_duplicate_keys_are_reported(self):
+        self.assertEqual([key for key, _, _ in scan_object(b'{"a": 1, "a": 2}')], ["a", "a"])
+
+    def test_malformed_documents(self):
+        for buffer in MALFORMED:
+            with self.subTest(buffer=buffer):
+                with self.assertRaises(ValueError):
+                    scan_object(buffer)
+
+
+class TestIterMembers(unittest.TestCase):
+    def test_matches_json_loads_for_any_chunking(self):
+        for document in DOCUMENTS:
+            for indent in (None, 2):
+                text = json.dumps(document, indent=indent, ensure_ascii=indent is None)
+                for size in (1, 2, 7, 4096):
+                    with self.subTest(document=document, indent=indent, size=size):
+                        self.assertEqual(decode_chunks(text.encode("utf-8"), size), document)
+
+    def test_members_are_yielded_as_they_arrive(self):
+        read = []
+
+        def chunks():
+            for chunk in (b'{"a": 1, "b": [1,', b" 2, 3, 4], ", b'"c": 3}'):
+                read.append(chunk)
+                yield chunk
+
+        members = iter_members(chunks())
+        self.assertEqual(json.loads(next(members)), {"a": 1})
+        self.assertEqual(len(read), 1)
+        self.assertEqual(json.loads(next(members)), {"b": [1, 2, 3, 4]})
+        self.assertEqual(len(read), 2)
+        self.assertEqual(json.loads(next(members)), {"c": 3})
+        self.assertEqual(list(members), [])
+
+    def test_large_member(self):
+        document = {"data": list(range(50000)), "after": True}
+        self.assertEqual(decode_chunks(json.dumps(document).encode("utf-8"), 100), document)
+
+    def test_duplicate_keys_keep_the_last_value(self):
+        self.assertEqual(decode_chunks(b'{"a": 1, "a": 2}', 3), {"a": 2})
+
+    def test_malformed_documents(self):
+        for buffer in MALFORMED:
+            for size in (1, 3, 100):
+                with self.subTest(buffer=buffer, size=size):
+                    with self.assertRaises(ValueError):
+                        decode_chunks(buffer, size)
+
+
+if __name__ == "__main__":
+    unittest.main()
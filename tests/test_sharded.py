@@ -0,0 +1,267 @@
+"""Tests for the sharded, directory-backed store."""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from arkivist import ArkivistException, ShardedArkivist
+from arkivist import sharded as sharded_module
+
+try:
+    import cryptography  # noqa: F401
+
+    HAS_CRYPTOGRAPHY = True
+except ImportError:
+    HAS_CRYPTOGRAPHY = False
+
+
+class ShardedTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix="arkivist-sharded-")
+        self.directory = os.path.join(self.tempdir, "store")
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def shard_files(self):
+        return sorted(name for name in os.listdir(self.directory) if name.startswith("shard-"))
+
+    def modified(self):
+        return {
+            name: os.stat(os.path.join(self.directory, name)).st_mtime_ns
+            for name in self.shard_files()
+        }
+
+    def on_disk(self):
+        contents = {}
+        for name in self.shard_files():
+            with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                text = f.read().strip()
+            contents.update(json.loads(text) if text else {})
+        return contents
+
+
+class TestShardedBasics(ShardedTestCase):
+    def test_roundtrip(self):
+        storage = ShardedArkivist(self.directory, shards=4)
+        for i in range(40):
+            storage[str(i)] = {"n": i}
+        storage.set("extra", [1, 2])
+        self.assertEqual(len(self.shard_files()), 4)
+        with open(os.path.join(self.directory, "manifest.json")) as f:
+            self.assertEqual(json.load(f)["shards"], 4)
+
+        again = ShardedArkivist(self.directory)
+        self.assertEqual(again.shards, 4)
+        self.assertEqual(dict(again), dict(storage))
+        self.assertEqual(self.on_disk(), dict(storage))
+
+    def test_write_only_rewrites_dirty_shards(self):
+        storage = ShardedArkivist(self.directory, shards=8)
+        storage.update({str(i): i for i in range(100)})
+        before = self.modified()
+        time.sleep(0.01)
+        storage["42"] = "changed"
+        changed = [name for name, mtime in self.modified().items() if before[name] != mtime]
+        self.assertEqual(changed, [f"shard-{storage._shard_of('42'):04d}.json"])
+        self.assertEqual(ShardedArkivist(self.directory)["42"], "changed")
+
+    def test_deletions(self):
+        storage = ShardedArkivist(self.directory, shards=4)
+        storage.update({"a": 1, "b": 2, "c": 3})
+        del storage["a"]
+        storage.pop("b")
+        self.assertEqual(dict(ShardedArkivist(self.directory)), {"c": 3})
+        storage.clear()
+        self.assertEqual(self.on_disk(), {})
+
+    def test_data_replaces_contents(self):
+        ShardedArkivist(self.directory, shards=4).update({"old": 1})
+        storage = ShardedArkivist(self.directory, {"new": 2}, shards=2)
+        self.assertEqual(dict(storage), {"new": 2})
+        self.assertEqual(len(self.shard_files()), 2)
+        self.assertEqual(dict(ShardedArkivist(self.directory)), {"new": 2})
+
+    def test_resharding(self):
+        storage = ShardedArkivist(self.directory, shards=8)
+        storage.update({str(i): i for i in range(50)})
+        resharded = ShardedArkivist(self.directory, shards=3)
+        self.assertEqual(len(self.shard_files()), 3)
+        self.assertEqual(dict(resharded), dict(storage))
+        self.assertEqual(dict(ShardedArkivist(self.directory)), dict(storage))
+
+    def test_interrupted_resharding_keeps_previous_shards(self):
+        storage = ShardedArkivist(self.directory, shards=8)
+        storage.update({str(i): i for i in range(50)})
+        atomic_write = sharded_module._atomic_write
+        written = []
+
+        def write(filepath, content, metrics=None):
+            if len(written) == 2:
+                raise ArkivistException("killed")
+            written.append(filepath)
+            atomic_write(filepath, content, metrics)
+
+        with mock.patch.object(sharded_module, "_atomic_write", write):
+            with self.assertRaises(ArkivistException):
+                ShardedArkivist(self.directory, shards=3)
+        self.assertEqual(dict(ShardedArkivist(self.directory)), dict(storage))
+        self.assertEqual(dict(ShardedArkivist(self.directory, lazy=True)), dict(storage))
+        resharded = ShardedArkivist(self.directory, shards=3)
+        self.assertEqual(len(self.shard_files()), 3)
+        self.assertEqual(dict(ShardedArkivist(self.directory)), dict(resharded))
+
+    def test_save_keeps_changes_made_in_place(self):
+        storage = ShardedArkivist(self.directory, shards=4)
+        storage.set("lst", [])
+        storage["lst"].append(1)
+        storage.save()
+        self.assertEqual(dict(ShardedArkivist(self.directory)), {"lst": [1]})
+
+    def test_batch_and_queries(self):
+        storage = ShardedArkivist(self.directory, shards=4)
+        with storage.batch():
+            for i in range(20):
+                storage.set(str(i), {"status": "open" if i % 2 else "closed"})
+        again = ShardedArkivist(self.directory)
+        again.create_index("status")
+        self.assertEqual(len(again.where("status", "open", exact=True).show()), 10)
+        self.assertEqual(len(list(again.where("status", "open", exact=True).limit(3).query())), 3)
+
+    def test_find_and_nested_changes(self):
+        storage = ShardedArkivist(self.directory, shards=4)
+        storage.set("user", {})
+        storage.find("user").set("name", "Ana")
+        storage.append_in("tags", "x")
+        again = ShardedArkivist(self.directory)
+        self.assertEqual(again["user"], {"name": "Ana"})
+        self.assertEqual(again["tags"], ["x"])
+
+    def test_save_as_writes_single_file(self):
+        storage = ShardedArkivist(self.directory, shards=4)
+        storage.update({"a": 1, "b": 2})
+        copy = os.path.join(self.tempdir, "copy.json")
+        storage.save(save_as=copy)
+        with open(copy) as f:
+            self.assertEqual(json.load(f), {"a": 1, "b": 2})
+
+    def test_read_only_mode(self):
+        with self.assertRaises(ArkivistException):
+            ShardedArkivist(self.directory, mode="r")
+        ShardedArkivist(self.directory).set("a", 1)
+        self.assertEqual(dict(ShardedArkivist(self.directory, mode="r")), {"a": 1})
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ArkivistException):
+            ShardedArkivist("")
+        with self.assertRaises(ArkivistException):
+            ShardedArkivist(self.directory, shards=0)
+
+    def test_lock_and_auto_reload(self):
+        reader = ShardedArkivist(self.directory, shards=4, auto_reload=True)
+        writer = ShardedArkivist(self.directory, lock=True)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "manifest.json.lock")))
+        writer["a"] = 1
+        self.assertTrue(reader.is_stale())
+        self.assertEqual(reader.get("a"), 1)
+        self.assertFalse(reader.is_stale())
+
+    def test_deferred_autosave(self):
+        storage = ShardedArkivist(self.directory, autosave="deferred", flush_interval=10)
+        storage.set("a", 1)
+        storage.flush()
+        self.assertEqual(self.on_disk(), {"a": 1})
+        storage.set("b", 2)
+        self.assertTrue(storage.wait_for_save(timeout=5))
+        self.assertEqual(self.on_disk(), {"a": 1, "b": 2})
+
+    def test_metrics(self):
+        storage = ShardedArkivist(self.directory, shards=4, lock=True, metrics=True)
+        storage.update({str(i): i for i in range(20)})
+        storage.set("1", "one")
+        stats = storage.stats()
+        self.assertEqual(stats["counters"]["writes"], 3)
+        self.assertGreater(stats["counters"]["bytes_written"], 0)
+        self.assertGreater(stats["timings"]["lock_hold"]["count"], 0)
+        self.assertEqual(stats["timings"]["rename"]["count"], 1 + 4 + 1)
+
+
+class TestLazyShards(ShardedTestCase):
+    def setUp(self):
+        super().setUp()
+        storage = ShardedArkivist(self.directory, shards=8)
+        storage.update({str(i): {"n": i} for i in range(64)})
+        self.expected = dict(storage)
+
+    def test_loads_on_first_access(self):
+        storage = ShardedArkivist(self.directory, lazy=True)
+        self.assertEqual(len(storage._unloaded), 8)
+        self.assertEqual(storage["5"], {"n": 5})
+        self.assertIn("6", storage)
+        self.assertLessEqual(len(storage._unloaded), 7)
+        self.assertEqual(len(storage), 64)
+        self.assertFalse(storage._unloaded)
+
+    def test_whole_contents_operations(self):
+        self.assertEqual(dict(ShardedArkivist(self.directory, lazy=True)), self.expected)
+        self.assertEqual(
+            ShardedArkivist(self.directory, lazy=True).show(), self.expected
+        )
+        self.assertEqual(
+            sorted(ShardedArkivist(self.directory, lazy=True).keys()),
+            sorted(self.expected),
+        )
+
+    def test_writes_keep_other_shards(self):
+        storage = ShardedArkivist(self.directory, lazy=True)
+        storage["new"] = 1
+        del storage["3"]
+        again = ShardedArkivist(self.directory)
+        self.expected["new"] = 1
+        del self.expected["3"]
+        self.assertEqual(dict(again), self.expected)
+
+    def test_reload(self):
+        storage = ShardedArkivist(self.directory, lazy=True)
+        ShardedArkivist(self.directory).set("0", "changed")
+        self.assertEqual(storage.reload()["0"], "changed")
+
+    def test_concurrent_reads_with_rwlock(self):
+        storage = ShardedArkivist(self.directory, lazy=True, rwlock=True)
+        results = {}
+
+        def read(i):
+            results[str(i)] = storage.get(str(i))
+            storage.set(f"new-{i}", i)
+
+        threads = [threading.Thread(target=read, args=(i,)) for i in range(64)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, self.expected)
+        self.assertEqual(len(ShardedArkivist(self.directory)), 128)
+
+
+@unittest.skipUnless(HAS_CRYPTOGRAPHY, "cryptography is not installed")
+class TestShardedEncryption(ShardedTestCase):
+    def test_encrypted_shards(self):
+        authfile = os.path.join(self.tempdir, "key.txt")
+        storage = ShardedArkivist(self.directory, shards=4, authfile=authfile)
+        storage.update({"weather": "Cloudy", "n": 1})
+        storage.encrypt()
+        for name in self.shard_files():
+            with open(os.path.join(self.directory, name)) as f:
+                self.assertNotIn("Cloudy", f.read())
+        again = ShardedArkivist(self.directory, authfile=authfile, lazy=True)
+        self.assertTrue(again.encrypted)
+        self.assertEqual(again["weather"], "Cloudy")
+
+
+if __name__ == "__main__":
+    unittest.main()